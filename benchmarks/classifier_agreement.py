@@ -0,0 +1,190 @@
+"""
+Agreement check of the in-process mention classifier against the LLM judge.
+
+Labels each stored response with libs/mention_classifier.py and compares the
+verdicts with the LLM judge's (taken from the "verdict" field when present,
+otherwise judged now and optionally saved with --save-labels), reporting
+accuracy, confusion matrices and Cohen's kappa together with latency:
+
+    python benchmarks/classifier_agreement.py samples.jsonl
+
+With --train, the classifier is first fitted on the judge labels of a split
+of the samples, saved to MENTION_CLASSIFIER_PATH, and agreement is reported
+on the held-out rest:
+
+    python benchmarks/classifier_agreement.py samples.jsonl --train --holdout 0.3
+
+Each input line is {"response": "...", "brand_name": "...", "competitors": [...], "verdict": {...}}.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+import libs.geo_analysis as geo_analysis
+import libs.mention_classifier as mention_classifier
+import libs.providers as providers
+
+
+def label_samples(samples: list) -> list:
+    """
+    Judges every sample without a stored verdict with the LLM judge, recording latency.
+    """
+    unlabelled = [sample for sample in samples if "verdict" not in sample]
+    if not unlabelled:
+        return []
+    # The judge is wanted here whatever JUDGE_MODE says
+    mention_classifier.JUDGE_MODE = "llm"
+    client = providers.get_client("judge")
+    latencies = []
+    for sample in unlabelled:
+        started = time.perf_counter()
+        sample["verdict"] = geo_analysis.analyze_brand_in_response(client, sample["response"], sample["brand_name"], sample["competitors"])
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def training_examples(samples: list):
+    """
+    Mention windows labelled with the judge's verdicts: brand windows get sentiment and context, competitor windows sentiment.
+    """
+    windows, sentiments, contexts = [], [], []
+    for sample in samples:
+        verdict = sample["verdict"]
+        competitor_sentiments = {
+            str(c.get("name", "")).lower(): c.get("sentiment")
+            for c in verdict.get("competitors_mentioned", []) if isinstance(c, dict)
+        }
+        for entity in mention_classifier.entity_windows(sample["response"], sample["brand_name"], sample["competitors"]):
+            if entity["name"] == sample["brand_name"]:
+                if not verdict.get("brand_mentioned"):
+                    continue
+                sentiment, context = verdict.get("sentiment"), mention_classifier.canonical_context(verdict.get("context"))
+            else:
+                sentiment, context = competitor_sentiments.get(entity["name"].lower()), None
+            if sentiment is None:
+                continue
+            windows.append(entity["window"])
+            sentiments.append(sentiment)
+            contexts.append(context)
+    return windows, sentiments, contexts
+
+
+def agreement(pairs: list, labels: tuple) -> dict:
+    """
+    Accuracy, confusion matrix (judge label -> classifier label -> count) and Cohen's kappa of (judge, classifier) label pairs.
+    """
+    if not pairs:
+        return {"count": 0, "accuracy": None, "kappa": None, "confusion": {}}
+    labels = tuple(labels) + tuple(sorted({label for pair in pairs for label in pair} - set(labels)))
+    confusion = {judge: {predicted: 0 for predicted in labels} for judge in labels}
+    for judge, predicted in pairs:
+        confusion[judge][predicted] += 1
+    total = len(pairs)
+    observed = sum(confusion[label][label] for label in labels) / total
+    expected = sum(
+        sum(confusion[label].values()) * sum(confusion[judge][label] for judge in labels)
+        for label in labels
+    ) / total ** 2
+    return {
+        "count": total,
+        "accuracy": observed,
+        "kappa": (observed - expected) / (1 - expected) if expected < 1 else None,
+        "confusion": confusion
+    }
+
+
+def compare(samples: list) -> dict:
+    """
+    Classifies each sample (brands differ between samples) and measures agreement with its judge verdict.
+    """
+    started = time.perf_counter()
+    predictions = []
+    for sample in samples:
+        predictions.extend(mention_classifier.classify_responses([sample["response"]], sample["brand_name"], sample["competitors"]))
+    latency = (time.perf_counter() - started) / len(samples) if samples else None
+
+    mentioned, positions, sentiments, contexts, competitor_sentiments, jaccards = [], [], [], [], [], []
+    for sample, predicted in zip(samples, predictions):
+        verdict = sample["verdict"]
+        mentioned.append(bool(verdict.get("brand_mentioned")) == predicted["brand_mentioned"])
+        if verdict.get("brand_mentioned") and predicted["brand_mentioned"]:
+            positions.append(verdict.get("mention_position") == predicted["mention_position"])
+            sentiments.append((verdict.get("sentiment"), predicted["sentiment"]))
+            contexts.append((mention_classifier.canonical_context(verdict.get("context")), predicted["context"]))
+
+        judged = {str(c.get("name", "")).lower(): c.get("sentiment") for c in verdict.get("competitors_mentioned", []) if isinstance(c, dict)}
+        classified = {c["name"].lower(): c["sentiment"] for c in predicted["competitors_mentioned"]}
+        union = set(judged) | set(classified)
+        jaccards.append(len(set(judged) & set(classified)) / len(union) if union else 1.0)
+        competitor_sentiments.extend((judged[name], classified[name]) for name in set(judged) & set(classified))
+
+    return {
+        "samples": len(samples),
+        "agreement": {
+            "brand_mentioned": sum(mentioned) / len(mentioned) if mentioned else None,
+            "mention_position": sum(positions) / len(positions) if positions else None,
+            "sentiment": agreement(sentiments, mention_classifier.SENTIMENTS),
+            "context": agreement(contexts, mention_classifier.CONTEXTS),
+            "competitor_jaccard_mean": statistics.fmean(jaccards) if jaccards else None,
+            "competitor_sentiment": agreement(competitor_sentiments, mention_classifier.SENTIMENTS)
+        },
+        "classifier_latency_mean": latency
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the local mention classifier with the LLM judge")
+    parser.add_argument("samples", help="JSON lines file of responses, optionally with the judge's verdict")
+    parser.add_argument("--save-labels", help="Write the samples with their judge verdicts to this JSON lines file")
+    parser.add_argument("--train", action="store_true", help="Fit the classifier on the judge labels and save it to MENTION_CLASSIFIER_PATH")
+    parser.add_argument("--holdout", type=float, default=0.3, help="Fraction of samples held out from training")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="classifier_agreement_report.json")
+    args = parser.parse_args()
+
+    with open(args.samples, "r", encoding="utf-8") as file:
+        samples = [json.loads(line) for line in file if line.strip()]
+
+    judge_latencies = label_samples(samples)
+    if args.save_labels:
+        with open(args.save_labels, "w", encoding="utf-8") as file:
+            for sample in samples:
+                file.write(json.dumps(sample) + "\n")
+
+    report = {"judge_latency_mean": statistics.fmean(judge_latencies) if judge_latencies else None}
+    evaluated = samples
+    if args.train:
+        shuffled = list(samples)
+        random.Random(args.seed).shuffle(shuffled)
+        split = len(shuffled) - int(len(shuffled) * args.holdout)
+        train, evaluated = shuffled[:split], shuffled[split:]
+        windows, sentiments, contexts = training_examples(train)
+        started = time.perf_counter()
+        weights = mention_classifier.fit(windows, sentiments, contexts)
+        mention_classifier.save(weights)
+        report["training"] = {
+            "samples": len(train),
+            "windows": len(windows),
+            "seconds": time.perf_counter() - started,
+            "saved_to": mention_classifier.MENTION_CLASSIFIER_PATH
+        }
+
+    report.update(compare(evaluated))
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
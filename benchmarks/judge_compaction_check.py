@@ -0,0 +1,116 @@
+"""
+Side-by-side accuracy check of compacted vs full-text judging.
+
+Runs analyze_brand_in_response twice on each stored response, once with the
+full text and once with the mention windows from libs/response_compaction.py,
+and reports agreement together with judge input tokens and latency:
+
+    python benchmarks/judge_compaction_check.py samples.jsonl --context-chars 300
+
+Each input line is {"response": "...", "brand_name": "...", "competitors": [...]}.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+
+load_dotenv(override=True)
+
+import libs.geo_analysis as geo_analysis
+import libs.response_compaction as response_compaction
+import libs.cost_planner as cost_planner
+import libs.providers as providers
+
+
+def judge(client, sample: dict, compact: bool) -> dict:
+    """
+    Runs the judge on one sample and records input tokens and latency.
+    """
+    judge_input = geo_analysis.prepare_judge_input(sample["response"], sample["brand_name"], sample["competitors"], compact)
+    if judge_input is None:
+        prompt_tokens = 0
+    else:
+        prompt_tokens = cost_planner.count_tokens(geo_analysis.build_brand_analysis_prompt(
+            judge_input["text"], sample["brand_name"], sample["competitors"], judge_input["compacted"]
+        ))
+
+    started = time.perf_counter()
+    verdict = geo_analysis.analyze_brand_in_response(client, sample["response"], sample["brand_name"], sample["competitors"], compact=compact)
+    return {"verdict": verdict, "prompt_tokens": prompt_tokens, "latency": time.perf_counter() - started}
+
+
+def competitor_names(verdict: dict) -> set:
+    return {str(c.get("name", "")).lower() for c in verdict.get("competitors_mentioned", []) if isinstance(c, dict)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare compacted and full-text judging")
+    parser.add_argument("samples", help="JSON lines file of responses to judge")
+    parser.add_argument("--context-chars", type=int, default=response_compaction.JUDGE_CONTEXT_CHARS)
+    parser.add_argument("--output", default="judge_compaction_report.json")
+    args = parser.parse_args()
+
+    response_compaction.JUDGE_CONTEXT_CHARS = args.context_chars
+    client = providers.get_client("judge")
+
+    with open(args.samples, "r", encoding="utf-8") as file:
+        samples = [json.loads(line) for line in file if line.strip()]
+
+    rows = []
+    for sample in samples:
+        full = judge(client, sample, compact=False)
+        compacted = judge(client, sample, compact=True)
+        full_competitors = competitor_names(full["verdict"])
+        compacted_competitors = competitor_names(compacted["verdict"])
+        union = full_competitors | compacted_competitors
+        rows.append({
+            "brand_mentioned_agrees": full["verdict"].get("brand_mentioned") == compacted["verdict"].get("brand_mentioned"),
+            "position_agrees": full["verdict"].get("mention_position") == compacted["verdict"].get("mention_position"),
+            "sentiment_agrees": full["verdict"].get("sentiment") == compacted["verdict"].get("sentiment"),
+            "competitor_jaccard": len(full_competitors & compacted_competitors) / len(union) if union else 1.0,
+            "full_prompt_tokens": full["prompt_tokens"],
+            "compacted_prompt_tokens": compacted["prompt_tokens"],
+            "full_latency": full["latency"],
+            "compacted_latency": compacted["latency"]
+        })
+
+    def rate(key):
+        return sum(1 for row in rows if row[key]) / len(rows) if rows else None
+
+    full_tokens = sum(row["full_prompt_tokens"] for row in rows)
+    compacted_tokens = sum(row["compacted_prompt_tokens"] for row in rows)
+    report = {
+        "samples": len(rows),
+        "context_chars": args.context_chars,
+        "agreement": {
+            "brand_mentioned": rate("brand_mentioned_agrees"),
+            "mention_position": rate("position_agrees"),
+            "sentiment": rate("sentiment_agrees"),
+            "competitor_jaccard_mean": statistics.fmean(row["competitor_jaccard"] for row in rows) if rows else None
+        },
+        "judge_input_tokens": {
+            "full": full_tokens,
+            "compacted": compacted_tokens,
+            "reduction": 1 - compacted_tokens / full_tokens if full_tokens else None
+        },
+        "judge_latency_mean": {
+            "full": statistics.fmean(row["full_latency"] for row in rows) if rows else None,
+            "compacted": statistics.fmean(row["compacted_latency"] for row in rows) if rows else None
+        },
+        "rows": rows
+    }
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(json.dumps({k: v for k, v in report.items() if k != "rows"}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,411 @@
+"""
+HTTP-level load test harness for the Evidentia Flask endpoints.
+
+Starts the mock OpenAI upstream and server.py (unless --target is given),
+opens N concurrent SSE and JSON clients and records time-to-first-event,
+event inter-arrival gaps, dropped streams and server CPU/memory. The report
+is written as JSON so runs can be compared across commits:
+
+    python benchmarks/load_test.py --clients 20 --output load_report.json
+    python benchmarks/load_test.py --clients 20 --compare load_report.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Request bodies for each scenario; SSE scenarios are parsed event by event
+SCENARIOS = {
+    "stream-test-queries": {
+        "path": "/stream-test-queries",
+        "sse": True,
+        "payload": {
+            "brandName": "Acme",
+            "queries": [f"What is the best tool for task number {i}?" for i in range(5)],
+            "competitors": ["Globex", "Initech"],
+            "models": ["gpt-4o-mini-2024-07-18"]
+        }
+    },
+    "stream-brand-info": {
+        "path": "/stream-brand-info",
+        "sse": True,
+        "payload": {"brandName": "Acme", "brandWebsite": "acme.com", "brandCountry": "world"}
+    },
+    "brand-info": {
+        "path": "/brand-info",
+        "sse": False,
+        "payload": {"brandName": "Acme", "brandWebsite": "acme.com", "brandCountry": "world"}
+    },
+    "generate-queries": {
+        "path": "/generate-queries",
+        "sse": False,
+        "payload": {
+            "brandName": "Acme",
+            "brandCountry": "world",
+            "brandDescription": "Acme builds workflow automation for small businesses.",
+            "brandIndustry": "Software",
+            "totalQueries": 10
+        }
+    }
+}
+
+
+def percentile(values: list, pct: float):
+    """
+    Returns the pct-th percentile (0-100) of values using nearest-rank, or None if empty.
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1)))))
+    return ordered[rank]
+
+
+def summarize(values: list) -> dict:
+    """
+    Summarizes a list of durations (seconds) into count/mean/p50/p95/p99/max.
+    """
+    if not values:
+        return {"count": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    return {
+        "count": len(values),
+        "mean": statistics.fmean(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values)
+    }
+
+
+def run_sse_client(base_url: str, scenario: dict, timeout: float) -> dict:
+    """
+    Opens one SSE stream and records event timings.
+
+    A stream counts as dropped when the connection fails, the server sends an
+    error event, or the stream ends without a 'complete' step.
+    """
+    started = time.perf_counter()
+    event_times = []
+    completed = False
+    error = None
+
+    try:
+        with requests.post(base_url + scenario["path"], json=scenario["payload"], stream=True, timeout=timeout) as response:
+            response.raise_for_status()
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if not line or not line.startswith("data: "):
+                    continue
+                event_times.append(time.perf_counter())
+                event = json.loads(line[6:])
+                if event.get("error"):
+                    error = event["error"]
+                    break
+                if event.get("step") == "complete":
+                    completed = True
+    except Exception as e:
+        error = str(e)
+
+    gaps = [later - earlier for earlier, later in zip(event_times, event_times[1:])]
+    return {
+        "ok": completed and error is None,
+        "error": error,
+        "time_to_first_event": event_times[0] - started if event_times else None,
+        "gaps": gaps,
+        "events": len(event_times),
+        "duration": time.perf_counter() - started
+    }
+
+
+def run_json_client(base_url: str, scenario: dict, timeout: float) -> dict:
+    """
+    Sends one JSON request and records its latency.
+    """
+    started = time.perf_counter()
+    error = None
+    try:
+        response = requests.post(base_url + scenario["path"], json=scenario["payload"], timeout=timeout)
+        if response.status_code != 200:
+            error = f"HTTP {response.status_code}: {response.text[:200]}"
+    except Exception as e:
+        error = str(e)
+
+    duration = time.perf_counter() - started
+    return {
+        "ok": error is None,
+        "error": error,
+        "time_to_first_event": duration,
+        "gaps": [],
+        "events": 1 if error is None else 0,
+        "duration": duration
+    }
+
+
+class ProcessSampler:
+    """
+    Samples CPU and resident memory of a process from /proc (Linux only).
+    """
+
+    def __init__(self, pid: int, interval: float = 0.25):
+        self.pid = pid
+        self.interval = interval
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._clock_ticks = os.sysconf("SC_CLK_TCK")
+        self._page_size = os.sysconf("SC_PAGE_SIZE")
+
+    def _read(self):
+        with open(f"/proc/{self.pid}/stat", "r") as file:
+            fields = file.read().rsplit(")", 1)[1].split()
+        # utime and stime are fields 14 and 15 of /proc/<pid>/stat (index 11/12 after the comm field)
+        cpu_seconds = (int(fields[11]) + int(fields[12])) / self._clock_ticks
+        with open(f"/proc/{self.pid}/statm", "r") as file:
+            rss_bytes = int(file.read().split()[1]) * self._page_size
+        return cpu_seconds, rss_bytes
+
+    def _run(self):
+        previous = None
+        while not self._stop.is_set():
+            try:
+                cpu_seconds, rss_bytes = self._read()
+            except (OSError, IndexError, ValueError):
+                return
+            now = time.perf_counter()
+            if previous is not None:
+                cpu_percent = (cpu_seconds - previous[1]) / (now - previous[0]) * 100
+                self.samples.append({"cpu_percent": cpu_percent, "rss_mb": rss_bytes / 1024 / 1024})
+            previous = (now, cpu_seconds)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> dict:
+        self._stop.set()
+        self._thread.join(timeout=2)
+        cpu = [s["cpu_percent"] for s in self.samples]
+        rss = [s["rss_mb"] for s in self.samples]
+        return {
+            "samples": len(self.samples),
+            "cpu_percent_mean": statistics.fmean(cpu) if cpu else None,
+            "cpu_percent_max": max(cpu) if cpu else None,
+            "rss_mb_max": max(rss) if rss else None
+        }
+
+
+def wait_until_healthy(url: str, timeout: float = 30):
+    """
+    Polls a /health endpoint until it answers or the timeout expires.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if requests.get(url + "/health", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not become healthy within {timeout}s")
+
+
+def start_stack(server_port: int, upstream_port: int, latency_ms: float, jitter_ms: float, store_dir: str, with_stores: bool = False):
+    """
+    Starts the mock upstream and server.py as subprocesses wired together.
+
+    The server's response corpus, brand profile, SERP snapshot and response
+    blob stores live in store_dir, never in the project's real stores, so mock
+    answers are not served to real runs. Unless with_stores is set they are
+    also disabled, so repeated requests are not served from the stores and
+    reports stay comparable across commits.
+
+    Returns:
+        tuple: (server process, upstream process)
+    """
+    upstream = subprocess.Popen(
+        [sys.executable, os.path.join(PROJECT_ROOT, "benchmarks", "mock_upstream.py"),
+         "--port", str(upstream_port), "--latency-ms", str(latency_ms), "--jitter-ms", str(jitter_ms)],
+        cwd=PROJECT_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    wait_until_healthy(f"http://127.0.0.1:{upstream_port}")
+
+    env = dict(os.environ)
+    env["OPENAI_BASE_URL"] = f"http://127.0.0.1:{upstream_port}/v1"
+    env["OPENAI_API_KEY"] = "mock-key"
+    env["RESPONSE_CORPUS_PATH"] = os.path.join(store_dir, "response_corpus.db")
+    env["BRAND_PROFILE_PATH"] = os.path.join(store_dir, "brand_profiles.db")
+    env["SERP_SNAPSHOT_PATH"] = os.path.join(store_dir, "serp_snapshots.db")
+    env["RESPONSE_BLOB_DIR"] = os.path.join(store_dir, "response_blobs")
+    if not with_stores:
+        env["RESPONSE_CORPUS"] = "0"
+        env["BRAND_PROFILE_TTL_HOURS"] = "0"
+        env["SERP_SNAPSHOTS"] = "0"
+        env["RESPONSE_BLOBS"] = "0"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "flask", "--app", "server", "run",
+         "--port", str(server_port), "--no-reload", "--no-debugger", "--with-threads"],
+        cwd=PROJECT_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    wait_until_healthy(f"http://127.0.0.1:{server_port}")
+    return server, upstream
+
+
+def git_commit() -> str:
+    """
+    Returns the current git commit hash, or 'unknown' outside a git checkout.
+    """
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=PROJECT_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_scenario(base_url: str, name: str, clients: int, requests_per_client: int, timeout: float) -> dict:
+    """
+    Runs one scenario with N concurrent clients and aggregates the results.
+    """
+    scenario = SCENARIOS[name]
+    client_fn = run_sse_client if scenario["sse"] else run_json_client
+
+    def client_loop(_):
+        return [client_fn(base_url, scenario, timeout) for _ in range(requests_per_client)]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as executor:
+        results = [r for batch in executor.map(client_loop, range(clients)) for r in batch]
+    wall_time = time.perf_counter() - started
+
+    ok = [r for r in results if r["ok"]]
+    errors = {}
+    for r in results:
+        if r["error"]:
+            key = r["error"][:120]
+            errors[key] = errors.get(key, 0) + 1
+
+    return {
+        "clients": clients,
+        "requests": len(results),
+        "completed": len(ok),
+        "dropped": len(results) - len(ok),
+        "drop_rate": (len(results) - len(ok)) / len(results) if results else 0,
+        "throughput_rps": len(ok) / wall_time if wall_time > 0 else 0,
+        "wall_time": wall_time,
+        "time_to_first_event": summarize([r["time_to_first_event"] for r in ok if r["time_to_first_event"] is not None]),
+        "inter_arrival_gap": summarize([gap for r in ok for gap in r["gaps"]]),
+        "duration": summarize([r["duration"] for r in ok]),
+        "errors": errors
+    }
+
+
+def compare_reports(current: dict, baseline: dict) -> list:
+    """
+    Produces human-readable deltas of the key metrics between two reports.
+    """
+    lines = [f"Comparing {current['meta']['commit'][:10]} against {baseline['meta']['commit'][:10]}"]
+    for name, result in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for label, now, before in [
+            ("ttfe p95", result["time_to_first_event"]["p95"], previous["time_to_first_event"]["p95"]),
+            ("gap p95", result["inter_arrival_gap"]["p95"], previous["inter_arrival_gap"]["p95"]),
+            ("duration p95", result["duration"]["p95"], previous["duration"]["p95"]),
+            ("throughput", result["throughput_rps"], previous["throughput_rps"]),
+            ("drop rate", result["drop_rate"], previous["drop_rate"])
+        ]:
+            if now is None or before is None:
+                continue
+            change = ((now - before) / before * 100) if before else 0
+            lines.append(f"  {name:<22} {label:<13} {before:10.3f} -> {now:10.3f} ({change:+.1f}%)")
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent SSE/JSON load test for server.py")
+    parser.add_argument("--clients", type=int, default=10, help="Concurrent clients per scenario")
+    parser.add_argument("--requests-per-client", type=int, default=1)
+    parser.add_argument("--scenarios", nargs="+", default=list(SCENARIOS), choices=list(SCENARIOS))
+    parser.add_argument("--target", help="Base URL of an already running server (skips starting the stack)")
+    parser.add_argument("--server-pid", type=int, help="PID to sample when --target is used")
+    parser.add_argument("--server-port", type=int, default=5050)
+    parser.add_argument("--upstream-port", type=int, default=5055)
+    parser.add_argument("--latency-ms", type=float, default=300, help="Mock upstream latency")
+    parser.add_argument("--jitter-ms", type=float, default=150, help="Mock upstream latency jitter")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-request timeout in seconds")
+    parser.add_argument("--output", default="load_report.json")
+    parser.add_argument("--compare", help="Baseline report to compare against")
+    parser.add_argument("--with-stores", action="store_true", help="Keep the server's stores enabled (in a temporary directory) to measure them")
+    args = parser.parse_args()
+
+    # Load the baseline first so --compare and --output may name the same file
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as file:
+            baseline = json.load(file)
+
+    processes = []
+    store_dir = None
+    if args.target:
+        base_url = args.target.rstrip("/")
+        server_pid = args.server_pid
+    else:
+        store_dir = tempfile.mkdtemp(prefix="evidentia-load-")
+        server, upstream = start_stack(args.server_port, args.upstream_port, args.latency_ms, args.jitter_ms, store_dir, args.with_stores)
+        processes = [server, upstream]
+        base_url = f"http://127.0.0.1:{args.server_port}"
+        server_pid = server.pid
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "clients": args.clients,
+            "requests_per_client": args.requests_per_client,
+            "upstream_latency_ms": args.latency_ms,
+            "upstream_jitter_ms": args.jitter_ms,
+            "stores": "enabled" if args.with_stores else "disabled",
+            "target": base_url
+        },
+        "scenarios": {},
+        "server_resources": {}
+    }
+
+    try:
+        for name in args.scenarios:
+            sampler = ProcessSampler(server_pid) if server_pid else None
+            if sampler:
+                sampler.start()
+            print(f"Running {name} with {args.clients} concurrent clients...")
+            report["scenarios"][name] = run_scenario(base_url, name, args.clients, args.requests_per_client, args.timeout)
+            if sampler:
+                report["server_resources"][name] = sampler.stop()
+            result = report["scenarios"][name]
+            print(f"  completed {result['completed']}/{result['requests']}, "
+                  f"ttfe p95 {result['time_to_first_event']['p95']}, throughput {result['throughput_rps']:.2f} req/s")
+    finally:
+        for process in processes:
+            process.terminate()
+            process.wait(timeout=10)
+        if store_dir:
+            shutil.rmtree(store_dir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {args.output}")
+
+    if baseline:
+        print("\n".join(compare_reports(report, baseline)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,251 @@
+"""
+Mock OpenAI upstream used by the load test harness.
+
+Implements just enough of the Chat Completions and Responses APIs for the
+Evidentia server to run end to end without network access or API spend.
+Point the server at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+"""
+import argparse
+import json
+import random
+import re
+import time
+
+from flask import Flask, request, jsonify
+
+app = Flask(__name__)
+
+# Simulated upstream latency, configurable from the command line
+LATENCY_MS = 300
+JITTER_MS = 150
+# Simulated decode time per output token, so latency grows with the length of the answer
+OUTPUT_TOKEN_MS = 0
+# Fraction of requests that stall for STALL_MS on top of the usual latency, to simulate a latency tail
+STALL_RATE = 0
+STALL_MS = 5000
+# Simulated provider prompt caching: prefixes of at least this many tokens are cached, in 128-token increments
+PROMPT_CACHE_MIN_TOKENS = 1024
+PROMPT_CACHE_INCREMENT = 128
+
+MOCK_BRANDS = ["Acme", "Globex", "Initech", "Umbrella", "Hooli", "Stark Industries"]
+
+
+def simulate_latency():
+    """
+    Sleeps for the configured upstream latency plus uniform jitter.
+    """
+    delay_ms = LATENCY_MS + random.uniform(-JITTER_MS, JITTER_MS)
+    if STALL_RATE > 0 and random.random() < STALL_RATE:
+        delay_ms += STALL_MS
+    time.sleep(max(delay_ms, 0) / 1000)
+
+
+def simulate_decode(output_tokens: int):
+    """
+    Sleeps for the configured per-output-token decode time.
+    """
+    if OUTPUT_TOKEN_MS > 0:
+        time.sleep(output_tokens * OUTPUT_TOKEN_MS / 1000)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Rough token count (~4 characters per token) used to fill usage fields.
+    """
+    return max(1, len(text) // 4)
+
+
+_seen_prefixes = set()
+
+
+def cached_prompt_tokens(prompt: str) -> int:
+    """
+    Returns how many leading tokens of prompt were seen in an earlier request, as provider prompt caching reports them.
+    """
+    prompt_tokens = count_tokens(prompt)
+    cached = 0
+    length = PROMPT_CACHE_MIN_TOKENS
+    while length <= prompt_tokens:
+        prefix = hash(prompt[:length * 4])
+        if prefix in _seen_prefixes:
+            cached = length
+        else:
+            if len(_seen_prefixes) > 100000:
+                _seen_prefixes.clear()
+            _seen_prefixes.add(prefix)
+        length += PROMPT_CACHE_INCREMENT
+    return cached
+
+
+def mock_text_answer(prompt: str) -> str:
+    """
+    Builds a plausible free-text answer mentioning a few random brands.
+    """
+    brands = random.sample(MOCK_BRANDS, 3)
+    lines = [f"Here are some options for: {prompt[:80]}"]
+    for i, brand in enumerate(brands, start=1):
+        lines.append(f"{i}. **{brand}**: a well known provider with good reviews and fair pricing.")
+    lines.append("Compare features and pricing before choosing the right solution for your needs.")
+    return "\n".join(lines)
+
+
+def mock_judge_answer(prompt: str) -> str:
+    """
+    Builds a judge verdict in the JSON shape expected by the GEO analyzer.
+    """
+    mentioned = random.random() < 0.5
+    return json.dumps({
+        "brand_mentioned": mentioned,
+        "mention_position": random.randint(1, 3) if mentioned else None,
+        "sentiment": random.choice(["positive", "neutral", "negative"]),
+        "context": "recommendation" if mentioned else "not mentioned",
+        "competitors_mentioned": [
+            {"name": brand, "position": i + 1, "sentiment": "neutral"}
+            for i, brand in enumerate(random.sample(MOCK_BRANDS, 2))
+        ]
+    })
+
+
+def mock_structured_answer(schema_name: str, prompt: str = "") -> str:
+    """
+    Builds a structured-output answer for the json_schema formats used in libs/utils.py.
+    """
+    if schema_name == "brand_description":
+        return json.dumps({"description": "Mock Brand is a software company offering workflow automation to small businesses."})
+    if schema_name == "brand_name":
+        return json.dumps({"name": "Mock Brand"})
+    if schema_name == "competitor_analysis":
+        return json.dumps({"competitors": [
+            {"name": brand, "website": f"https://{brand.lower().replace(' ', '')}.com", "reason": "Offers a similar product."}
+            for brand in random.sample(MOCK_BRANDS, 3)
+        ]})
+    if schema_name == "string_translations":
+        # Echo every item back under its id, tagged so callers can tell it went through the batch path
+        items_match = re.search(r"ITEMS_START\s*(\[.*\])\s*ITEMS_END", prompt, re.DOTALL)
+        items = json.loads(items_match.group(1)) if items_match else []
+        return json.dumps({"translations": [{"id": item["id"], "text": f"[translated] {item['text']}"} for item in items]})
+    return json.dumps({})
+
+
+@app.route('/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    data = request.json or {}
+    prompt = "\n".join(str(m.get("content", "")) for m in data.get("messages", []))
+    response_format = data.get("response_format") or {}
+    n = int(data.get("n") or 1)
+
+    simulate_latency()
+
+    choices = []
+    for index in range(n):
+        if response_format.get("type") == "json_schema":
+            content = mock_structured_answer(response_format.get("json_schema", {}).get("name", ""), prompt)
+        elif "brand_mentioned" in prompt:
+            content = mock_judge_answer(prompt)
+        else:
+            content = mock_text_answer(prompt)
+        choices.append({
+            "index": index,
+            "message": {"role": "assistant", "content": content},
+            "finish_reason": "stop"
+        })
+
+    prompt_tokens = count_tokens(prompt)
+    completion_tokens = sum(count_tokens(c["message"]["content"]) for c in choices)
+    simulate_decode(completion_tokens)
+    return jsonify({
+        "id": f"chatcmpl-mock-{random.getrandbits(32):08x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": data.get("model", "mock"),
+        "choices": choices,
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_prompt_tokens(prompt)}
+        }
+    })
+
+
+@app.route('/v1/responses', methods=['POST'])
+def responses():
+    data = request.json or {}
+    prompt = data.get("input", "")
+    if not isinstance(prompt, str):
+        prompt = json.dumps(prompt)
+
+    simulate_latency()
+
+    # Query generation asks for "exactly **N**" prompts; anything else is a web search analysis
+    total_match = re.search(r"exactly \*\*(\d+)\*\*", prompt)
+    if total_match:
+        total = int(total_match.group(1))
+        # Sharded generation runs ask for one batch each; number the queries so batches do not collide
+        batch_match = re.search(r"batch (\d+) of", prompt)
+        offset = (int(batch_match.group(1)) - 1) * 1000 if batch_match else 0
+        text = json.dumps([
+            {"topic": f"Mock topic {offset + i + 1}", "prompt": f"Recommend a tool for mock need number {offset + i + 1}."}
+            for i in range(total)
+        ])
+    else:
+        text = json.dumps({
+            "summary": "Mock web search summary.",
+            "key_insights": ["insight 1", "insight 2"],
+            "sources": [{"title": "Mock source", "url": "https://example.com", "snippet": "Mock snippet"}],
+            "search_quality": "medium",
+            "last_updated": "recent"
+        })
+
+    input_tokens = count_tokens(prompt)
+    output_tokens = count_tokens(text)
+    simulate_decode(output_tokens)
+    return jsonify({
+        "id": f"resp_mock_{random.getrandbits(32):08x}",
+        "object": "response",
+        "created_at": int(time.time()),
+        "model": data.get("model", "mock"),
+        "status": "completed",
+        "parallel_tool_calls": True,
+        "tool_choice": "auto",
+        "tools": [],
+        "output": [{
+            "type": "message",
+            "id": f"msg_mock_{random.getrandbits(32):08x}",
+            "role": "assistant",
+            "status": "completed",
+            "content": [{"type": "output_text", "text": text, "annotations": []}]
+        }],
+        "usage": {
+            "input_tokens": input_tokens,
+            "input_tokens_details": {"cached_tokens": cached_prompt_tokens(prompt)},
+            "output_tokens": output_tokens,
+            "output_tokens_details": {"reasoning_tokens": 0},
+            "total_tokens": input_tokens + output_tokens
+        }
+    })
+
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    return jsonify({'status': 'healthy'})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Mock OpenAI upstream for load testing")
+    parser.add_argument("--port", type=int, default=5055)
+    parser.add_argument("--latency-ms", type=float, default=LATENCY_MS)
+    parser.add_argument("--jitter-ms", type=float, default=JITTER_MS)
+    parser.add_argument("--output-token-ms", type=float, default=OUTPUT_TOKEN_MS)
+    parser.add_argument("--stall-rate", type=float, default=STALL_RATE)
+    parser.add_argument("--stall-ms", type=float, default=STALL_MS)
+    parser.add_argument("--prompt-cache-min-tokens", type=int, default=PROMPT_CACHE_MIN_TOKENS)
+    args = parser.parse_args()
+
+    LATENCY_MS = args.latency_ms
+    JITTER_MS = args.jitter_ms
+    OUTPUT_TOKEN_MS = args.output_token_ms
+    STALL_RATE = args.stall_rate
+    STALL_MS = args.stall_ms
+    PROMPT_CACHE_MIN_TOKENS = args.prompt_cache_min_tokens
+    app.run(host='127.0.0.1', port=args.port, threaded=True)
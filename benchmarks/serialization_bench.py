@@ -0,0 +1,94 @@
+"""
+Benchmark of SSE frame serialization: json.dumps f-string frames vs libs/serialization.
+
+Builds a GEO analysis result with N query_performance rows (default 10,000,
+each carrying a 500-character llm_response excerpt), serializes it as the
+final "result" SSE frame both ways, checks that both frames decode to the
+same payload and reports the timings:
+
+    python benchmarks/serialization_bench.py --rows 10000 --repeat 5
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import libs.serialization as serialization
+
+
+def build_result(rows: int) -> dict:
+    """
+    Builds an analysis_results dict shaped like analyze_llm_brand_positioning output.
+    """
+    words = ["brand", "tool", "pricing", "startup", "integration", "support", "è", "über", "cost-effective", "✅"]
+    query_performance = []
+    for i in range(rows):
+        response = " ".join(random.choice(words) for _ in range(120))[:500] + "..."
+        query_performance.append({
+            "query": f"What is the best tool for use case {i}?",
+            "model": random.choice(["gpt-4o-mini-2024-07-18", "gpt-3.5-turbo"]),
+            "llm_response": response,
+            "brand_mentioned": random.random() < 0.4,
+            "mention_position": random.randint(1, 5),
+            "sentiment": random.choice(["positive", "neutral", "negative"]),
+            "context": "recommendation",
+            "competitors_mentioned": [{"name": "Globex", "position": 2, "sentiment": "neutral"}],
+            "response_length": 87
+        })
+    return {
+        "brand_name": "Acme",
+        "total_queries_tested": rows,
+        "query_performance": query_performance,
+        "overall_metrics": {"mention_rate": 41.2, "average_mention_position": 2.7}
+    }
+
+
+def time_it(fn, repeat: int) -> list:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark SSE frame serialization")
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    result = build_result(args.rows)
+    payload = {"status": "GEO Analysis complete!", "step": "complete", "progress": 100, "result": result}
+
+    # Baseline: the str frame the server used to build, encoded as the WSGI server would
+    def baseline():
+        return f"data: {json.dumps(payload)}\n\n".encode("utf-8")
+
+    def optimized():
+        return serialization.sse_event(payload)
+
+    baseline_frame = baseline()
+    optimized_frame = optimized()
+    assert json.loads(baseline_frame[6:]) == json.loads(optimized_frame[6:]), "Frames decode to different payloads"
+
+    baseline_times = time_it(baseline, args.repeat)
+    optimized_times = time_it(optimized, args.repeat)
+    baseline_median = statistics.median(baseline_times)
+    optimized_median = statistics.median(optimized_times)
+
+    print(json.dumps({
+        "rows": args.rows,
+        "json_dumps": {"median_ms": baseline_median * 1000, "frame_bytes": len(baseline_frame)},
+        "orjson": {"median_ms": optimized_median * 1000, "frame_bytes": len(optimized_frame)},
+        "speedup": baseline_median / optimized_median if optimized_median else None
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,355 @@
+import os
+import time
+from typing import Dict, Any, List, Optional
+
+
+# Quantiles tracked for mention positions
+POSITION_QUANTILES = (0.5, 0.9)
+# Minimum seconds between live metrics snapshots sent to streaming clients
+LIVE_METRICS_INTERVAL = float(os.getenv("LIVE_METRICS_INTERVAL", "1.0"))
+
+SENTIMENTS = ("positive", "neutral", "negative")
+
+
+class RunningStats:
+    """
+    Count, mean, variance, min and max of a stream of numbers in constant memory (Welford's algorithm).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = None
+        self.max = None
+
+    def add(self, value: float):
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+
+    def variance(self) -> float:
+        return self._m2 / (self.count - 1) if self.count > 1 else 0.0
+
+
+class P2Quantile:
+    """
+    Streaming estimate of one quantile in constant memory (the P-square algorithm of Jain and Chlamtac).
+
+    Five markers track the minimum, the quantile, the maximum and two
+    midpoints; their heights are adjusted with a piecewise-parabolic formula
+    as observations arrive. The first five observations are kept exactly.
+    """
+
+    def __init__(self, q: float):
+        self.q = q
+        self.heights: List[float] = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * q, 1 + 4 * q, 3 + 2 * q, 5]
+        self.increments = [0, q / 2, q, (1 + q) / 2, 1]
+
+    def add(self, value: float):
+        heights = self.heights
+        if len(heights) < 5:
+            heights.append(value)
+            heights.sort()
+            return
+
+        if value < heights[0]:
+            heights[0] = value
+            cell = 0
+        elif value >= heights[4]:
+            heights[4] = value
+            cell = 3
+        else:
+            cell = next(i for i in range(4) if heights[i] <= value < heights[i + 1])
+
+        for i in range(cell + 1, 5):
+            self.positions[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+
+        for i in range(1, 4):
+            offset = self.desired[i] - self.positions[i]
+            if (offset >= 1 and self.positions[i + 1] - self.positions[i] > 1) or \
+               (offset <= -1 and self.positions[i - 1] - self.positions[i] < -1):
+                step = 1 if offset > 0 else -1
+                height = self._parabolic(i, step)
+                if not heights[i - 1] < height < heights[i + 1]:
+                    height = self._linear(i, step)
+                heights[i] = height
+                self.positions[i] += step
+
+    def _parabolic(self, i: int, step: int) -> float:
+        n, h = self.positions, self.heights
+        return h[i] + step / (n[i + 1] - n[i - 1]) * (
+            (n[i] - n[i - 1] + step) * (h[i + 1] - h[i]) / (n[i + 1] - n[i])
+            + (n[i + 1] - n[i] - step) * (h[i] - h[i - 1]) / (n[i] - n[i - 1])
+        )
+
+    def _linear(self, i: int, step: int) -> float:
+        n, h = self.positions, self.heights
+        return h[i] + step * (h[i + step] - h[i]) / (n[i + step] - n[i])
+
+    def value(self) -> Optional[float]:
+        if not self.heights:
+            return None
+        if len(self.heights) < 5:
+            return self.heights[min(len(self.heights) - 1, int(self.q * len(self.heights)))]
+        return self.heights[2]
+
+
+class DistributionSketch:
+    """
+    Running stats plus POSITION_QUANTILES sketches of a stream of numbers, in constant memory.
+    """
+
+    def __init__(self, quantiles=POSITION_QUANTILES):
+        self.stats = RunningStats()
+        self.quantiles = {q: P2Quantile(q) for q in quantiles}
+
+    def add(self, value: float):
+        self.stats.add(value)
+        for sketch in self.quantiles.values():
+            sketch.add(value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        summary = {
+            "count": self.stats.count,
+            "mean": self.stats.mean if self.stats.count else None,
+            "std": self.stats.variance() ** 0.5 if self.stats.count else None,
+            "min": self.stats.min,
+            "max": self.stats.max
+        }
+        for q, sketch in self.quantiles.items():
+            summary[f"p{int(q * 100)}"] = sketch.value()
+        return summary
+
+
+class _BrandCounts:
+    def __init__(self):
+        self.rows = 0
+        self.mentions = 0.0
+        self.positions = DistributionSketch()
+        self.sentiments = {sentiment: 0 for sentiment in SENTIMENTS}
+
+    def add_sentiment(self, sentiment: str, count: int = 1):
+        if sentiment in self.sentiments:
+            self.sentiments[sentiment] += count
+
+    def sentiment_distribution(self) -> Dict[str, float]:
+        total = sum(self.sentiments.values())
+        return {sentiment: (count / total) * 100 if total else 0 for sentiment, count in self.sentiments.items()}
+
+
+class GeoAggregator:
+    """
+    Online aggregation of GEO query_performance rows into model, overall and competitor metrics.
+
+    Each row updates counters and sketches as it arrives, so memory stays
+    constant per model and competitor however many queries are tested, and
+    snapshot() gives the current metrics at any moment (e.g. for live SSE
+    updates). Rows from multi-sample runs count as fractional mentions weighted
+    by their mention probability.
+    """
+
+    def __init__(self, llm_models: List[str] = None):
+        self.models: Dict[str, _BrandCounts] = {model: _BrandCounts() for model in llm_models or []}
+        self.overall = _BrandCounts()
+        self.competitors: Dict[str, Dict[str, Any]] = {}
+        self.judge_skipped = 0
+        self._last_live = None
+
+    def add_row(self, row: Dict[str, Any]):
+        """
+        Adds one query_performance row.
+        """
+        self.judge_skipped += row.get("judge_skipped", 0)
+        model = self.models.setdefault(row["model"], _BrandCounts())
+        for counts in (model, self.overall):
+            counts.rows += 1
+            if "mention_probability" in row:
+                counts.mentions += row["mention_probability"]
+                for position in row["mention_positions"]:
+                    counts.positions.add(position)
+                for sentiment, count in row["sentiment_counts"].items():
+                    counts.add_sentiment(sentiment, count)
+            elif row["brand_mentioned"]:
+                counts.mentions += 1
+                if row["mention_position"] is not None:
+                    counts.positions.add(row["mention_position"])
+                counts.add_sentiment(row["sentiment"])
+
+        for comp in row["competitors_mentioned"]:
+            competitor = self.competitors.get(comp["name"])
+            if competitor is None:
+                competitor = self.competitors[comp["name"]] = {
+                    "mentions": 0,
+                    "positions": DistributionSketch(),
+                    "sentiment_distribution": {sentiment: 0 for sentiment in SENTIMENTS}
+                }
+            competitor["mentions"] += 1
+            if comp.get("position") is not None:
+                competitor["positions"].add(comp["position"])
+            if comp.get("sentiment") in competitor["sentiment_distribution"]:
+                competitor["sentiment_distribution"][comp["sentiment"]] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Current metrics in the shape of the GEO analysis results.
+
+        Returns:
+            Dict: "model_performance", "overall_metrics" and "competitor_analysis"; positions
+                  are summarized by average plus a "position_stats" sketch instead of raw lists
+        """
+        model_performance = {}
+        for model, counts in self.models.items():
+            model_performance[model] = {
+                "queries_tested": counts.rows,
+                "mention_rate": (counts.mentions / counts.rows) * 100 if counts.rows else 0,
+                "average_position": counts.positions.stats.mean if counts.positions.stats.count else 0,
+                "position_stats": counts.positions.to_dict(),
+                "sentiment_distribution": counts.sentiment_distribution()
+            }
+
+        overall = self.overall
+        mention_rate = (overall.mentions / overall.rows) * 100 if overall.rows else 0
+        distribution = overall.sentiment_distribution()
+        overall_metrics = {
+            "mention_rate": mention_rate,
+            "positive_positioning": distribution["positive"],
+            "neutral_positioning": distribution["neutral"],
+            "negative_positioning": distribution["negative"],
+            "average_mention_position": overall.positions.stats.mean if overall.positions.stats.count else 0,
+            "mention_position_stats": overall.positions.to_dict(),
+            "brand_visibility_score": mention_rate,
+            # Responses scored "not mentioned" by judge compaction without asking the judge
+            "judge_skipped_responses": self.judge_skipped
+        }
+
+        competitor_analysis = {}
+        for name, competitor in self.competitors.items():
+            positions = competitor["positions"]
+            competitor_analysis[name] = {
+                "mentions": competitor["mentions"],
+                "average_position": positions.stats.mean if positions.stats.count else 0,
+                "position_stats": positions.to_dict(),
+                "sentiment_distribution": dict(competitor["sentiment_distribution"])
+            }
+
+        return {
+            "model_performance": model_performance,
+            "overall_metrics": overall_metrics,
+            "competitor_analysis": competitor_analysis
+        }
+
+    def live_snapshot(self, force: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Returns snapshot() at most once per LIVE_METRICS_INTERVAL seconds (always with force), otherwise None.
+        """
+        now = time.monotonic()
+        if not force and self._last_live is not None and now - self._last_live < LIVE_METRICS_INTERVAL:
+            return None
+        self._last_live = now
+        return self.snapshot()
+
+
+class _RankCounts:
+    def __init__(self):
+        self.tested = 0
+        self.found = 0
+        self.in_top_10 = 0
+        self.positions = DistributionSketch()
+
+    def add(self, position: Optional[int]):
+        self.tested += 1
+        if position is not None:
+            self.found += 1
+            self.positions.add(position)
+            if position <= 10:
+                self.in_top_10 += 1
+
+    def average_position(self) -> float:
+        return self.positions.stats.mean if self.positions.stats.count else 0
+
+    def visibility_score(self) -> float:
+        return (self.found / self.tested) * 100 if self.tested else 0
+
+
+class SerpAggregator:
+    """
+    Online aggregation of SERP query_performance rows into location, overall and competitor metrics.
+
+    The search counterpart of GeoAggregator: constant memory per location and
+    competitor, and snapshot() at any moment.
+    """
+
+    def __init__(self, locations: List[str] = None):
+        self.locations: Dict[str, _RankCounts] = {location: _RankCounts() for location in locations or []}
+        self.overall = _RankCounts()
+        self.competitors: Dict[str, DistributionSketch] = {}
+        self.partial_searches = 0
+        self._last_live = None
+
+    def add_row(self, row: Dict[str, Any]):
+        """
+        Adds one query_performance row (one query searched in one location).
+        """
+        if row.get("search_partial"):
+            self.partial_searches += 1
+        position = row["brand_position"] if row["brand_found"] else None
+        self.locations.setdefault(row["location"], _RankCounts()).add(position)
+        self.overall.add(position)
+        for comp in row["competitors_found"]:
+            self.competitors.setdefault(comp["name"], DistributionSketch()).add(comp["position"])
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Current metrics in the shape of the SERP analysis results.
+
+        Returns:
+            Dict: "location_performance", "overall_metrics" and "competitor_analysis"
+        """
+        location_performance = {
+            location: {
+                "queries_tested": counts.tested,
+                "average_position": counts.average_position(),
+                "visibility_score": counts.visibility_score(),
+                "position_stats": counts.positions.to_dict()
+            }
+            for location, counts in self.locations.items()
+        }
+        overall_metrics = {
+            "average_position": self.overall.average_position(),
+            "visibility_score": self.overall.visibility_score(),
+            "queries_in_top_10": self.overall.in_top_10,
+            "queries_not_found": self.overall.tested - self.overall.found,
+            "partial_searches": self.partial_searches,
+            "position_stats": self.overall.positions.to_dict()
+        }
+        competitor_analysis = {
+            name: {
+                "appearances": positions.stats.count,
+                "average_position": positions.stats.mean,
+                "position_stats": positions.to_dict()
+            }
+            for name, positions in self.competitors.items()
+        }
+        return {
+            "location_performance": location_performance,
+            "overall_metrics": overall_metrics,
+            "competitor_analysis": competitor_analysis
+        }
+
+    def live_snapshot(self, force: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        Returns snapshot() at most once per LIVE_METRICS_INTERVAL seconds (always with force), otherwise None.
+        """
+        now = time.monotonic()
+        if not force and self._last_live is not None and now - self._last_live < LIVE_METRICS_INTERVAL:
+            return None
+        self._last_live = now
+        return self.snapshot()
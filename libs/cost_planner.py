@@ -0,0 +1,299 @@
+import os
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+import tiktoken
+
+import libs.geo_analysis as geo_analysis
+import libs.providers as providers
+import libs.mention_classifier as mention_classifier
+
+
+# USD per 1M tokens: (input, cached input, output)
+MODEL_PRICING = {
+    "gpt-4o-mini-2024-07-18": (0.15, 0.075, 0.60),
+    "gpt-4o-mini": (0.15, 0.075, 0.60),
+    "gpt-4o": (2.50, 1.25, 10.00),
+    "gpt-4-turbo": (10.00, 10.00, 30.00),
+    "gpt-3.5-turbo": (0.50, 0.50, 1.50),
+}
+DEFAULT_PRICING = (2.50, 1.25, 10.00)
+
+JUDGE_MODEL = "gpt-4o-mini-2024-07-18"
+
+# max_tokens caps used by get_llm_response and analyze_brand_in_response
+GENERATION_MAX_TOKENS = 500
+JUDGE_MAX_TOKENS = 300
+
+# Expected fraction of the cap actually produced, used for the "expected" (as opposed to worst-case) figures
+GENERATION_FILL_RATIO = float(os.getenv("GENERATION_FILL_RATIO", "0.9"))
+JUDGE_FILL_RATIO = float(os.getenv("JUDGE_FILL_RATIO", "0.4"))
+
+# Per-message overhead of the chat format (role and separators)
+CHAT_MESSAGE_OVERHEAD = 7
+
+# Budgets in tokens (worst case); 0 disables the limit
+RUN_TOKEN_BUDGET = int(os.getenv("RUN_TOKEN_BUDGET", "0"))
+TENANT_DAILY_TOKEN_BUDGET = int(os.getenv("TENANT_DAILY_TOKEN_BUDGET", "0"))
+
+_encoders = {}
+_encoder_lock = threading.Lock()
+_tenant_lock = threading.RLock()
+_tenant_spend: Dict[tuple, int] = {}
+
+
+def _get_encoder(model: str):
+    with _encoder_lock:
+        if model not in _encoders:
+            try:
+                _encoders[model] = tiktoken.encoding_for_model(model)
+            except Exception:
+                try:
+                    _encoders[model] = tiktoken.get_encoding("o200k_base")
+                except Exception as e:
+                    # Encodings are downloaded on first use; without network fall back to a heuristic
+                    print(f"tiktoken unavailable, estimating tokens from characters: {e}")
+                    _encoders[model] = None
+        return _encoders[model]
+
+
+def count_tokens(text: str, model: str = JUDGE_MODEL) -> int:
+    """
+    Counts tokens locally with tiktoken, falling back to ~4 characters per token.
+
+    Args:
+        text (str): Text to tokenize.
+        model (str, optional): Model whose tokenizer should be used.
+
+    Returns:
+        int: Number of tokens.
+    """
+    encoder = _get_encoder(model)
+    if encoder is None:
+        return max(1, len(text) // 4) if text else 0
+    return len(encoder.encode(text))
+
+
+def _cost(model: str, prompt_tokens: int, completion_tokens: int, role: str = "generate") -> float:
+    # Calls served by the local provider have no per-token cost
+    if providers.is_local(role):
+        return 0.0
+    input_price, _, output_price = MODEL_PRICING.get(model, DEFAULT_PRICING)
+    return (prompt_tokens * input_price + completion_tokens * output_price) / 1_000_000
+
+
+def estimate_geo_run(brand_name: str, competitors: List[str], queries: List[str], llm_models: List[str], samples_per_query: int = 1) -> Dict[str, Any]:
+    """
+    Estimates prompt/completion tokens and cost of a GEO run before any call is made.
+
+    Generation prompts are tokenized as sent; completions are bounded by the
+    500-token cap. The judge prompt embeds the generated response, so its
+    input is the tokenized template plus the generation output. With
+    samples_per_query > 1 the generation prompt is sent (and billed) once per
+    query while completions and judge calls scale with the number of samples.
+
+    Args:
+        brand_name (str): The brand to analyze
+        competitors (List[str]): List of competitor names
+        queries (List[str]): List of queries to test
+        llm_models (List[str]): List of LLM models to test
+        samples_per_query (int, optional): Responses sampled per (query, model) in one call. Defaults to 1.
+
+    Returns:
+        Dict: Per-stage and total calls, tokens (expected and worst case) and cost in USD
+    """
+    query_tokens = [count_tokens(query) + CHAT_MESSAGE_OVERHEAD for query in queries]
+    judge_template_tokens = count_tokens(geo_analysis.build_brand_analysis_prompt("", brand_name, competitors)) + 2 * CHAT_MESSAGE_OVERHEAD
+
+    expected_generation_completion = int(GENERATION_MAX_TOKENS * GENERATION_FILL_RATIO)
+    expected_judge_completion = int(JUDGE_MAX_TOKENS * JUDGE_FILL_RATIO)
+    responses_per_model = len(queries) * samples_per_query
+
+    generation = {"calls": 0, "prompt_tokens": 0, "completion_tokens_expected": 0, "completion_tokens_max": 0, "cost_expected": 0.0, "cost_max": 0.0}
+    for model in llm_models:
+        prompt_tokens = sum(query_tokens)
+        expected = responses_per_model * expected_generation_completion
+        worst = responses_per_model * GENERATION_MAX_TOKENS
+        generation["calls"] += len(queries)
+        generation["prompt_tokens"] += prompt_tokens
+        generation["completion_tokens_expected"] += expected
+        generation["completion_tokens_max"] += worst
+        generation["cost_expected"] += _cost(model, prompt_tokens, expected)
+        generation["cost_max"] += _cost(model, prompt_tokens, worst)
+
+    # The in-process classifier replaces the judge calls entirely
+    judge_calls = 0 if mention_classifier.enabled() else responses_per_model * len(llm_models)
+    judge = {
+        "calls": judge_calls,
+        "prompt_tokens_expected": judge_calls * (judge_template_tokens + expected_generation_completion),
+        "prompt_tokens_max": judge_calls * (judge_template_tokens + GENERATION_MAX_TOKENS),
+        "completion_tokens_expected": judge_calls * expected_judge_completion,
+        "completion_tokens_max": judge_calls * JUDGE_MAX_TOKENS
+    }
+    judge_model = providers.model_for("judge")
+    judge["provider"] = "classifier" if mention_classifier.enabled() else providers.provider_for("judge")
+    judge["cost_expected"] = _cost(judge_model, judge["prompt_tokens_expected"], judge["completion_tokens_expected"], "judge")
+    judge["cost_max"] = _cost(judge_model, judge["prompt_tokens_max"], judge["completion_tokens_max"], "judge")
+
+    tokens_expected = generation["prompt_tokens"] + generation["completion_tokens_expected"] + judge["prompt_tokens_expected"] + judge["completion_tokens_expected"]
+    tokens_max = generation["prompt_tokens"] + generation["completion_tokens_max"] + judge["prompt_tokens_max"] + judge["completion_tokens_max"]
+
+    return {
+        "queries": len(queries),
+        "samples_per_query": samples_per_query,
+        "models": llm_models,
+        "stages": {"generation": generation, "judge": judge},
+        "total": {
+            "calls": generation["calls"] + judge["calls"],
+            "tokens_expected": tokens_expected,
+            "tokens_max": tokens_max,
+            "cost_expected": generation["cost_expected"] + judge["cost_expected"],
+            "cost_max": generation["cost_max"] + judge["cost_max"]
+        }
+    }
+
+
+def tenant_tokens_spent(tenant: str) -> int:
+    """
+    Returns the tokens reserved today by a tenant.
+    """
+    with _tenant_lock:
+        return _tenant_spend.get((tenant, time.strftime("%Y-%m-%d")), 0)
+
+
+def check_budget(estimate: Dict[str, Any], tenant: str = "default", run_budget: int = None, policy: str = "refuse") -> Dict[str, Any]:
+    """
+    Decides whether a run fits the per-run and per-tenant token budgets.
+
+    Budgets are checked against the worst-case token count so an approved run
+    cannot overspend. With the "downsize" policy the run is cut to the largest
+    number of queries that fits instead of being refused.
+
+    Args:
+        estimate (Dict): Output of estimate_geo_run.
+        tenant (str, optional): Tenant identifier. Defaults to "default".
+        run_budget (int, optional): Per-run token budget; defaults to RUN_TOKEN_BUDGET.
+        policy (str, optional): "refuse" or "downsize". Defaults to "refuse".
+
+    Returns:
+        Dict: allowed flag, number of queries allowed, remaining budgets and reason
+    """
+    run_budget = RUN_TOKEN_BUDGET if run_budget is None else run_budget
+    limits = []
+    if run_budget > 0:
+        limits.append(run_budget)
+    tenant_remaining = None
+    if TENANT_DAILY_TOKEN_BUDGET > 0:
+        tenant_remaining = max(0, TENANT_DAILY_TOKEN_BUDGET - tenant_tokens_spent(tenant))
+        limits.append(tenant_remaining)
+
+    tokens_max = estimate["total"]["tokens_max"]
+    total_queries = estimate["queries"]
+    decision = {
+        "allowed": True,
+        "queries_allowed": total_queries,
+        "tokens_max": tokens_max,
+        "run_budget": run_budget or None,
+        "tenant": tenant,
+        "tenant_remaining": tenant_remaining,
+        "downsized": False,
+        "reason": None
+    }
+
+    if not limits or tokens_max <= min(limits):
+        return decision
+
+    limit = min(limits)
+    per_query = tokens_max / total_queries if total_queries else tokens_max
+    fitting_queries = int(limit // per_query) if per_query else 0
+
+    if policy == "downsize" and fitting_queries > 0:
+        decision["queries_allowed"] = fitting_queries
+        decision["tokens_max"] = int(per_query * fitting_queries)
+        decision["downsized"] = True
+        decision["reason"] = f"Run downsized from {total_queries} to {fitting_queries} queries to fit a budget of {limit} tokens"
+        return decision
+
+    decision["allowed"] = False
+    decision["queries_allowed"] = 0
+    decision["reason"] = f"Run needs up to {tokens_max} tokens but the budget allows {limit}"
+    return decision
+
+
+def parse_budget(value: Any) -> Optional[int]:
+    """
+    Validates a requested per-run token budget.
+
+    Returns:
+        int: The budget, or None when not given (RUN_TOKEN_BUDGET applies)
+
+    Raises:
+        ValueError: If the value is not a non-negative whole number
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise ValueError("budgetTokens must be a non-negative integer")
+    try:
+        budget = int(value)
+    except (TypeError, ValueError):
+        raise ValueError("budgetTokens must be a non-negative integer")
+    if budget < 0 or budget != float(value):
+        raise ValueError("budgetTokens must be a non-negative integer")
+    return budget
+
+
+def reserve_tokens(tenant: str, tokens: int, day: str = None):
+    """
+    Charges a tenant's daily budget with the worst-case tokens of an approved run.
+    """
+    key = (tenant, day or time.strftime("%Y-%m-%d"))
+    with _tenant_lock:
+        _tenant_spend[key] = max(0, _tenant_spend.get(key, 0) + tokens)
+
+
+def admit_run(estimate: Dict[str, Any], tenant: str = "default", run_budget: int = None, policy: str = "refuse") -> Dict[str, Any]:
+    """
+    Checks the budgets and, if the run is allowed, reserves its tokens atomically.
+
+    The reservation is the run's worst case; settle_run replaces it with the
+    tokens actually used once the run ends.
+
+    Args:
+        estimate (Dict): Output of estimate_geo_run.
+        tenant (str, optional): Tenant identifier. Defaults to "default".
+        run_budget (int, optional): Per-run token budget; defaults to RUN_TOKEN_BUDGET.
+        policy (str, optional): "refuse" or "downsize". Defaults to "refuse".
+
+    Returns:
+        Dict: The budget decision from check_budget
+    """
+    with _tenant_lock:
+        decision = check_budget(estimate, tenant, run_budget, policy)
+        if decision["allowed"]:
+            decision["reserved_on"] = time.strftime("%Y-%m-%d")
+            reserve_tokens(tenant, decision["tokens_max"], decision["reserved_on"])
+        return decision
+
+
+def settle_run(decision: Dict[str, Any], tokens_used: int):
+    """
+    Replaces the worst-case reservation of an admitted run with the tokens it actually used.
+
+    Call it once the run ends, whether it completed, failed or was cancelled,
+    so tenants are charged what their runs spent rather than drifting over
+    budget. Reused responses and short answers cost less than the worst case,
+    and a run that failed before any call costs nothing. Settling twice, or
+    settling a decision that reserved nothing, does nothing.
+
+    Args:
+        decision (Dict): The decision returned by admit_run.
+        tokens_used (int): Prompt and completion tokens the run's calls reported.
+    """
+    with _tenant_lock:
+        if not decision or not decision.get("reserved_on") or decision.get("settled"):
+            return
+        decision["settled"] = True
+        decision["tokens_used"] = tokens_used
+        reserve_tokens(decision["tenant"], tokens_used - decision["tokens_max"], decision["reserved_on"])
@@ -1,11 +1,49 @@
-import os
 import json
 from typing import List, Dict, Any
 import time
 from openai import OpenAI
 from langchain.prompts import PromptTemplate
+import libs.metrics as metrics
+import libs.tracing as tracing
+import libs.response_compaction as response_compaction
+import libs.query_dedup as query_dedup
+import libs.sampling as sampling
+import libs.response_corpus as response_corpus
+import libs.singleflight as singleflight
+import libs.hedging as hedging
+import libs.latency as latency
+import libs.aggregation as aggregation
+import libs.response_blobs as response_blobs
+import libs.providers as providers
+import libs.mention_classifier as mention_classifier
 
-def analyze_llm_brand_positioning_streaming(brand_name: str, competitors: List[str], queries: List[str], llm_models: List[str] = None, progress_callback=None) -> Dict[str, Any]:
+# Responses sampled per (query, model) in one n=k call; providers reject larger n (OpenAI's limit is 128)
+MAX_SAMPLES_PER_QUERY = 128
+
+def parse_samples(value: Any) -> int:
+    """
+    Validates a requested number of samples per (query, model) (the "samplesPerQuery" request field).
+
+    Returns:
+        int: The number of samples, 1 when not given
+
+    Raises:
+        ValueError: If the value is not a whole number from 1 to MAX_SAMPLES_PER_QUERY
+    """
+    if value is None or value == "":
+        return 1
+    message = f"samplesPerQuery must be an integer from 1 to {MAX_SAMPLES_PER_QUERY}"
+    if isinstance(value, bool):
+        raise ValueError(message)
+    try:
+        samples = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(message)
+    if samples != float(value) or not 1 <= samples <= MAX_SAMPLES_PER_QUERY:
+        raise ValueError(message)
+    return samples
+
+def analyze_llm_brand_positioning_streaming(brand_name: str, competitors: List[str], queries: List[str], llm_models: List[str] = None, progress_callback=None, dedup_threshold: float = None) -> Dict[str, Any]:
     """
     Streaming version of LLM brand positioning analysis with progress updates.
     
@@ -15,6 +53,7 @@ def analyze_llm_brand_positioning_streaming(brand_name: str, competitors: List[s
         queries (List[str]): List of queries to test
         llm_models (List[str]): List of LLM models to test
         progress_callback: Function to call with progress updates
+        dedup_threshold (float): Similarity above which queries are merged as near-duplicates (defaults to QUERY_DEDUP_THRESHOLD)
         
     Returns:
         Dict: GEO analysis results
@@ -26,12 +65,23 @@ def analyze_llm_brand_positioning_streaming(brand_name: str, competitors: List[s
         if progress_callback:
             progress_callback(message, step, progress, **kwargs)
     
+    # Drop paraphrased queries before they are tested against every model
+    dedup_report = query_dedup.deduplicate_queries(queries, dedup_threshold)
+    if dedup_report["removed"]:
+        log_progress(f"Merged {dedup_report['removed']} near-duplicate queries", "dedup", 0, merged=dedup_report["merged"])
+    queries = dedup_report["queries"]
+    
     log_progress(f"Starting GEO analysis for {len(queries)} queries across {len(llm_models)} models", "init", 0)
     
     analysis_results = {
         "brand_name": brand_name,
         "total_queries_tested": len(queries),
         "llm_models_tested": llm_models,
+        "query_deduplication": {
+            "removed": dedup_report["removed"],
+            "threshold": dedup_report["threshold"],
+            "merged": dedup_report["merged"]
+        },
         "query_performance": [],
         "model_performance": {},
         "competitor_analysis": {},
@@ -45,15 +95,9 @@ def analyze_llm_brand_positioning_streaming(brand_name: str, competitors: List[s
         }
     }
     
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY environment variable is not set")
-    
-    client = OpenAI(api_key=api_key)
+    client = providers.get_client("generate")
     
-    total_mentions = 0
-    mention_positions = []
-    sentiment_scores = {"positive": 0, "neutral": 0, "negative": 0}
+    aggregator = aggregation.GeoAggregator(llm_models)
     
     total_tests = len(queries) * len(llm_models)
     current_test = 0
@@ -61,17 +105,6 @@ def analyze_llm_brand_positioning_streaming(brand_name: str, competitors: List[s
     for model in llm_models:
         log_progress(f"Starting analysis with {model}", "model_start", current_test / total_tests * 100, model=model)
         
-        analysis_results["model_performance"][model] = {
-            "queries_tested": len(queries),
-            "mention_rate": 0,
-            "average_position": 0,
-            "sentiment_distribution": {"positive": 0, "neutral": 0, "negative": 0}
-        }
-        
-        model_mentions = 0
-        model_positions = []
-        model_sentiments = {"positive": 0, "neutral": 0, "negative": 0}
-        
         for query_data in queries:
             query = query_data.get("query", str(query_data)) if isinstance(query_data, dict) else str(query_data)
             current_test += 1
@@ -79,13 +112,14 @@ def analyze_llm_brand_positioning_streaming(brand_name: str, competitors: List[s
             
             log_progress(f"Asking {model}: \"{query}\"", "query_start", progress, model=model, query=query)
             
-            # Generate LLM response for the query
-            llm_response = get_llm_response_streaming(client, query, model, log_progress)
-            
-            log_progress(f"Analyzing brand positioning in response", "analysis_start", progress, model=model, query=query)
-            
-            # Analyze brand positioning in the response
-            brand_analysis = analyze_brand_in_response_streaming(client, llm_response, brand_name, competitors, log_progress)
+            with tracing.span("geo_query", model=model, query=query):
+                # Generate LLM response for the query
+                llm_response = get_llm_response_streaming(client, query, model, log_progress)
+                
+                log_progress(f"Analyzing brand positioning in response", "analysis_start", progress, model=model, query=query)
+                
+                # Analyze brand positioning in the response
+                brand_analysis = analyze_brand_in_response_streaming(providers.get_client("judge"), llm_response, brand_name, competitors, log_progress)
             
             # Log the results
             if brand_analysis["brand_mentioned"]:
@@ -100,89 +134,38 @@ def analyze_llm_brand_positioning_streaming(brand_name: str, competitors: List[s
             query_performance = {
                 "query": query,
                 "model": model,
-                "llm_response": llm_response[:500] + "..." if len(llm_response) > 500 else llm_response,
+                **response_fields(llm_response),
                 "brand_mentioned": brand_analysis["brand_mentioned"],
                 "mention_position": brand_analysis["mention_position"],
                 "sentiment": brand_analysis["sentiment"],
                 "context": brand_analysis["context"],
                 "competitors_mentioned": brand_analysis["competitors_mentioned"],
-                "response_length": len(llm_response.split())
+                "response_length": len(llm_response.split()),
+                "judge_skipped": int(brand_analysis.get("judge_skipped", False)),
+                "failed_samples": int(response_corpus.is_failed(llm_response))
             }
             
             analysis_results["query_performance"].append(query_performance)
             
-            # Update metrics
-            if brand_analysis["brand_mentioned"]:
-                total_mentions += 1
-                model_mentions += 1
-                
-                if brand_analysis["mention_position"] is not None:
-                    mention_positions.append(brand_analysis["mention_position"])
-                    model_positions.append(brand_analysis["mention_position"])
-                
-                sentiment_scores[brand_analysis["sentiment"]] += 1
-                model_sentiments[brand_analysis["sentiment"]] += 1
-        
-        # Calculate model-specific metrics
-        if len(queries) > 0:
-            analysis_results["model_performance"][model]["mention_rate"] = (model_mentions / len(queries)) * 100
-            
-        if model_positions:
-            analysis_results["model_performance"][model]["average_position"] = sum(model_positions) / len(model_positions)
-            
-        for sentiment in model_sentiments:
-            if model_mentions > 0:
-                analysis_results["model_performance"][model]["sentiment_distribution"][sentiment] = (model_sentiments[sentiment] / model_mentions) * 100
+            # Update metrics as each result arrives
+            aggregator.add_row(query_performance)
+            live = aggregator.live_snapshot(force=current_test == total_tests)
+            if live:
+                log_progress(f"Live metrics after {current_test}/{total_tests} tests", "live_metrics", progress, metrics=live)
         
+        model_mentions = round(aggregator.models[model].mentions)
         log_progress(f"Completed analysis with {model} - {model_mentions}/{len(queries)} mentions", 
                    "model_complete", current_test / total_tests * 100, model=model)
     
     log_progress("Calculating final metrics...", "calculating", 95)
     
-    # Calculate overall metrics
-    total_possible_mentions = len(queries) * len(llm_models)
-    if total_possible_mentions > 0:
-        analysis_results["overall_metrics"]["mention_rate"] = (total_mentions / total_possible_mentions) * 100
-        analysis_results["overall_metrics"]["brand_visibility_score"] = (total_mentions / total_possible_mentions) * 100
-    
-    if mention_positions:
-        analysis_results["overall_metrics"]["average_mention_position"] = sum(mention_positions) / len(mention_positions)
-    
-    if total_mentions > 0:
-        analysis_results["overall_metrics"]["positive_positioning"] = (sentiment_scores["positive"] / total_mentions) * 100
-        analysis_results["overall_metrics"]["neutral_positioning"] = (sentiment_scores["neutral"] / total_mentions) * 100
-        analysis_results["overall_metrics"]["negative_positioning"] = (sentiment_scores["negative"] / total_mentions) * 100
-    
-    # Competitor analysis
-    competitor_summary = {}
-    for query_perf in analysis_results["query_performance"]:
-        for comp in query_perf["competitors_mentioned"]:
-            comp_name = comp["name"]
-            if comp_name not in competitor_summary:
-                competitor_summary[comp_name] = {
-                    "mentions": 0,
-                    "average_position": 0,
-                    "positions": [],
-                    "sentiment_distribution": {"positive": 0, "neutral": 0, "negative": 0}
-                }
-            competitor_summary[comp_name]["mentions"] += 1
-            if comp.get("position") is not None:
-                competitor_summary[comp_name]["positions"].append(comp["position"])
-            if comp.get("sentiment"):
-                competitor_summary[comp_name]["sentiment_distribution"][comp["sentiment"]] += 1
-    
-    # Calculate competitor averages
-    for comp_name, data in competitor_summary.items():
-        if data["positions"]:
-            data["average_position"] = sum(data["positions"]) / len(data["positions"])
-    
-    analysis_results["competitor_analysis"] = competitor_summary
+    analysis_results.update(aggregator.snapshot())
     
     log_progress("GEO analysis complete!", "complete", 100)
     
     return analysis_results
 
-def analyze_llm_brand_positioning(brand_name: str, competitors: List[str], queries: List[str], llm_models: List[str] = None) -> Dict[str, Any]:
+def analyze_llm_brand_positioning(brand_name: str, competitors: List[str], queries: List[str], llm_models: List[str] = None, dedup_threshold: float = None, samples_per_query: int = 1, progress_callback=None) -> Dict[str, Any]:
     """
     Analyze how a brand positions in LLM responses across different queries.
     This is the core of Generative Engine Optimization (GEO).
@@ -192,6 +175,9 @@ def analyze_llm_brand_positioning(brand_name: str, competitors: List[str], queri
         competitors (List[str]): List of competitor names
         queries (List[str]): List of queries to test
         llm_models (List[str]): List of LLM models to test (defaults to OpenAI models)
+        dedup_threshold (float): Similarity above which queries are merged as near-duplicates (defaults to QUERY_DEDUP_THRESHOLD)
+        samples_per_query (int): Responses sampled per (query, model) in a single n=k call and aggregated
+        progress_callback: Function to call with live metrics snapshots ("live_metrics" step)
         
     Returns:
         Dict: GEO analysis results including brand mentions, positioning, and competitor comparison
@@ -199,10 +185,20 @@ def analyze_llm_brand_positioning(brand_name: str, competitors: List[str], queri
     if llm_models is None:
         llm_models = ["gpt-4o-mini-2024-07-18", "gpt-3.5-turbo"]
     
+    # Drop paraphrased queries before they are tested against every model
+    dedup_report = query_dedup.deduplicate_queries(queries, dedup_threshold)
+    queries = dedup_report["queries"]
+    
     analysis_results = {
         "brand_name": brand_name,
         "total_queries_tested": len(queries),
         "llm_models_tested": llm_models,
+        "samples_per_query": samples_per_query,
+        "query_deduplication": {
+            "removed": dedup_report["removed"],
+            "threshold": dedup_report["threshold"],
+            "merged": dedup_report["merged"]
+        },
         "query_performance": [],
         "model_performance": {},
         "competitor_analysis": {},
@@ -216,114 +212,442 @@ def analyze_llm_brand_positioning(brand_name: str, competitors: List[str], queri
         }
     }
     
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY environment variable is not set")
+    client = providers.get_client("generate")
     
-    client = OpenAI(api_key=api_key)
+    # Duplicate (model, query) pairs in one run are computed once
+    computed = {}
+    aggregator = aggregation.GeoAggregator(llm_models)
+    total_tests = len(queries) * len(llm_models)
+    for model in llm_models:
+        for query_data in queries:
+            query = query_data.get("query", str(query_data)) if isinstance(query_data, dict) else str(query_data)
+            if (model, query) not in computed:
+                computed[(model, query)] = test_query(client, query, model, brand_name, competitors, samples_per_query)
+            row = dict(computed[(model, query)])
+            analysis_results["query_performance"].append(row)
+            aggregator.add_row(row)
+            
+            done = len(analysis_results["query_performance"])
+            live = aggregator.live_snapshot(force=done == total_tests)
+            if live and progress_callback:
+                progress_callback(f"Tested {done}/{total_tests} queries, mention rate so far {live['overall_metrics']['mention_rate']:.1f}%",
+                                  "live_metrics", done / total_tests * 100, metrics=live)
     
-    total_mentions = 0
-    mention_positions = []
-    sentiment_scores = {"positive": 0, "neutral": 0, "negative": 0}
+    analysis_results.update(aggregator.snapshot())
     
-    for model in llm_models:
-        analysis_results["model_performance"][model] = {
-            "queries_tested": len(queries),
-            "mention_rate": 0,
-            "average_position": 0,
-            "sentiment_distribution": {"positive": 0, "neutral": 0, "negative": 0}
-        }
+    return analysis_results
+
+def analyze_llm_brand_positioning_adaptive(brand_name: str, competitors: List[str], queries: List[str], llm_models: List[str] = None,
+                                           target_margin: float = None, confidence: float = None, max_queries: int = None,
+                                           min_queries: int = None, method: str = "wilson", include_sentiment: bool = False,
+                                           seed: int = None, dedup_threshold: float = None, progress_callback=None) -> Dict[str, Any]:
+    """
+    Sampling mode of the GEO analysis: stops testing a model once its mention rate is known precisely enough.
+    
+    Queries are tested in randomized order, round-robin across the models still
+    sampling. After every response the model's running interval for mention rate
+    (and sentiment share among mentions) is updated; a model stops when the
+    interval half-width is at most target_margin, when the query list is
+    exhausted, or when the overall budget of max_queries (query, model) tests is spent.
+    
+    Args:
+        brand_name (str): The brand to analyze
+        competitors (List[str]): List of competitor names
+        queries (List[str]): List of queries to sample from
+        llm_models (List[str]): List of LLM models to test (defaults to OpenAI models)
+        target_margin (float): Interval half-width to reach, e.g. 0.05 for ±5 points (defaults to SAMPLING_TARGET_MARGIN)
+        confidence (float): Confidence level of the intervals (defaults to SAMPLING_CONFIDENCE)
+        max_queries (int): Budget of (query, model) tests across all models (defaults to all of them)
+        min_queries (int): Tests per model before the stopping rule applies (defaults to SAMPLING_MIN_QUERIES)
+        method (str): "wilson" or "jeffreys" (Bayesian) intervals
+        include_sentiment (bool): Also require every sentiment share to reach target_margin
+        seed (int): Seed of the query shuffle, for reproducible runs
+        dedup_threshold (float): Similarity above which queries are merged as near-duplicates (defaults to QUERY_DEDUP_THRESHOLD)
+        progress_callback: Function to call with progress updates
+        
+    Returns:
+        Dict: GEO analysis results over the sampled queries, plus a "sampling" report with
+              per-model intervals and the number of queries actually spent
+    """
+    if llm_models is None:
+        llm_models = ["gpt-4o-mini-2024-07-18", "gpt-3.5-turbo"]
+    if target_margin is None:
+        target_margin = sampling.SAMPLING_TARGET_MARGIN
+    if confidence is None:
+        confidence = sampling.SAMPLING_CONFIDENCE
+    if min_queries is None:
+        min_queries = sampling.SAMPLING_MIN_QUERIES
+    if method not in sampling.INTERVAL_METHODS:
+        raise ValueError(f"Unknown interval method '{method}', expected one of {sampling.INTERVAL_METHODS}")
+    
+    def log_progress(message, step=None, progress=None, **kwargs):
+        if progress_callback:
+            progress_callback(message, step, progress, **kwargs)
+    
+    dedup_report = query_dedup.deduplicate_queries(queries, dedup_threshold)
+    queries = dedup_report["queries"]
+    schedule = sampling.round_robin_order(queries, llm_models, seed)
+    if max_queries is None:
+        max_queries = len(schedule)
+    
+    analysis_results = {
+        "brand_name": brand_name,
+        "total_queries_tested": 0,
+        "llm_models_tested": llm_models,
+        "query_deduplication": {
+            "removed": dedup_report["removed"],
+            "threshold": dedup_report["threshold"],
+            "merged": dedup_report["merged"]
+        },
+        "query_performance": []
+    }
+    
+    client = providers.get_client("generate")
+    
+    samplers = {model: sampling.ModelSampler(model, confidence, method) for model in llm_models}
+    aggregator = aggregation.GeoAggregator(llm_models)
+    spent = 0
+    for query_data, model in schedule:
+        sampler = samplers[model]
+        if sampler.stop_reason:
+            continue
+        if spent >= max_queries:
+            break
+        
+        query = query_data.get("query", str(query_data)) if isinstance(query_data, dict) else str(query_data)
+        query_performance = test_query(client, query, model, brand_name, competitors)
+        analysis_results["query_performance"].append(query_performance)
+        aggregator.add_row(query_performance)
+        sampler.observe(query_performance["brand_mentioned"], query_performance["sentiment"])
+        spent += 1
+        
+        live = aggregator.live_snapshot()
+        if live:
+            log_progress(f"Tested {spent} queries, mention rate so far {live['overall_metrics']['mention_rate']:.1f}%", "live_metrics", None, metrics=live)
         
-        model_mentions = 0
-        model_positions = []
-        model_sentiments = {"positive": 0, "neutral": 0, "negative": 0}
+        if sampler.precise_enough(target_margin, min_queries, include_sentiment):
+            sampler.stop_reason = "target_precision"
+            log_progress(f"{model} reached ±{target_margin * 100:.1f}% after {sampler.trials} queries", "sampling_stop", None, model=model, sampling=sampler.to_dict())
+        if all(s.stop_reason for s in samplers.values()):
+            break
+    
+    for sampler in samplers.values():
+        if not sampler.stop_reason:
+            sampler.stop_reason = "budget_exhausted" if spent >= max_queries else "queries_exhausted"
+    
+    analysis_results.update(aggregator.snapshot())
+    analysis_results["total_queries_tested"] = len({row["query"] for row in analysis_results["query_performance"]})
+    analysis_results["sampling"] = {
+        "method": method,
+        "confidence": confidence,
+        "target_margin": target_margin,
+        "queries_available": len(schedule),
+        "queries_spent": spent,
+        "budget": max_queries,
+        "models": {model: sampler.to_dict() for model, sampler in samplers.items()}
+    }
+    
+    return analysis_results
+
+def generate_corpus(queries: List[str], llm_models: List[str] = None, samples_per_query: int = 1) -> Dict[str, Any]:
+    """
+    Generation pass only: fill today's response corpus for every (model, query) without judging anything.
+    
+    Args:
+        queries (List[str]): List of queries to generate responses for
+        llm_models (List[str]): List of LLM models (defaults to OpenAI models)
+        samples_per_query (int): Responses to store per (model, query)
         
+    Returns:
+        Dict: Corpus date and counts of (model, query) pairs generated and already stored
+
+    Raises:
+        RuntimeError: If the response corpus is disabled (RESPONSE_CORPUS=0), as nothing generated would be kept
+    """
+    if not response_corpus.RESPONSE_CORPUS:
+        raise RuntimeError("The response corpus is disabled (RESPONSE_CORPUS=0), so generated responses would not be stored")
+    if llm_models is None:
+        llm_models = ["gpt-4o-mini-2024-07-18", "gpt-3.5-turbo"]
+    
+    client = providers.get_client("generate")
+    
+    generated = 0
+    reused = 0
+    for model in llm_models:
         for query_data in queries:
             query = query_data.get("query", str(query_data)) if isinstance(query_data, dict) else str(query_data)
-            
-            # Generate LLM response for the query
-            llm_response = get_llm_response(client, query, model)
-            
-            # Analyze brand positioning in the response
-            brand_analysis = analyze_brand_in_response(client, llm_response, brand_name, competitors)
-            
-            # Store query performance
-            query_performance = {
-                "query": query,
-                "model": model,
-                "llm_response": llm_response[:500] + "..." if len(llm_response) > 500 else llm_response,
-                "brand_mentioned": brand_analysis["brand_mentioned"],
-                "mention_position": brand_analysis["mention_position"],
-                "sentiment": brand_analysis["sentiment"],
-                "context": brand_analysis["context"],
-                "competitors_mentioned": brand_analysis["competitors_mentioned"],
-                "response_length": len(llm_response.split())
-            }
-            
-            analysis_results["query_performance"].append(query_performance)
-            
-            # Update metrics
-            if brand_analysis["brand_mentioned"]:
-                total_mentions += 1
-                model_mentions += 1
-                
-                if brand_analysis["mention_position"] is not None:
-                    mention_positions.append(brand_analysis["mention_position"])
-                    model_positions.append(brand_analysis["mention_position"])
-                
-                sentiment_scores[brand_analysis["sentiment"]] += 1
-                model_sentiments[brand_analysis["sentiment"]] += 1
+            if len(response_corpus.get_responses(model, query, samples_per_query)) >= samples_per_query:
+                reused += 1
+                continue
+            with tracing.span("geo_query", model=model, query=query, samples=samples_per_query):
+                generate_responses(client, query, model, samples_per_query)
+            generated += 1
+    
+    return {
+        "date": response_corpus.today(),
+        "models": llm_models,
+        "queries": len(queries),
+        "samples_per_query": samples_per_query,
+        "generated": generated,
+        "reused": reused
+    }
+
+def score_corpus(brand_sets: List[Dict[str, Any]], queries: List[str] = None, llm_models: List[str] = None,
+                 samples_per_query: int = 1, date: str = None) -> List[Dict[str, Any]]:
+    """
+    Scoring pass only: judge stored corpus responses for any number of brand/competitor sets, with no generation calls.
+    
+    Args:
+        brand_sets (List[Dict]): One {"brand_name", "competitors"} dict per brand to score
+        queries (List[str]): Queries to score (defaults to every query stored for the date)
+        llm_models (List[str]): List of LLM models (defaults to OpenAI models)
+        samples_per_query (int): Stored samples to judge per (model, query)
+        date (str): Corpus date (YYYY-MM-DD), defaults to today
         
-        # Calculate model-specific metrics
-        if len(queries) > 0:
-            analysis_results["model_performance"][model]["mention_rate"] = (model_mentions / len(queries)) * 100
-            
-        if model_positions:
-            analysis_results["model_performance"][model]["average_position"] = sum(model_positions) / len(model_positions)
-            
-        for sentiment in model_sentiments:
-            if model_mentions > 0:
-                analysis_results["model_performance"][model]["sentiment_distribution"][sentiment] = (model_sentiments[sentiment] / model_mentions) * 100
-    
-    # Calculate overall metrics
-    total_possible_mentions = len(queries) * len(llm_models)
-    if total_possible_mentions > 0:
-        analysis_results["overall_metrics"]["mention_rate"] = (total_mentions / total_possible_mentions) * 100
-        analysis_results["overall_metrics"]["brand_visibility_score"] = (total_mentions / total_possible_mentions) * 100
-    
-    if mention_positions:
-        analysis_results["overall_metrics"]["average_mention_position"] = sum(mention_positions) / len(mention_positions)
-    
-    if total_mentions > 0:
-        analysis_results["overall_metrics"]["positive_positioning"] = (sentiment_scores["positive"] / total_mentions) * 100
-        analysis_results["overall_metrics"]["neutral_positioning"] = (sentiment_scores["neutral"] / total_mentions) * 100
-        analysis_results["overall_metrics"]["negative_positioning"] = (sentiment_scores["negative"] / total_mentions) * 100
-    
-    # Competitor analysis
-    competitor_summary = {}
-    for query_perf in analysis_results["query_performance"]:
-        for comp in query_perf["competitors_mentioned"]:
-            comp_name = comp["name"]
-            if comp_name not in competitor_summary:
-                competitor_summary[comp_name] = {
-                    "mentions": 0,
-                    "average_position": 0,
-                    "positions": [],
-                    "sentiment_distribution": {"positive": 0, "neutral": 0, "negative": 0}
-                }
-            competitor_summary[comp_name]["mentions"] += 1
-            if comp.get("position") is not None:
-                competitor_summary[comp_name]["positions"].append(comp["position"])
-            if comp.get("sentiment"):
-                competitor_summary[comp_name]["sentiment_distribution"][comp["sentiment"]] += 1
-    
-    # Calculate competitor averages
-    for comp_name, data in competitor_summary.items():
-        if data["positions"]:
-            data["average_position"] = sum(data["positions"]) / len(data["positions"])
-    
-    analysis_results["competitor_analysis"] = competitor_summary
+    Returns:
+        List[Dict]: One GEO analysis result per brand set, each listing the (model, query) pairs missing from the corpus
+
+    Raises:
+        RuntimeError: If the response corpus is disabled (RESPONSE_CORPUS=0)
+    """
+    if not response_corpus.RESPONSE_CORPUS:
+        raise RuntimeError("The response corpus is disabled (RESPONSE_CORPUS=0), so there are no stored responses to score")
+    if llm_models is None:
+        llm_models = ["gpt-4o-mini-2024-07-18", "gpt-3.5-turbo"]
+    date = date or response_corpus.today()
+    if queries is None:
+        queries = response_corpus.list_queries(date, llm_models)
+    query_strings = [query.get("query", str(query)) if isinstance(query, dict) else str(query) for query in queries]
+    
+    # Load the corpus once and reuse it for every brand
+    corpus = {}
+    missing = []
+    for model in llm_models:
+        for query in query_strings:
+            responses = response_corpus.get_responses(model, query, samples_per_query, date)
+            if responses:
+                corpus[(model, query)] = responses
+            else:
+                missing.append({"model": model, "query": query})
+    
+    # Scoring only judges stored responses
+    client = providers.get_client("judge")
+    
+    results = []
+    for brand_set in brand_sets:
+        brand_name = brand_set["brand_name"]
+        competitors = brand_set.get("competitors", [])
+        analysis_results = {
+            "brand_name": brand_name,
+            "total_queries_tested": len({query for _, query in corpus}),
+            "llm_models_tested": llm_models,
+            "samples_per_query": samples_per_query,
+            "corpus": {"date": date, "responses_scored": sum(len(r) for r in corpus.values()), "missing": missing},
+            "query_performance": []
+        }
+        for (model, query), responses in corpus.items():
+            with tracing.span("geo_query", model=model, query=query, samples=len(responses)):
+                analysis_results["query_performance"].append(score_responses(client, query, model, responses, brand_name, competitors))
+        summarize_query_performance(analysis_results, llm_models)
+        results.append(analysis_results)
+    
+    return results
+
+def test_query(client: OpenAI, query: str, model: str, brand_name: str, competitors: List[str], samples_per_query: int = 1) -> Dict[str, Any]:
+    """
+    Run one (model, query) unit of GEO work: generate a response and judge the brand's positioning in it.
+    
+    Generation uses the given client; judging uses the provider configured for the judge role.
+    
+    Args:
+        client: Client of the generation provider
+        query: The query to ask
+        model: The model to use
+        brand_name: The brand to analyze
+        competitors: List of competitor names
+        samples_per_query: Responses to sample in one n=k call; above 1 the row aggregates the samples
+        
+    Returns:
+        Dict: The query_performance row for this response (or these samples)
+    """
+    with tracing.span("geo_query", model=model, query=query, samples=samples_per_query):
+        llm_responses = generate_responses(client, query, model, samples_per_query)
+        return score_responses(providers.get_client("judge"), query, model, llm_responses, brand_name, competitors)
+
+def generate_responses(client: OpenAI, query: str, model: str, samples_per_query: int = 1) -> List[str]:
+    """
+    Get the responses for (model, query), reusing today's response corpus and generating only missing samples.
+    
+    Responses depend only on (model, query), so one generation pass serves every brand audited on the same queries,
+    and concurrent runs asking for the same (model, query) share a single generation.
+    
+    Args:
+        client: OpenAI client
+        query: The query to ask
+        model: The model to use
+        samples_per_query: Number of sampled responses wanted
+        
+    Returns:
+        List[str]: The responses, one per sample
+    """
+    # Exact key: the corpus stores responses under the query as written
+    key = f"generate-responses:{model}:{samples_per_query}:{query}"
+    return singleflight.do(key, lambda: _generate_responses(client, query, model, samples_per_query), "generate-responses")
+
+def _generate_responses(client: OpenAI, query: str, model: str, samples_per_query: int) -> List[str]:
+    stored = []
+    if response_corpus.RESPONSE_CORPUS:
+        stored = response_corpus.get_responses(model, query, samples_per_query)
+        metrics.record_cache("response_corpus", len(stored) >= samples_per_query)
+    
+    missing = samples_per_query - len(stored)
+    if missing <= 0:
+        return stored
+    
+    # Generate LLM response(s) for the query
+    if missing > 1:
+        generated = get_llm_responses(client, query, model, missing)
+    else:
+        generated = [get_llm_response(client, query, model)]
+    
+    if response_corpus.RESPONSE_CORPUS:
+        response_corpus.store_responses(model, query, generated)
+    return stored + generated
+
+def score_responses(client: OpenAI, query: str, model: str, llm_responses: List[str], brand_name: str, competitors: List[str]) -> Dict[str, Any]:
+    """
+    Judge the brand's positioning in the responses to one (model, query) and build its query_performance row.
+    
+    Args:
+        client: Client of the judge provider (providers.get_client("judge"))
+        query: The query the responses answer
+        model: The model that generated them
+        llm_responses: One response per sample
+        brand_name: The brand to analyze
+        competitors: List of competitor names
+        
+    Returns:
+        Dict: The query_performance row; with several responses the row aggregates the samples that
+              were generated, and "failed_samples" counts those that were not
+    """
+    # Samples that could not be generated are counted, not scored, unless none could
+    samples_requested = len(llm_responses)
+    failed_samples = sum(1 for llm_response in llm_responses if response_corpus.is_failed(llm_response))
+    if 0 < failed_samples < samples_requested:
+        llm_responses = [llm_response for llm_response in llm_responses if not response_corpus.is_failed(llm_response)]
+    
+    # Analyze brand positioning in each response (all samples in one batch with the in-process classifier)
+    if mention_classifier.enabled():
+        brand_analyses = mention_classifier.classify_responses(llm_responses, brand_name, competitors)
+    else:
+        brand_analyses = [analyze_brand_in_response(client, llm_response, brand_name, competitors) for llm_response in llm_responses]
+    
+    llm_response = llm_responses[0]
+    row = {
+        "query": query,
+        "model": model,
+        **response_fields(llm_response),
+        "brand_mentioned": brand_analyses[0]["brand_mentioned"],
+        "mention_position": brand_analyses[0]["mention_position"],
+        "sentiment": brand_analyses[0]["sentiment"],
+        "context": brand_analyses[0]["context"],
+        "competitors_mentioned": brand_analyses[0]["competitors_mentioned"],
+        "response_length": len(llm_response.split()),
+        # Samples decided by compaction without a judge call (no name match)
+        "judge_skipped": sum(1 for analysis in brand_analyses if analysis.get("judge_skipped")),
+        "failed_samples": failed_samples
+    }
+    if samples_requested > 1:
+        row.update(aggregate_samples(brand_analyses))
+        row["response_length"] = sum(len(response.split()) for response in llm_responses) / len(llm_responses)
+        for verdict, response in zip(row["sample_verdicts"], llm_responses):
+            verdict["llm_response_hash"] = response_blobs.put(response)
+    return row
+
+def response_fields(llm_response: str) -> Dict[str, Any]:
+    """
+    The query_performance fields for a response: a 500-character excerpt plus the hash of the full text.
+    
+    The full response goes to the blob store, so results stay small and the
+    text can still be fetched from /responses/<hash> for audits or re-scoring.
+    
+    Args:
+        llm_response: The full response text
+        
+    Returns:
+        Dict: "llm_response" (the excerpt) and "llm_response_hash" (None if the blob store is disabled)
+    """
+    return {
+        "llm_response": llm_response[:500] + "..." if len(llm_response) > 500 else llm_response,
+        "llm_response_hash": response_blobs.put(llm_response)
+    }
+
+def aggregate_samples(brand_analyses: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Aggregate the judge verdicts of several sampled responses to the same query.
+    
+    Args:
+        brand_analyses: One analyze_brand_in_response verdict per sample
+        
+    Returns:
+        Dict: Row fields for the query: mention probability, sentiment counts over mentioning
+              samples, mean position, majority brand_mentioned/sentiment, competitors seen
+              in any sample (each with its own mention probability) and the per-sample verdicts
+    """
+    samples = len(brand_analyses)
+    mentioned = [analysis for analysis in brand_analyses if analysis["brand_mentioned"]]
+    positions = [analysis["mention_position"] for analysis in mentioned if analysis["mention_position"] is not None]
+    sentiment_counts = {"positive": 0, "neutral": 0, "negative": 0}
+    for analysis in mentioned:
+        if analysis["sentiment"] in sentiment_counts:
+            sentiment_counts[analysis["sentiment"]] += 1
     
+    # Competitors seen in any sample, counted once per sample
+    competitors = {}
+    for analysis in brand_analyses:
+        seen = set()
+        for comp in analysis["competitors_mentioned"]:
+            name = comp.get("name")
+            if name in seen:
+                continue
+            seen.add(name)
+            if name not in competitors:
+                competitors[name] = dict(comp, mention_probability=0)
+            competitors[name]["mention_probability"] += 1
+    for comp in competitors.values():
+        comp["mention_probability"] /= samples
+    
+    return {
+        "samples": samples,
+        "mention_probability": len(mentioned) / samples,
+        "brand_mentioned": len(mentioned) * 2 >= samples,
+        "mention_position": sum(positions) / len(positions) if positions else None,
+        "mention_positions": positions,
+        "sentiment": max(sentiment_counts, key=sentiment_counts.get) if mentioned else "neutral",
+        "sentiment_counts": sentiment_counts,
+        "context": mentioned[0]["context"] if mentioned else brand_analyses[0]["context"],
+        "competitors_mentioned": list(competitors.values()),
+        "sample_verdicts": [
+            {"brand_mentioned": analysis["brand_mentioned"], "mention_position": analysis["mention_position"], "sentiment": analysis["sentiment"]}
+            for analysis in brand_analyses
+        ]
+    }
+
+def summarize_query_performance(analysis_results: Dict[str, Any], llm_models: List[str]) -> Dict[str, Any]:
+    """
+    Fill model_performance, overall_metrics and competitor_analysis from the query_performance rows.
+    
+    Args:
+        analysis_results: Analysis results holding the "query_performance" rows
+        llm_models: The models tested, in report order
+        
+    Returns:
+        Dict: The same analysis_results, updated in place
+    """
+    aggregator = aggregation.GeoAggregator(llm_models)
+    for row in analysis_results["query_performance"]:
+        aggregator.add_row(row)
+    analysis_results.update(aggregator.snapshot())
     return analysis_results
 
 def get_llm_response_streaming(client: OpenAI, query: str, model: str, log_progress=None) -> str:
@@ -350,16 +674,19 @@ def get_llm_response_streaming(client: OpenAI, query: str, model: str, log_progr
                 else:
                     log_progress(f"🤖 Sending query to {model}: \"{query[:50]}...\"", "llm_request", None, model=model, query=query[:50] + "...")
             
+            if attempt > 0:
+                metrics.record_retry("get_llm_response_streaming", model)
+
             # Create request with enhanced error handling
-            response = client.chat.completions.create(
+            response = hedging.call("get_llm_response_streaming", model, lambda: client.chat.completions.create(
                 model=model,
                 messages=[
                     {"role": "user", "content": query}
                 ],
                 max_tokens=500,
                 temperature=0.7,
-                timeout=45  # Increased timeout
-            )
+                timeout=latency.timeout_for("get_llm_response_streaming", model, 45)
+            ), attempt=attempt + 1)
             
             result = response.choices[0].message.content
             
@@ -383,17 +710,19 @@ def get_llm_response_streaming(client: OpenAI, query: str, model: str, log_progr
                 delay = base_delay * (2 ** attempt)  # Exponential backoff
                 if log_progress:
                     log_progress(f"⚠️ {error_msg.title()} with {model}, retrying in {delay}s: {str(e)[:100]}", "llm_retry_warning", None, model=model, query=query[:50] + "...", error=str(e)[:100], delay=delay)
-                time.sleep(delay)
+                with tracing.span("retry_backoff", model=model, attempt=attempt + 1, delay=delay):
+                    time.sleep(delay)
             elif attempt < max_retries - 1:
                 # Non-retryable error, but still try once more
                 if log_progress:
                     log_progress(f"⚠️ Non-retryable error with {model}, trying once more: {str(e)[:100]}", "llm_retry_warning", None, model=model, query=query[:50] + "...", error=str(e)[:100])
-                time.sleep(1)
+                with tracing.span("retry_backoff", model=model, attempt=attempt + 1, delay=1):
+                    time.sleep(1)
             else:
                 if log_progress:
                     log_progress(f"❌ Failed to get response from {model} after {max_retries} attempts: {str(e)[:100]}", "llm_error", None, model=model, query=query[:50] + "...", error=str(e)[:100])
                 print(f"Error getting LLM response after {max_retries} attempts: {e}")
-                return f"Error: Could not get response from {model} after {max_retries} attempts: {str(e)[:100]}"
+                return response_corpus.FailedResponse(f"Error: Could not get response from {model} after {max_retries} attempts: {str(e)[:100]}")
 
 def get_llm_response(client: OpenAI, query: str, model: str) -> str:
     """
@@ -405,32 +734,152 @@ def get_llm_response(client: OpenAI, query: str, model: str) -> str:
         model: The model to use
         
     Returns:
-        str: The LLM response
+        str: The LLM response, or a response_corpus.FailedResponse if none could be generated
     """
     try:
-        response = client.chat.completions.create(
+        response = hedging.call("get_llm_response", model, lambda: client.chat.completions.create(
             model=model,
             messages=[
                 {"role": "user", "content": query}
             ],
             max_tokens=500,
-            temperature=0.7
-        )
-        return response.choices[0].message.content
+            temperature=0.7,
+            timeout=latency.timeout_for("get_llm_response", model)
+        ))
+        content = response.choices[0].message.content
+        if not content or not content.strip():
+            return response_corpus.FailedResponse(f"Error: Empty response from {model}")
+        return content
     except Exception as e:
         print(f"Error getting LLM response: {e}")
-        return f"Error: Could not get response from {model}"
+        return response_corpus.FailedResponse(f"Error: Could not get response from {model}")
 
-def analyze_brand_in_response_streaming(client: OpenAI, response: str, brand_name: str, competitors: List[str], log_progress=None) -> Dict[str, Any]:
+def get_llm_responses(client: OpenAI, query: str, model: str, samples: int) -> List[str]:
     """
-    Analyze how a brand is positioned within an LLM response with streaming updates.
+    Get several sampled responses from LLM for a given query in a single request (n=samples).
+    
+    The prompt is sent and billed once; only the completions scale with the number of samples.
     
     Args:
         client: OpenAI client
+        query: The query to ask
+        model: The model to use
+        samples: Number of responses to sample
+        
+    Returns:
+        List[str]: Exactly samples responses; samples that failed, came back empty or are missing
+                   are response_corpus.FailedResponse placeholders
+    """
+    try:
+        response = hedging.call("get_llm_response", model, lambda: client.chat.completions.create(
+            model=model,
+            messages=[
+                {"role": "user", "content": query}
+            ],
+            max_tokens=500,
+            temperature=0.7,
+            n=samples,
+            timeout=latency.timeout_for("get_llm_response", model)
+        ), samples=samples)
+    except Exception as e:
+        print(f"Error getting LLM responses: {e}")
+        return [response_corpus.FailedResponse(f"Error: Could not get response from {model}") for _ in range(samples)]
+    responses = [
+        choice.message.content if choice.message.content and choice.message.content.strip()
+        else response_corpus.FailedResponse(f"Error: Empty response from {model}")
+        for choice in response.choices[:samples]
+    ]
+    responses += [response_corpus.FailedResponse(f"Error: Missing sample from {model}") for _ in range(samples - len(responses))]
+    return responses
+
+# Fixed judge instructions, sent first and byte-identical on every call so the provider can cache them as a prompt prefix
+JUDGE_INSTRUCTIONS = """You analyze how a brand is positioned in a text written by an AI assistant.
+
+You are given the brand to look for, a list of its competitors and the text to analyze. Determine:
+1. Is the brand mentioned? (yes/no)
+2. If mentioned, what position in the response (1=first mention, 2=second, etc.)?
+3. What is the sentiment toward the brand? (positive/neutral/negative)
+4. What is the context of the mention? (recommendation, comparison, criticism, etc.)
+5. Which of the listed competitors are mentioned, with their position and sentiment
+
+If the text contains [offset N] markers, it consists of excerpts around entity mentions, in their original order; each [offset N] marker is the character offset of the excerpt in the full response.
+
+Respond in JSON format:
+{
+    "brand_mentioned": true/false,
+    "mention_position": number or null,
+    "sentiment": "positive"/"neutral"/"negative",
+    "context": "brief description",
+    "competitors_mentioned": [
+        {"name": "competitor", "position": number, "sentiment": "positive/neutral/negative"}
+    ]
+}"""
+
+def build_brand_analysis_messages(response: str, brand_name: str, competitors: List[str], excerpted: bool = False) -> List[Dict[str, str]]:
+    """
+    Build the judge messages used to analyze brand positioning in an LLM response.
+    
+    The fixed instructions and schema come first (system message), then what is
+    shared by every call of a run (brand and competitors), then the response.
+    Requests of one run therefore share the longest possible prompt prefix,
+    which is what provider-side prompt caching matches on.
+    
+    Args:
+        response: The LLM response (or compacted excerpts of it) to analyze
+        brand_name: The brand to look for
+        competitors: List of competitor names
+        excerpted: Whether response holds excerpts from compact_response rather than the full text
+        
+    Returns:
+        List[Dict]: Chat messages for the judge call
+    """
+    text_label = "Excerpts to analyze" if excerpted else "Text to analyze"
+    return [
+        {"role": "system", "content": JUDGE_INSTRUCTIONS},
+        {"role": "user", "content": f'Brand: "{brand_name}"\nCompetitors: {competitors}\n\n{text_label}: "{response}"'}
+    ]
+
+def build_brand_analysis_prompt(response: str, brand_name: str, competitors: List[str], excerpted: bool = False) -> str:
+    """
+    The judge input as a single string, for token estimates (see build_brand_analysis_messages).
+    """
+    return "\n".join(message["content"] for message in build_brand_analysis_messages(response, brand_name, competitors, excerpted))
+
+def prepare_judge_input(response: str, brand_name: str, competitors: List[str], compact: bool = None) -> Dict[str, Any]:
+    """
+    Compact a response to the windows around entity mentions before judging.
+    
+    Args:
+        response: The LLM response to analyze
+        brand_name: The brand to look for
+        competitors: List of competitor names
+        compact: Whether to compact (defaults to JUDGE_COMPACTION)
+        
+    Returns:
+        Dict: Output of compact_response, or None when compaction is on and nothing is mentioned
+    """
+    if compact is None:
+        compact = response_compaction.JUDGE_COMPACTION
+    if not compact:
+        return {"text": response, "compacted": False}
+    
+    compacted = response_compaction.compact_response(response, brand_name, competitors)
+    if not compacted["mentions"]:
+        return None
+    tracing.set_attributes(judge_input_chars=compacted["compacted_length"], response_chars=compacted["original_length"])
+    return compacted
+
+def analyze_brand_in_response_streaming(client: OpenAI, response: str, brand_name: str, competitors: List[str], log_progress=None, compact: bool = None) -> Dict[str, Any]:
+    """
+    Analyze how a brand is positioned within an LLM response with streaming updates.
+    
+    Args:
+        client: Client of the judge provider (providers.get_client("judge"))
         response: The LLM response to analyze
         brand_name: The brand to look for
         competitors: List of competitor names
         log_progress: Progress logging function
+        compact: Send only the windows around mentions to the judge (defaults to JUDGE_COMPACTION)
         
     Returns:
         Dict: Analysis of brand positioning
@@ -438,41 +887,33 @@ def analyze_brand_in_response_streaming(client: OpenAI, response: str, brand_nam
     if log_progress:
         log_progress(f"🔍 Analyzing brand positioning for \"{brand_name}\"...", "brand_analysis_start")
     
-    # Create analysis prompt
-    analysis_prompt = f"""
-    Analyze the following text response and determine:
-    1. Is the brand "{brand_name}" mentioned? (yes/no)
-    2. If mentioned, what position in the response (1=first mention, 2=second, etc.)?
-    3. What is the sentiment toward "{brand_name}"? (positive/neutral/negative)
-    4. What is the context of the mention? (recommendation, comparison, criticism, etc.)
-    5. Which of these competitors are mentioned: {competitors}
-    
-    Text to analyze: "{response}"
-    
-    Respond in JSON format:
-    {{
-        "brand_mentioned": true/false,
-        "mention_position": number or null,
-        "sentiment": "positive"/"neutral"/"negative",
-        "context": "brief description",
-        "competitors_mentioned": [
-            {{"name": "competitor", "position": number, "sentiment": "positive/neutral/negative"}}
-        ]
-    }}
-    """
+    if mention_classifier.enabled():
+        verdict = mention_classifier.classify_responses([response], brand_name, competitors)[0]
+        if log_progress:
+            log_progress(f"✅ Brand analysis complete (local classifier)", "brand_analysis_complete")
+        return verdict
+    
+    judge_input = prepare_judge_input(response, brand_name, competitors, compact)
+    if judge_input is None:
+        if log_progress:
+            log_progress(f"✅ No brand or competitor mentions found, skipping analysis LLM", "brand_analysis_complete")
+        return response_compaction.not_mentioned_result(judge_skipped=True)
+    
+    # Create analysis messages
+    analysis_messages = build_brand_analysis_messages(judge_input["text"], brand_name, competitors, judge_input["compacted"])
     
     try:
         if log_progress:
             log_progress(f"🤖 Asking analysis LLM to examine response...", "brand_analysis_llm")
             
-        analysis_response = client.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",
-            messages=[
-                {"role": "user", "content": analysis_prompt}
-            ],
+        judge_model = providers.model_for("judge")
+        analysis_response = hedging.call("analyze_brand_in_response_streaming", judge_model, lambda: client.chat.completions.create(
+            model=judge_model,
+            messages=analysis_messages,
             max_tokens=300,
-            temperature=0.1
-        )
+            temperature=0.1,
+            timeout=latency.timeout_for("analyze_brand_in_response_streaming", judge_model)
+        ))
         
         analysis_text = analysis_response.choices[0].message.content
         
@@ -501,51 +942,39 @@ def analyze_brand_in_response_streaming(client: OpenAI, response: str, brand_nam
             "competitors_mentioned": []
         }
 
-def analyze_brand_in_response(client: OpenAI, response: str, brand_name: str, competitors: List[str]) -> Dict[str, Any]:
+def analyze_brand_in_response(client: OpenAI, response: str, brand_name: str, competitors: List[str], compact: bool = None) -> Dict[str, Any]:
     """
     Analyze how a brand is positioned within an LLM response.
     
     Args:
-        client: OpenAI client
+        client: Client of the judge provider (providers.get_client("judge"))
         response: The LLM response to analyze
         brand_name: The brand to look for
         competitors: List of competitor names
+        compact: Send only the windows around mentions to the judge (defaults to JUDGE_COMPACTION)
         
     Returns:
         Dict: Analysis of brand positioning
     """
-    # Create analysis prompt
-    analysis_prompt = f"""
-    Analyze the following text response and determine:
-    1. Is the brand "{brand_name}" mentioned? (yes/no)
-    2. If mentioned, what position in the response (1=first mention, 2=second, etc.)?
-    3. What is the sentiment toward "{brand_name}"? (positive/neutral/negative)
-    4. What is the context of the mention? (recommendation, comparison, criticism, etc.)
-    5. Which of these competitors are mentioned: {competitors}
-    
-    Text to analyze: "{response}"
-    
-    Respond in JSON format:
-    {{
-        "brand_mentioned": true/false,
-        "mention_position": number or null,
-        "sentiment": "positive"/"neutral"/"negative",
-        "context": "brief description",
-        "competitors_mentioned": [
-            {{"name": "competitor", "position": number, "sentiment": "positive/neutral/negative"}}
-        ]
-    }}
-    """
+    if mention_classifier.enabled():
+        return mention_classifier.classify_responses([response], brand_name, competitors)[0]
+    
+    judge_input = prepare_judge_input(response, brand_name, competitors, compact)
+    if judge_input is None:
+        return response_compaction.not_mentioned_result(judge_skipped=True)
+    
+    # Create analysis messages
+    analysis_messages = build_brand_analysis_messages(judge_input["text"], brand_name, competitors, judge_input["compacted"])
     
     try:
-        analysis_response = client.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",
-            messages=[
-                {"role": "user", "content": analysis_prompt}
-            ],
+        judge_model = providers.model_for("judge")
+        analysis_response = hedging.call("analyze_brand_in_response", judge_model, lambda: client.chat.completions.create(
+            model=judge_model,
+            messages=analysis_messages,
             max_tokens=300,
-            temperature=0.1
-        )
+            temperature=0.1,
+            timeout=latency.timeout_for("analyze_brand_in_response", judge_model)
+        ))
         
         analysis_text = analysis_response.choices[0].message.content
         
@@ -0,0 +1,104 @@
+import os
+import threading
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+from typing import Any, Callable
+
+import libs.latency as latency
+import libs.metrics as metrics
+import libs.tracing as tracing
+
+
+# Send a duplicate of slow upstream calls; set HEDGE_REQUESTS=1 to enable
+HEDGE_REQUESTS = os.getenv("HEDGE_REQUESTS", "0") == "1"
+# Latency quantile of the (call site, model) after which the duplicate is sent
+HEDGE_QUANTILE = float(os.getenv("HEDGE_QUANTILE", "0.95"))
+# Extra requests allowed, as a fraction of hedgeable calls (0.05 = at most 5% more requests)
+HEDGE_BUDGET = float(os.getenv("HEDGE_BUDGET", "0.05"))
+# Observed calls needed before the quantile is trusted
+HEDGE_MIN_SAMPLES = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+_lock = threading.Lock()
+_calls = 0
+_hedges = 0
+
+
+def _take_budget() -> bool:
+    global _hedges
+    with _lock:
+        if _hedges + 1 > HEDGE_BUDGET * _calls:
+            return False
+        _hedges += 1
+        return True
+
+
+def _start(attempt: Callable[[], Any]) -> Future:
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(attempt())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=tracing.propagate(run), daemon=True).start()
+    return future
+
+
+def call(call_site: str, model: str, request: Callable[[], Any], **attributes) -> Any:
+    """
+    Runs one upstream request, sending a duplicate if it outlasts the model's usual latency.
+
+    Without hedging (or before HEDGE_MIN_SAMPLES calls of this call site and model
+    have been observed) the request simply runs under metrics.observe_call. With
+    it, the request runs on a background thread; once it exceeds the
+    HEDGE_QUANTILE latency, a duplicate is sent if HEDGE_BUDGET allows, and the
+    first successful answer wins. The sync client cannot abort a request in
+    flight, so the losing attempt is abandoned: its answer is discarded and its
+    tokens still show up in the usage metrics.
+
+    Args:
+        call_site (str): Call site name for metrics and latency tracking.
+        model (str): Model used by the request.
+        request (Callable): Sends the request and returns the API response; must be safe to send twice.
+        **attributes: Extra span attributes for metrics.observe_call.
+
+    Returns:
+        Any: The API response of the winning attempt.
+    """
+    global _calls
+
+    def attempt(hedge: bool) -> Any:
+        with metrics.observe_call(call_site, model, hedge=hedge, **attributes) as observation:
+            response = request()
+            observation.record_usage(response)
+        return response
+
+    delay = latency.quantile(call_site, model, HEDGE_QUANTILE, HEDGE_MIN_SAMPLES) if HEDGE_REQUESTS else None
+    if delay is None:
+        return attempt(False)
+
+    with _lock:
+        _calls += 1
+    primary = _start(lambda: attempt(False))
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+
+    if not _take_budget():
+        metrics.inc_counter("evidentia_hedged_requests_total", call_site=call_site, model=model, outcome="over_budget")
+        return primary.result()
+
+    metrics.inc_counter("evidentia_hedged_requests_total", call_site=call_site, model=model, outcome="sent")
+    tracing.set_attributes(hedged=True, hedge_delay=round(delay, 3))
+    hedge = _start(lambda: attempt(True))
+
+    pending = {primary, hedge}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            if future.exception() is None:
+                outcome = "won" if future is hedge else "lost"
+                metrics.inc_counter("evidentia_hedged_requests_total", call_site=call_site, model=model, outcome=outcome)
+                return future.result()
+    # Both attempts failed: surface the primary's error, as without hedging
+    return primary.result()
@@ -0,0 +1,95 @@
+import os
+import threading
+from collections import deque
+from typing import Dict, Tuple, Optional
+
+
+# Number of recent completed (successful or timed-out) calls kept per (call site, model)
+LATENCY_WINDOW = int(os.getenv("LATENCY_WINDOW", "500"))
+
+# Per-call timeouts learned from the window: TIMEOUT_QUANTILE latency x TIMEOUT_FACTOR, clamped; set ADAPTIVE_TIMEOUTS=0 to use fixed defaults
+ADAPTIVE_TIMEOUTS = os.getenv("ADAPTIVE_TIMEOUTS", "1") != "0"
+TIMEOUT_QUANTILE = float(os.getenv("TIMEOUT_QUANTILE", "0.99"))
+TIMEOUT_FACTOR = float(os.getenv("TIMEOUT_FACTOR", "3"))
+TIMEOUT_MIN_SECONDS = float(os.getenv("TIMEOUT_MIN_SECONDS", "5"))
+TIMEOUT_MAX_SECONDS = float(os.getenv("TIMEOUT_MAX_SECONDS", "120"))
+# Observed calls needed before the learned timeout replaces the default
+TIMEOUT_MIN_SAMPLES = int(os.getenv("TIMEOUT_MIN_SAMPLES", "20"))
+
+_lock = threading.Lock()
+_windows: Dict[Tuple[str, str], deque] = {}
+
+
+def record(call_site: str, model: str, seconds: float):
+    """
+    Adds one call duration to the rolling window of (call_site, model).
+    """
+    key = (call_site, model)
+    with _lock:
+        window = _windows.get(key)
+        if window is None:
+            window = _windows[key] = deque(maxlen=LATENCY_WINDOW)
+        window.append(seconds)
+
+
+def count(call_site: str, model: str) -> int:
+    with _lock:
+        return len(_windows.get((call_site, model), ()))
+
+
+def quantile(call_site: str, model: str, q: float, min_samples: int = 1) -> Optional[float]:
+    """
+    Returns the q-quantile (0..1) of recent call durations, or None with fewer than min_samples observations.
+    """
+    with _lock:
+        samples = sorted(_windows.get((call_site, model), ()))
+    if not samples or len(samples) < min_samples:
+        return None
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+def timeout_for(call_site: str, model: str, default: float = None) -> float:
+    """
+    Returns the request timeout (seconds) for the next call of (call_site, model).
+
+    Once TIMEOUT_MIN_SAMPLES calls have been observed, the timeout is the
+    TIMEOUT_QUANTILE latency times TIMEOUT_FACTOR, clamped to
+    [TIMEOUT_MIN_SECONDS, TIMEOUT_MAX_SECONDS]. A hung connection to a fast
+    model is then dropped in seconds, while a slow but healthy model keeps a
+    proportionally longer timeout. Before that, and with ADAPTIVE_TIMEOUTS=0,
+    the default is used.
+
+    Args:
+        call_site (str): Call site name, as used with metrics.observe_call.
+        model (str): Model used by the call.
+        default (float, optional): Timeout while there is not enough history; defaults to TIMEOUT_MAX_SECONDS.
+
+    Returns:
+        float: Timeout in seconds.
+    """
+    if default is None:
+        default = TIMEOUT_MAX_SECONDS
+    if not ADAPTIVE_TIMEOUTS:
+        return default
+    observed = quantile(call_site, model, TIMEOUT_QUANTILE, TIMEOUT_MIN_SAMPLES)
+    if observed is None:
+        return default
+    return min(TIMEOUT_MAX_SECONDS, max(TIMEOUT_MIN_SECONDS, observed * TIMEOUT_FACTOR))
+
+
+def snapshot() -> Dict[str, Dict[str, float]]:
+    """
+    Summarizes every tracked (call site, model) as "call_site/model" -> count, p50, p95, p99 and current timeout.
+    """
+    with _lock:
+        keys = list(_windows)
+    summary = {}
+    for call_site, model in keys:
+        summary[f"{call_site}/{model}"] = {
+            "count": count(call_site, model),
+            "p50": quantile(call_site, model, 0.5),
+            "p95": quantile(call_site, model, 0.95),
+            "p99": quantile(call_site, model, 0.99),
+            "timeout": timeout_for(call_site, model)
+        }
+    return summary
@@ -0,0 +1,307 @@
+import os
+import re
+import threading
+import zlib
+from functools import lru_cache
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+
+import libs.response_compaction as response_compaction
+
+
+# Who labels sentiment and context: "llm" (the judge model, default) or "classifier" (in-process, no API calls)
+JUDGE_MODE = os.getenv("JUDGE_MODE", "llm").strip().lower()
+# Trained weights written by benchmarks/classifier_agreement.py --train; the lexicon seeds are used while it does not exist
+MENTION_CLASSIFIER_PATH = os.getenv("MENTION_CLASSIFIER_PATH", "mention_classifier.npz")
+# Characters beyond a mention scored for its entity, extended to whole sentences (0 = the mention's sentence only)
+CLASSIFIER_CONTEXT_CHARS = int(os.getenv("CLASSIFIER_CONTEXT_CHARS", "0"))
+
+SENTIMENTS = ("positive", "neutral", "negative")
+CONTEXTS = ("recommendation", "comparison", "criticism", "informational")
+# Feature hashing dimension of the learned n-gram weights
+HASH_DIM = 1 << 18
+# Words after a negator (within NEGATION_SCOPE tokens) become "not:<word>" features
+NEGATION_SCOPE = 3
+
+_NEGATORS = {"not", "no", "never", "without", "hardly", "lacks", "lack", "isn", "doesn", "don", "aren", "wasn", "cannot"}
+_POSITIVE = """best leading excellent great top popular recommended reliable trusted robust powerful innovative intuitive
+friendly easy affordable strong ideal favorite outstanding renowned premier standout versatile comprehensive seamless
+efficient effective secure praised loved excels superior impressive solid fast flexible scalable good better preferred
+highly leader award reputable favored valuable helpful""".split()
+_NEGATIVE = """expensive costly poor bad worse worst limited lacking complaints complaint issues problems slow outdated
+difficult complicated clunky buggy unreliable drawback drawbacks downside downsides criticized criticism controversy
+lawsuit breach avoid weak steep confusing frustrating declining overpriced concerns risk risks fails failed
+unfortunately struggles struggled negative dated inferior""".split()
+_CONTEXT_CUES = {
+    "recommendation": "recommend recommended recommendation best top consider ideal choice pick suggest go_with great_option should".split(),
+    "comparison": "vs versus compared compare comparison than alternative alternatives unlike whereas similar rival competitor competitors both differ difference".split(),
+    "criticism": "drawback drawbacks downside downsides criticized criticism complaints issues problems expensive poor lacking limited unfortunately concerns avoid".split()
+}
+
+
+def enabled() -> bool:
+    return JUDGE_MODE == "classifier"
+
+
+_TOKEN = re.compile(r"\w+(?:-\w+)*")
+_lock = threading.Lock()
+_weights = None
+_weights_loaded = False
+
+
+def _build_lexicon() -> Tuple[Dict[str, int], Dict[str, np.ndarray]]:
+    """
+    Exact-match lexicon: sentiment and context cue words vote for their label, the bias for neutral/informational.
+
+    Returns:
+        Tuple: (feature -> row, head -> score matrix whose last row is the all-zero row of non-lexicon features)
+    """
+    votes = {"sentiment": {}, "context": {}}
+
+    def vote(head, feature, label_index, weight=1.0):
+        size = len(SENTIMENTS) if head == "sentiment" else len(CONTEXTS)
+        votes[head].setdefault(feature, np.zeros(size, dtype=np.float32))[label_index] += weight
+
+    vote("sentiment", "__bias__", SENTIMENTS.index("neutral"), 0.75)
+    vote("context", "__bias__", CONTEXTS.index("informational"), 0.75)
+    for word in _POSITIVE:
+        vote("sentiment", word, 0)
+        vote("sentiment", f"not:{word}", 2)
+    for word in _NEGATIVE:
+        vote("sentiment", word, 2)
+        vote("sentiment", f"not:{word}", 0, 0.5)
+    for label, cues in _CONTEXT_CUES.items():
+        for cue in cues:
+            vote("context", cue, CONTEXTS.index(label))
+
+    features = {feature: row for row, feature in enumerate(dict.fromkeys([*votes["sentiment"], *votes["context"]]))}
+    matrices = {}
+    for head, classes in (("sentiment", SENTIMENTS), ("context", CONTEXTS)):
+        matrix = np.zeros((len(features) + 1, len(classes)), dtype=np.float32)
+        for feature, scores in votes[head].items():
+            matrix[features[feature]] = scores
+        matrices[head] = matrix
+    return features, matrices
+
+
+_LEXICON_ROWS, _LEXICON = _build_lexicon()
+
+
+@lru_cache(maxsize=200000)
+def _index(feature: str) -> int:
+    # crc32 rather than hash(): indices must be stable across processes for saved weights
+    return zlib.crc32(feature.encode("utf-8")) % HASH_DIM
+
+
+def _features(text: str) -> List[str]:
+    """
+    Features of a window: a bias feature, unigrams (negated within NEGATION_SCOPE) and bigrams.
+    """
+    tokens = _TOKEN.findall(text.lower())
+    features = ["__bias__"]
+    negated_until = -1
+    for i, token in enumerate(tokens):
+        if token in _NEGATORS:
+            negated_until = i + NEGATION_SCOPE
+            features.append(token)
+        elif i <= negated_until:
+            features.append(f"not:{token}")
+        else:
+            features.append(token)
+        if i + 1 < len(tokens):
+            features.append(f"{token}_{tokens[i + 1]}")
+    return features
+
+
+class _Batch:
+    """
+    Feature rows of a batch of windows, flattened: lexicon rows and hashed indices, with each window's offset.
+    """
+
+    def __init__(self, windows: List[str]):
+        rows = [_features(window) for window in windows]
+        lengths = [len(row) for row in rows]
+        total = sum(lengths)
+        self.size = len(rows)
+        self.offsets = np.cumsum([0] + lengths[:-1]).astype(np.int64)
+        self.row_of_feature = np.repeat(np.arange(len(rows)), lengths)
+        self.indices = np.fromiter((_index(feature) for row in rows for feature in row), dtype=np.int64, count=total)
+        missing = len(_LEXICON_ROWS)
+        self.lexicon_rows = np.fromiter((_LEXICON_ROWS.get(feature, missing) for row in rows for feature in row), dtype=np.int64, count=total)
+
+    def scores(self, head: str, weights: np.ndarray = None) -> np.ndarray:
+        # Lexicon plus the learned n-gram weights, each summed per window with one gather and a segmented sum
+        scores = np.add.reduceat(_LEXICON[head][self.lexicon_rows], self.offsets, axis=0)
+        if weights is not None:
+            scores += np.add.reduceat(weights[self.indices], self.offsets, axis=0)
+        return scores
+
+
+def get_weights() -> Dict[str, np.ndarray]:
+    """
+    Returns the learned n-gram weights from MENTION_CLASSIFIER_PATH, or None (lexicon only) if it does not exist.
+    """
+    global _weights, _weights_loaded
+    with _lock:
+        if not _weights_loaded:
+            if os.path.exists(MENTION_CLASSIFIER_PATH):
+                with np.load(MENTION_CLASSIFIER_PATH) as saved:
+                    _weights = {"sentiment": saved["sentiment"], "context": saved["context"]}
+            _weights_loaded = True
+        return _weights
+
+
+def classify_windows(windows: List[str]) -> List[Dict[str, str]]:
+    """
+    Labels the sentiment and context of a batch of mention windows in one vectorized pass.
+
+    Args:
+        windows (List[str]): Text around one entity's mentions, with the entity written as "__entity__".
+
+    Returns:
+        List[Dict]: One {"sentiment", "context"} per window
+    """
+    if not windows:
+        return []
+    weights = get_weights() or {}
+    batch = _Batch(windows)
+    sentiments = batch.scores("sentiment", weights.get("sentiment")).argmax(axis=1)
+    contexts = batch.scores("context", weights.get("context")).argmax(axis=1)
+    return [{"sentiment": SENTIMENTS[int(s)], "context": CONTEXTS[int(c)]} for s, c in zip(sentiments, contexts)]
+
+
+def entity_windows(text: str, brand_name: str, competitors: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Finds each entity's mentions and builds its window: the sentences around them, with the
+    entity replaced by "__entity__" and every other tracked entity by "__other__".
+
+    Returns:
+        List[Dict]: Per mentioned entity in order of first mention: "name", "position" (1-based rank) and "window"
+    """
+    names = response_compaction.entity_names(brand_name, competitors)
+    mentions = response_compaction.find_mentions(text, names)
+    order = list(dict.fromkeys(mention["name"] for mention in mentions))
+    entities = []
+    for position, name in enumerate(order, start=1):
+        segments = []
+        spans = set()
+        for mention in (m for m in mentions if m["name"] == name):
+            start, end = response_compaction.expand_to_sentence(
+                text,
+                max(0, mention["start"] - CLASSIFIER_CONTEXT_CHARS),
+                min(len(text), mention["end"] + CLASSIFIER_CONTEXT_CHARS)
+            )
+            # Several mentions in one sentence score it once
+            if (start, end) in spans:
+                continue
+            spans.add((start, end))
+            segment = text[start:end]
+            # Placeholders for every entity in the window, so weights generalize across brands (right to left keeps offsets valid)
+            for other in reversed(mentions):
+                if start <= other["start"] and other["end"] <= end:
+                    placeholder = " __entity__ " if other["name"] == name else " __other__ "
+                    segment = segment[:other["start"] - start] + placeholder + segment[other["end"] - start:]
+            segments.append(segment)
+        entities.append({"name": name, "position": position, "window": " ... ".join(segments)})
+    return entities
+
+
+def classify_responses(responses: List[str], brand_name: str, competitors: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Judges a batch of responses in process, in the verdict format of analyze_brand_in_response.
+
+    Mentions and positions come from the same word-bounded matching as judge
+    compaction; the windows of every entity in every response are then
+    labelled in one vectorized pass.
+
+    Args:
+        responses (List[str]): The LLM responses.
+        brand_name (str): The brand to look for.
+        competitors (List): Competitor names (or dicts with a "name" key).
+
+    Returns:
+        List[Dict]: One verdict per response
+    """
+    per_response = [entity_windows(response, brand_name, competitors) for response in responses]
+    labels = iter(classify_windows([entity["window"] for entities in per_response for entity in entities]))
+
+    verdicts = []
+    for entities in per_response:
+        if not entities:
+            verdicts.append(response_compaction.not_mentioned_result())
+            continue
+        verdict = {"brand_mentioned": False, "mention_position": None, "sentiment": "neutral", "context": "not mentioned", "competitors_mentioned": []}
+        for entity in entities:
+            label = next(labels)
+            if entity["name"] == brand_name:
+                verdict.update(brand_mentioned=True, mention_position=entity["position"], sentiment=label["sentiment"], context=label["context"])
+            else:
+                verdict["competitors_mentioned"].append({"name": entity["name"], "position": entity["position"], "sentiment": label["sentiment"]})
+        verdicts.append(verdict)
+    return verdicts
+
+
+def canonical_context(context: str) -> str:
+    """
+    Maps a free-text judge context (e.g. "recommended as a top option") onto CONTEXTS.
+    """
+    text = (context or "").lower()
+    if "not mentioned" in text:
+        return "not mentioned"
+    if "critic" in text or "negative" in text or "complain" in text or "drawback" in text:
+        return "criticism"
+    if "compar" in text or "versus" in text or " vs" in text or "alternative" in text:
+        return "comparison"
+    if "recommend" in text or "top" in text or "best" in text or "suggest" in text:
+        return "recommendation"
+    return "informational"
+
+
+def fit(windows: List[str], sentiments: List[str], contexts: List[str], epochs: int = 200, learning_rate: float = 1.0, l2: float = 0.001) -> Dict[str, np.ndarray]:
+    """
+    Learns hashed n-gram weights on labelled windows (e.g. LLM judge verdicts) by softmax regression.
+
+    The weights are a correction on top of the lexicon scores, which stay
+    fixed, so a small labelled sample adjusts the lexicon rather than
+    replacing it; the L2 penalty keeps unseen n-grams at zero.
+
+    Args:
+        windows (List[str]): Mention windows (see entity_windows).
+        sentiments (List[str]): Sentiment label of each window, from SENTIMENTS (others are skipped).
+        contexts (List[str]): Context label of each window, from CONTEXTS (others are skipped).
+        epochs (int, optional): Full-batch gradient steps. Defaults to 200.
+        learning_rate (float, optional): Step size. Defaults to 1.0.
+        l2 (float, optional): Weight decay. Defaults to 0.001.
+
+    Returns:
+        Dict: "sentiment" and "context" weight matrices (also used by this process from now on)
+    """
+    global _weights, _weights_loaded
+    trained = {}
+    for head, labels, classes in (("sentiment", sentiments, SENTIMENTS), ("context", contexts, CONTEXTS)):
+        weights = np.zeros((HASH_DIM, len(classes)), dtype=np.float32)
+        keep = [i for i, label in enumerate(labels) if label in classes]
+        if keep:
+            batch = _Batch([windows[i] for i in keep])
+            targets = np.eye(len(classes), dtype=np.float32)[[classes.index(labels[i]) for i in keep]]
+            touched = np.unique(batch.indices)
+            for _ in range(epochs):
+                logits = batch.scores(head, weights)
+                logits -= logits.max(axis=1, keepdims=True)
+                probabilities = np.exp(logits)
+                probabilities /= probabilities.sum(axis=1, keepdims=True)
+                gradient = np.zeros_like(weights)
+                np.add.at(gradient, batch.indices, (probabilities - targets)[batch.row_of_feature])
+                weights[touched] -= learning_rate * (gradient[touched] / batch.size + l2 * weights[touched])
+        trained[head] = weights
+    with _lock:
+        _weights, _weights_loaded = trained, True
+    return trained
+
+
+def save(weights: Dict[str, np.ndarray], path: str = None):
+    """
+    Writes learned weights to MENTION_CLASSIFIER_PATH (or path).
+    """
+    np.savez_compressed(path or MENTION_CLASSIFIER_PATH, sentiment=weights["sentiment"], context=weights["context"])
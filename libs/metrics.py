@@ -0,0 +1,242 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Tuple, Any
+
+import libs.latency as latency
+import libs.tracing as tracing
+
+
+# Latency buckets (seconds) sized for LLM and search calls, which range from sub-second to minutes
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 30, 45, 60, 120)
+
+_lock = threading.Lock()
+_metrics: Dict[str, Dict[str, Any]] = {}
+# Token counter of the run the current context belongs to (see counting_tokens)
+_run_tokens: contextvars.ContextVar = contextvars.ContextVar("evidentia_run_tokens", default=None)
+
+
+def _register(name: str, metric_type: str, help_text: str, buckets: Tuple[float, ...] = None):
+    _metrics[name] = {"type": metric_type, "help": help_text, "buckets": buckets, "values": {}}
+
+
+_register("evidentia_llm_call_duration_seconds", "histogram", "Latency of upstream LLM and search calls by call site.", LATENCY_BUCKETS)
+_register("evidentia_llm_calls_total", "counter", "Upstream LLM and search calls by call site and outcome.")
+_register("evidentia_llm_calls_in_flight", "gauge", "Upstream LLM and search calls currently in flight.")
+_register("evidentia_llm_retries_total", "counter", "Retries of upstream LLM calls.")
+_register("evidentia_llm_tokens_total", "counter", "Tokens reported in response.usage by call site and kind (prompt/completion/cached).")
+_register("evidentia_hedged_requests_total", "counter", "Hedged upstream calls by call site, model and outcome (sent; won/lost by the duplicate; over_budget).")
+_register("evidentia_cache_requests_total", "counter", "Cache lookups by cache name and result (hit/miss).")
+_register("evidentia_singleflight_total", "counter", "Coalesced computations by operation and role (leader computes, follower attaches).")
+_register("evidentia_http_request_duration_seconds", "histogram", "Latency of Flask requests until the response object is returned.", LATENCY_BUCKETS)
+
+
+def _label_key(labels: Dict[str, Any]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc_counter(name: str, amount: float = 1, **labels):
+    """
+    Increments a counter metric for the given label set.
+    """
+    key = _label_key(labels)
+    with _lock:
+        values = _metrics[name]["values"]
+        values[key] = values.get(key, 0) + amount
+
+
+def add_gauge(name: str, amount: float, **labels):
+    """
+    Adds (or subtracts, with a negative amount) to a gauge metric.
+    """
+    key = _label_key(labels)
+    with _lock:
+        values = _metrics[name]["values"]
+        values[key] = values.get(key, 0) + amount
+
+
+def observe_histogram(name: str, value: float, **labels):
+    """
+    Records one observation into a histogram metric.
+    """
+    key = _label_key(labels)
+    metric = _metrics[name]
+    with _lock:
+        state = metric["values"].get(key)
+        if state is None:
+            state = {"buckets": [0] * len(metric["buckets"]), "sum": 0.0, "count": 0}
+            metric["values"][key] = state
+        for i, bound in enumerate(metric["buckets"]):
+            if value <= bound:
+                state["buckets"][i] += 1
+        state["sum"] += value
+        state["count"] += 1
+
+
+class CallObservation:
+    """
+    Handle yielded by observe_call so the call site can attach token usage.
+    """
+
+    def __init__(self, call_site: str, model: str, span: tracing.Span = None):
+        self.call_site = call_site
+        self.model = model
+        self.span = span
+        self.usage = {"prompt": 0, "completion": 0, "cached": 0}
+
+    def record_usage(self, response):
+        """
+        Records prompt/completion/cached token counts from a response's usage block.
+
+        Handles both Chat Completions (prompt_tokens/completion_tokens) and
+        Responses API (input_tokens/output_tokens) usage objects.
+        """
+        usage = getattr(response, "usage", None)
+        if usage is None:
+            return
+
+        prompt_tokens = getattr(usage, "prompt_tokens", None)
+        if prompt_tokens is None:
+            prompt_tokens = getattr(usage, "input_tokens", 0)
+        completion_tokens = getattr(usage, "completion_tokens", None)
+        if completion_tokens is None:
+            completion_tokens = getattr(usage, "output_tokens", 0)
+        details = getattr(usage, "prompt_tokens_details", None) or getattr(usage, "input_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", 0) if details is not None else 0
+
+        self.usage = {"prompt": prompt_tokens or 0, "completion": completion_tokens or 0, "cached": cached_tokens or 0}
+        if self.span is not None:
+            self.span.set_attributes(
+                prompt_tokens=self.usage["prompt"],
+                completion_tokens=self.usage["completion"],
+                cached_tokens=self.usage["cached"]
+            )
+        for kind, amount in self.usage.items():
+            if amount:
+                inc_counter("evidentia_llm_tokens_total", amount, call_site=self.call_site, model=self.model, kind=kind)
+        counter = _run_tokens.get()
+        if counter is not None:
+            with _lock:
+                counter["tokens"] += self.usage["prompt"] + self.usage["completion"]
+
+
+def counting_tokens(fn, counter: Dict[str, int]):
+    """
+    Wraps fn so the prompt and completion tokens of every call it makes are added to counter["tokens"].
+
+    Calls made on threads started with tracing.propagate count too, as they
+    run in a copy of fn's context.
+    """
+    def run(*args, **kwargs):
+        token = _run_tokens.set(counter)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _run_tokens.reset(token)
+
+    return run
+
+
+@contextmanager
+def observe_call(call_site: str, model: str = "", **attributes):
+    """
+    Times one upstream call, tracking in-flight count and outcome.
+
+    Each observed call is also a tracing span named after the call site, so
+    the same boundaries show up in /metrics and in exported traces.
+
+    Args:
+        call_site (str): Name of the calling function (e.g. "get_llm_response").
+        model (str, optional): Model or engine used by the call.
+        **attributes: Extra span attributes (e.g. attempt number).
+
+    Yields:
+        CallObservation: Use record_usage(response) to attach token counts.
+    """
+    add_gauge("evidentia_llm_calls_in_flight", 1, call_site=call_site)
+    started = time.perf_counter()
+    outcome = "success"
+    try:
+        with tracing.span(call_site, call_site=call_site, model=model, **attributes) as call_span:
+            yield CallObservation(call_site, model, call_span)
+    except BaseException as e:
+        outcome = "timeout" if "Timeout" in type(e).__name__ else "error"
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        add_gauge("evidentia_llm_calls_in_flight", -1, call_site=call_site)
+        observe_histogram("evidentia_llm_call_duration_seconds", elapsed, call_site=call_site, model=model)
+        # A timed-out call lasted at least this long, so it counts too: a model that slowed down raises its own timeout
+        if outcome != "error":
+            latency.record(call_site, model, elapsed)
+        inc_counter("evidentia_llm_calls_total", call_site=call_site, model=model, outcome=outcome)
+
+
+def record_retry(call_site: str, model: str = ""):
+    """
+    Counts one retry of an upstream call.
+    """
+    inc_counter("evidentia_llm_retries_total", call_site=call_site, model=model)
+
+
+def record_cache(cache: str, hit: bool):
+    """
+    Counts one cache lookup as a hit or a miss.
+    """
+    inc_counter("evidentia_cache_requests_total", cache=cache, result="hit" if hit else "miss")
+    tracing.set_attributes(**{f"cache.{cache}": "hit" if hit else "miss"})
+
+
+def token_usage_by_call_site() -> Dict[str, Dict[str, Any]]:
+    """
+    Sums token counters per call site (across models), with the share of prompt tokens served from the provider's prompt cache.
+
+    Returns:
+        Dict: call_site -> {"prompt", "completion", "cached", "cached_ratio"}
+    """
+    usage: Dict[str, Dict[str, Any]] = {}
+    with _lock:
+        values = dict(_metrics["evidentia_llm_tokens_total"]["values"])
+    for key, amount in values.items():
+        labels = dict(key)
+        totals = usage.setdefault(labels["call_site"], {"prompt": 0, "completion": 0, "cached": 0})
+        totals[labels["kind"]] += amount
+    for totals in usage.values():
+        totals["cached_ratio"] = round(totals["cached"] / totals["prompt"], 4) if totals["prompt"] else 0.0
+    return usage
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: Tuple[Tuple[str, str], ...], extra: Dict[str, str] = None) -> str:
+    pairs = list(key) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape_label(v)}"' for k, v in pairs) + "}"
+
+
+def render_prometheus() -> str:
+    """
+    Renders all metrics in the Prometheus text exposition format (version 0.0.4).
+
+    Returns:
+        str: The exposition text served on /metrics.
+    """
+    lines = []
+    with _lock:
+        for name, metric in _metrics.items():
+            lines.append(f"# HELP {name} {metric['help']}")
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for key, value in metric["values"].items():
+                if metric["type"] != "histogram":
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+                    continue
+                for bound, count in zip(metric["buckets"], value["buckets"]):
+                    lines.append(f"{name}_bucket{_format_labels(key, {'le': str(bound)})} {count}")
+                lines.append(f"{name}_bucket{_format_labels(key, {'le': '+Inf'})} {value['count']}")
+                lines.append(f"{name}_sum{_format_labels(key)} {value['sum']}")
+                lines.append(f"{name}_count{_format_labels(key)} {value['count']}")
+    return "\n".join(lines) + "\n"
@@ -1,8 +1,14 @@
 import os
 import json
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from langchain.prompts import PromptTemplate
 from openai import OpenAI
 import logging
+import libs.metrics as metrics
+import libs.tracing as tracing
+import libs.latency as latency
+import libs.query_dedup as query_dedup
 
 
 with open('utils/countryLanguage.json', 'r', encoding='utf-8') as file:
@@ -37,78 +43,266 @@ def getResponseInfo(response) -> tuple[dict, dict]:
     return messagesAnnotations, messagesTexts
 
 
-def getCoherentQueries(brandName: str, brandCountry: str, brandDescription: str, brandIndustry: str, totalQueries: int = 100):
+# Requests for more queries than this are split into parallel shards of about this size
+QUERY_SHARD_SIZE = int(os.getenv("QUERY_SHARD_SIZE", "20"))
+# Maximum number of shards generated concurrently
+QUERY_GENERATION_WORKERS = int(os.getenv("QUERY_GENERATION_WORKERS", "5"))
+# Extra rounds of shards requested when duplicates or failed shards leave a sharded request short
+QUERY_TOPUP_ROUNDS = int(os.getenv("QUERY_TOPUP_ROUNDS", "3"))
+
+# Themes from prompts/brandPromptsGeneration.txt; each shard is focused on one of them
+QUERY_INTENT_SLICES = [
+    "Tool/Service Discovery Prompts: commands that ask the AI to find specific types of digital or physical tools",
+    "Action Plan Prompts: commands that ask for a step-by-step plan or strategy",
+    "Comparative Analysis Prompts: commands that ask the AI to compare different solution categories",
+    "Budget-Constrained Solution Prompts: commands that ask for solutions within a specific budget",
+    "Local Service Finder Prompts: commands that ask the AI to find local businesses or services",
+]
+
+
+def planQueryShards(totalQueries: int) -> list[dict]:
     """
-    Generates a set of coherent queries related to a brand using an LLM (OpenAI) with web search capabilities.
+    Splits a query generation request into shards, each focused on one intent slice.
 
     Args:
-        brandName (str): The name of the brand/company.
-        brandCountry (str): The country where the brand/company is based.
-        brandDescription (str): A description of the brand/company.
-        brandIndustry (str): The industry in which the brand/company operates.
-        totalQueries (int, optional): The total number of queries to generate. Defaults to 100.
+        totalQueries (int): The total number of queries requested.
 
     Returns:
-        list: A list of dictionaries containing the generated queries, parsed from the JSON response.
+        list: One {"shardNumber", "size", "intentFocus"} dict per shard. A single shard
+              without a focus is returned when totalQueries fits in QUERY_SHARD_SIZE.
     """
-    # Initialize the OpenAI client
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY environment variable is not set")
-    llmClient = OpenAI(api_key=api_key)
+    if totalQueries <= QUERY_SHARD_SIZE:
+        return [{"shardNumber": 1, "size": totalQueries, "intentFocus": None}]
 
+    shardCount = math.ceil(totalQueries / QUERY_SHARD_SIZE)
+    baseSize, remainder = divmod(totalQueries, shardCount)
+    return [
+        {
+            "shardNumber": index + 1,
+            "size": baseSize + (1 if index < remainder else 0),
+            "intentFocus": QUERY_INTENT_SLICES[index % len(QUERY_INTENT_SLICES)]
+        }
+        for index in range(shardCount)
+    ]
+
+
+def buildQueryGenerationPrompt(brandName: str, brandCountry: str, brandDescription: str, brandIndustry: str, shard: dict, shardCount: int) -> str:
+    """
+    Formats the query generation prompt for one shard, appending its intent focus when sharded.
+    """
     try:
-        # Load the prompt template for generating queries from file
         with open("prompts/brandPromptsGeneration.txt", "r", encoding="utf-8") as file:
             promptTemplate = file.read()
+    except FileNotFoundError:
+        logging.error("Brand prompt template file not found")
+        raise ValueError("Brand prompt template file 'prompts/brandPromptsGeneration.txt' not found")
+
+    prompt = PromptTemplate(
+        input_variables=["companyName", "companyCountry", "companyDescription", "companyIndustry", "totalQueries"],
+        template=promptTemplate
+    ).format(
+        companyName=brandName,
+        companyCountry=brandCountry,
+        companyDescription=brandDescription,
+        companyIndustry=brandIndustry,
+        totalQueries=shard["size"]
+    )
 
-        # Format the prompt with the provided brand information and total queries
-        prompt = PromptTemplate(
-            input_variables=["companyName", "companyCountry", "companyDescription", "companyIndustry", "totalQueries"],
-            template=promptTemplate
+    if shard["intentFocus"]:
+        with open("prompts/brandPromptsShardFocus.txt", "r", encoding="utf-8") as file:
+            focusTemplate = file.read()
+        prompt += PromptTemplate(
+            input_variables=["shardNumber", "shardCount", "intentFocus"],
+            template=focusTemplate
         ).format(
-            companyName=brandName,
-            companyCountry=brandCountry,
-            companyDescription=brandDescription,
-            companyIndustry=brandIndustry,
-            totalQueries=totalQueries
+            shardNumber=shard["shardNumber"],
+            shardCount=shardCount,
+            intentFocus=shard["intentFocus"]
         )
 
-        # Call the OpenAI Responses API with web search enabled for better query generation
+    return prompt
+
+
+def generateQueryShard(llmClient: OpenAI, prompt: str) -> list:
+    """
+    Runs one web-search-enabled Responses call for a query generation shard and parses its JSON array.
+
+    Args:
+        llmClient (OpenAI): The OpenAI client.
+        prompt (str): The formatted shard prompt.
+
+    Returns:
+        list: The generated {"topic", "prompt"} dictionaries.
+    """
+    # Call the OpenAI Responses API with web search enabled for better query generation
+    with metrics.observe_call("getCoherentQueries", "gpt-4o-mini-2024-07-18") as call:
         response = llmClient.responses.create(
             model="gpt-4o-mini-2024-07-18",
             tools=[{"type": "web_search_preview"}],
             input=prompt,
+            timeout=latency.timeout_for("getCoherentQueries", "gpt-4o-mini-2024-07-18"),
         )
-        
-        # Extract response information
-        messagesAnnotations, messagesTexts = getResponseInfo(response)
-        rawJson = next(iter(messagesTexts.values()), "")
+        call.record_usage(response)
 
-        # Clean up JSON formatting
-        if rawJson.startswith("```json"):
-            rawJson = rawJson[len("```json"):].strip()
-        if rawJson.endswith("```"):
-            rawJson = rawJson[:-3].strip()
+    # Extract response information
+    messagesAnnotations, messagesTexts = getResponseInfo(response)
+    rawJson = next(iter(messagesTexts.values()), "")
 
-        if not rawJson.strip():
-            raise ValueError("No JSON output received from OpenAI API.")
+    # Clean up JSON formatting
+    if rawJson.startswith("```json"):
+        rawJson = rawJson[len("```json"):].strip()
+    if rawJson.endswith("```"):
+        rawJson = rawJson[:-3].strip()
 
-        # Parse and return the JSON as a Python dictionary
-        queries_result = json.loads(rawJson)
-        
-        # Log web search annotations if available for debugging
-        if messagesAnnotations:
-            logging.info(f"Web search annotations available for query generation: {len(messagesAnnotations)} messages")
-        
-        return queries_result
-        
+    if not rawJson.strip():
+        raise ValueError("No JSON output received from OpenAI API.")
+
+    # Log web search annotations if available for debugging
+    if messagesAnnotations:
+        logging.info(f"Web search annotations available for query generation: {len(messagesAnnotations)} messages")
+
+    try:
+        return json.loads(rawJson)
     except json.JSONDecodeError as e:
         logging.error(f"Failed to parse JSON from query generation response: {e}")
         raise ValueError(f"Invalid JSON response from OpenAI API: {e}")
-    except FileNotFoundError:
-        logging.error("Brand prompt template file not found")
-        raise ValueError("Brand prompt template file 'prompts/brandPromptsGeneration.txt' not found")
+
+
+def iterCoherentQueryShards(brandName: str, brandCountry: str, brandDescription: str, brandIndustry: str, totalQueries: int = 100):
+    """
+    Generates coherent queries in parallel shards and yields each shard as soon as it is parsed.
+
+    Large requests are split by planQueryShards into shards focused on distinct
+    intent slices and generated concurrently, so total latency stays close to
+    that of a single shard. Queries that repeat (or, with QUERY_DEDUP on,
+    paraphrase) one already yielded are dropped (see query_dedup.QueryIndex).
+    A shard that fails (e.g. truncated JSON) is logged and skipped. When
+    duplicates or failures leave the run short of totalQueries, up to
+    QUERY_TOPUP_ROUNDS further rounds of shards are requested for the
+    shortfall. The run only fails if nothing was generated.
+
+    A request that fits in one shard is a single call whose queries are
+    yielded as the model returned them, without deduplication or top-up.
+
+    Args:
+        brandName (str): The name of the brand/company.
+        brandCountry (str): The country where the brand/company is based.
+        brandDescription (str): A description of the brand/company.
+        brandIndustry (str): The industry in which the brand/company operates.
+        totalQueries (int, optional): The total number of queries to generate. Defaults to 100.
+
+    Yields:
+        dict: {"shardNumber", "shardCount", "intentFocus", "queries", "error"} for each finished shard,
+              where "queries" only holds queries not seen in earlier shards. shardCount grows
+              when top-up shards are added.
+    """
+    # Initialize the OpenAI client
+    api_key = os.getenv("OPENAI_API_KEY")
+    if not api_key:
+        raise ValueError("OPENAI_API_KEY environment variable is not set")
+    llmClient = OpenAI(api_key=api_key)
+
+    shards = planQueryShards(totalQueries)
+    if len(shards) == 1:
+        shardQueries = generateQueryShard(llmClient, buildQueryGenerationPrompt(brandName, brandCountry, brandDescription, brandIndustry, shards[0], 1))
+        yield {
+            "shardNumber": 1,
+            "shardCount": 1,
+            "intentFocus": None,
+            "queries": shardQueries if isinstance(shardQueries, list) else [shardQueries],
+            "error": None
+        }
+        return
+
+    index = query_dedup.QueryIndex()
+    returnedQueries = 0
+    shardErrors = []
+    shardCount = len(shards)
+    topupRound = 0
+    while shards:
+        prompts = {
+            shard["shardNumber"]: buildQueryGenerationPrompt(brandName, brandCountry, brandDescription, brandIndustry, shard, shardCount)
+            for shard in shards
+        }
+        with ThreadPoolExecutor(max_workers=max(1, min(QUERY_GENERATION_WORKERS, len(shards)))) as executor:
+            futures = {
+                executor.submit(tracing.propagate(generateQueryShard), llmClient, prompts[shard["shardNumber"]]): shard
+                for shard in shards
+            }
+            for future in as_completed(futures):
+                shard = futures[future]
+                event = {
+                    "shardNumber": shard["shardNumber"],
+                    "shardCount": shardCount,
+                    "intentFocus": shard["intentFocus"],
+                    "queries": [],
+                    "error": None
+                }
+                try:
+                    shardQueries = future.result()
+                except Exception as e:
+                    logging.error(f"Query generation shard {shard['shardNumber']} failed: {e}")
+                    shardErrors.append(str(e))
+                    event["error"] = str(e)
+                    yield event
+                    continue
+
+                if not isinstance(shardQueries, list):
+                    shardQueries = [shardQueries]
+                returnedQueries += len(shardQueries)
+                # Only the new shard is compared against the queries already yielded, which stay as they are
+                event["queries"] = index.add(shardQueries, limit=totalQueries)["queries"]
+                yield event
+
+        shortfall = totalQueries - len(index)
+        if shortfall <= 0 or topupRound >= QUERY_TOPUP_ROUNDS:
+            break
+        topupRound += 1
+        logging.info(f"Query generation is {shortfall} queries short, requesting top-up round {topupRound}")
+        # Ask for enough that the shortfall is likely covered at the share of queries kept so far
+        keptShare = len(index) / returnedQueries if returnedQueries else 1.0
+        topupSize = min(totalQueries, math.ceil(shortfall / max(keptShare, 0.25)))
+        # Top-up shards continue the numbering and the rotation of intent slices
+        shards = [
+            {
+                "shardNumber": shardCount + offset + 1,
+                "size": shard["size"],
+                "intentFocus": QUERY_INTENT_SLICES[(shardCount + offset) % len(QUERY_INTENT_SLICES)]
+            }
+            for offset, shard in enumerate(planQueryShards(topupSize))
+        ]
+        shardCount += len(shards)
+
+    if not len(index) and shardErrors:
+        raise ValueError(f"Failed to generate queries: {shardErrors[-1]}")
+
+
+def getCoherentQueries(brandName: str, brandCountry: str, brandDescription: str, brandIndustry: str, totalQueries: int = 100):
+    """
+    Generates a set of coherent queries related to a brand using an LLM (OpenAI) with web search capabilities.
+
+    Requests larger than QUERY_SHARD_SIZE are generated as parallel intent-focused
+    shards, deduplicated and topped up to totalQueries (see iterCoherentQueryShards);
+    smaller ones are a single call returned as generated.
+
+    Args:
+        brandName (str): The name of the brand/company.
+        brandCountry (str): The country where the brand/company is based.
+        brandDescription (str): A description of the brand/company.
+        brandIndustry (str): The industry in which the brand/company operates.
+        totalQueries (int, optional): The total number of queries to generate. Defaults to 100.
+
+    Returns:
+        list: A list of dictionaries containing the generated queries, parsed from the JSON response.
+    """
+    try:
+        queries = []
+        for shardEvent in iterCoherentQueryShards(brandName, brandCountry, brandDescription, brandIndustry, totalQueries):
+            queries.extend(shardEvent["queries"])
+        return queries
+
+    except ValueError:
+        raise
     except Exception as e:
         logging.error(f"Query generation failed: {e}")
         raise ValueError(f"Failed to generate queries: {e}")
@@ -157,11 +351,14 @@ def webSearchAndAnalyze(query: str, context: str = "") -> dict:
     
     try:
         # Call the OpenAI Responses API with web search enabled
-        response = llmClient.responses.create(
-            model="gpt-4o-mini-2024-07-18",
-            tools=[{"type": "web_search_preview"}],
-            input=prompt,
-        )
+        with metrics.observe_call("webSearchAndAnalyze", "gpt-4o-mini-2024-07-18") as call:
+            response = llmClient.responses.create(
+                model="gpt-4o-mini-2024-07-18",
+                tools=[{"type": "web_search_preview"}],
+                input=prompt,
+                timeout=latency.timeout_for("webSearchAndAnalyze", "gpt-4o-mini-2024-07-18"),
+            )
+            call.record_usage(response)
         
         # Extract response information including web search annotations
         messagesAnnotations, messagesTexts = getResponseInfo(response)
@@ -0,0 +1,163 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any
+
+
+BRAND_PROFILE_PATH = os.getenv("BRAND_PROFILE_PATH", "brand_profiles.db")
+# Stored profile fields older than this are regenerated; 0 disables the store
+BRAND_PROFILE_TTL_HOURS = float(os.getenv("BRAND_PROFILE_TTL_HOURS", "168"))
+
+# Profile fields in generation order, each with the fields it is derived from
+PROFILE_FIELDS = {
+    "description": [],
+    "industry": ["description"],
+    "competitors": ["description", "industry"],
+    "name": ["description"],
+}
+
+_schema_lock = threading.Lock()
+_initialized_paths = set()
+
+
+class FallbackText(str):
+    """
+    Generic text returned in place of a profile field the LLM failed to produce.
+
+    It is returned to the caller like a generated value but never stored, so
+    the field is generated again on the next request instead of for the TTL.
+    """
+
+
+class FallbackProfile(dict):
+    """
+    Placeholder structure (e.g. {"competitors": []}) for a field that could not be generated; never stored.
+    """
+
+
+def is_fallback(value: Any) -> bool:
+    return isinstance(value, (FallbackText, FallbackProfile))
+
+
+def enabled() -> bool:
+    return BRAND_PROFILE_TTL_HOURS > 0
+
+
+def _connect() -> sqlite3.Connection:
+    connection = sqlite3.connect(BRAND_PROFILE_PATH, timeout=30)
+    with _schema_lock:
+        if BRAND_PROFILE_PATH not in _initialized_paths:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS brand_profiles (
+                    domain TEXT NOT NULL,
+                    country TEXT NOT NULL,
+                    field TEXT NOT NULL,
+                    value TEXT NOT NULL,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (domain, country, field)
+                )
+            """)
+            connection.commit()
+            _initialized_paths.add(BRAND_PROFILE_PATH)
+    return connection
+
+
+def validate_refresh(refresh: Any):
+    """
+    Checks a request's refresh option: true, false/absent, or a list of profile fields.
+
+    Raises:
+        ValueError: If refresh is neither a boolean nor a list of known profile fields.
+    """
+    if not refresh or refresh is True:
+        return
+    if not isinstance(refresh, list):
+        raise ValueError(f"refresh must be true or a list of profile fields, got {refresh!r}")
+    unknown = [field for field in refresh if field not in PROFILE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown profile fields {unknown}, expected some of {list(PROFILE_FIELDS)}")
+
+
+def dependent_fields(fields: List[str]) -> List[str]:
+    """
+    Expands fields with every field derived from them (e.g. description -> industry, competitors, name).
+
+    Raises:
+        ValueError: If a field is not a profile field.
+    """
+    validate_refresh(list(fields))
+    expanded = set(fields)
+    changed = True
+    while changed:
+        changed = False
+        for field, sources in PROFILE_FIELDS.items():
+            if field not in expanded and expanded.intersection(sources):
+                expanded.add(field)
+                changed = True
+    return [field for field in PROFILE_FIELDS if field in expanded]
+
+
+def get_profile(domain: str, country: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Returns the stored, non-expired fields of a brand profile.
+
+    Args:
+        domain (str): Normalized brand domain (see utils.normalizeDomain).
+        country (str): Country the profile was generated for.
+
+    Returns:
+        Dict: field -> {"value", "updated_at"} for every field within BRAND_PROFILE_TTL_HOURS
+    """
+    if not enabled():
+        return {}
+    oldest = time.time() - BRAND_PROFILE_TTL_HOURS * 3600
+    with _connect() as connection:
+        rows = connection.execute(
+            "SELECT field, value, updated_at FROM brand_profiles WHERE domain = ? AND country = ? AND updated_at >= ?",
+            (domain, country.strip().lower(), oldest)
+        ).fetchall()
+    return {field: {"value": json.loads(value), "updated_at": updated_at} for field, value, updated_at in rows}
+
+
+def save_field(domain: str, country: str, field: str, value: Any):
+    """
+    Stores one generated profile field; fallback values (see is_fallback) are not stored.
+    """
+    if not enabled() or is_fallback(value):
+        return
+    with _connect() as connection:
+        connection.execute(
+            "INSERT OR REPLACE INTO brand_profiles VALUES (?, ?, ?, ?, ?)",
+            (domain, country.strip().lower(), field, json.dumps(value), time.time())
+        )
+
+
+def invalidate(domain: str, country: str = None, fields: List[str] = None) -> List[str]:
+    """
+    Drops stored profile fields so they are regenerated on the next request.
+
+    Invalidating a field also invalidates the fields derived from it, so
+    refreshing the description regenerates everything while refreshing
+    competitors leaves the description, industry and name untouched.
+
+    Args:
+        domain (str): Normalized brand domain.
+        country (str, optional): Only invalidate the profile for this country; defaults to every country.
+        fields (List[str], optional): Fields to invalidate; defaults to the whole profile.
+
+    Returns:
+        List[str]: The fields invalidated.
+    """
+    fields = dependent_fields(fields) if fields else list(PROFILE_FIELDS)
+
+    sql = f"DELETE FROM brand_profiles WHERE domain = ? AND field IN ({', '.join('?' for _ in fields)})"
+    parameters: List[Any] = [domain, *fields]
+    if country:
+        sql += " AND country = ?"
+        parameters.append(country.strip().lower())
+    with _connect() as connection:
+        connection.execute(sql, parameters)
+    return fields
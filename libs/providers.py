@@ -0,0 +1,100 @@
+import os
+import threading
+from typing import Dict
+
+from openai import OpenAI
+
+
+# "openai" is the OpenAI API (or whatever OPENAI_BASE_URL points at); "local" is an
+# OpenAI-compatible server on this machine, e.g. llama.cpp's llama-server or vLLM
+PROVIDERS = ("openai", "local")
+# Call sites routed through the provider layer; LLM_PROVIDER_<ROLE> picks each one's provider
+ROLES = ("generate", "judge", "profile", "translate")
+LLM_PROVIDERS = {role: os.getenv(f"LLM_PROVIDER_{role.upper()}", "openai").strip().lower() for role in ROLES}
+# Optional per-role model override (LLM_MODEL_<ROLE>); generation always uses the audited model requested
+LLM_MODELS = {role: os.getenv(f"LLM_MODEL_{role.upper()}") for role in ROLES}
+DEFAULT_MODEL = "gpt-4o-mini-2024-07-18"
+
+LOCAL_LLM_BASE_URL = os.getenv("LOCAL_LLM_BASE_URL", "http://127.0.0.1:8080/v1")
+LOCAL_LLM_API_KEY = os.getenv("LOCAL_LLM_API_KEY", "local")
+LOCAL_LLM_MODEL = os.getenv("LOCAL_LLM_MODEL", "local-model")
+
+_lock = threading.Lock()
+_clients: Dict[str, OpenAI] = {}
+
+
+def provider_for(role: str) -> str:
+    """
+    Returns the provider ("openai" or "local") configured for a call site role.
+    """
+    if role not in ROLES:
+        raise ValueError(f"Unknown LLM role '{role}', expected one of {list(ROLES)}")
+    provider = LLM_PROVIDERS[role]
+    if provider not in PROVIDERS:
+        raise ValueError(f"Unknown LLM provider '{provider}' for {role}, expected one of {list(PROVIDERS)}")
+    return provider
+
+
+def is_local(role: str) -> bool:
+    return provider_for(role) == "local"
+
+
+def get_client(role: str) -> OpenAI:
+    """
+    Returns the process-wide client of the provider serving a role, created on first use.
+
+    Both providers speak the Chat Completions API, so call sites use the
+    returned client the same way whichever provider serves them.
+
+    Args:
+        role (str): One of ROLES.
+
+    Returns:
+        OpenAI: Client for the role's provider.
+    """
+    provider = provider_for(role)
+    with _lock:
+        client = _clients.get(provider)
+        if client is None:
+            if provider == "local":
+                client = OpenAI(base_url=LOCAL_LLM_BASE_URL, api_key=LOCAL_LLM_API_KEY)
+            else:
+                api_key = os.getenv("OPENAI_API_KEY")
+                if not api_key:
+                    raise ValueError("OPENAI_API_KEY environment variable is not set")
+                client = OpenAI(api_key=api_key)
+            _clients[provider] = client
+    return client
+
+
+def model_for(role: str, model: str = None) -> str:
+    """
+    Returns the model a role's calls use.
+
+    Args:
+        role (str): One of ROLES.
+        model (str, optional): Model requested by the caller (the audited model, for generation); used as is.
+
+    Returns:
+        str: The requested model, else LLM_MODEL_<ROLE>, else LOCAL_LLM_MODEL on the local provider or DEFAULT_MODEL.
+    """
+    if model:
+        return model
+    if LLM_MODELS.get(role):
+        return LLM_MODELS[role]
+    return LOCAL_LLM_MODEL if is_local(role) else DEFAULT_MODEL
+
+
+def describe() -> Dict[str, Dict[str, str]]:
+    """
+    Summarizes the provider and model of every role, e.g. for /llm-providers.
+    """
+    summary = {}
+    for role in ROLES:
+        provider = provider_for(role)
+        summary[role] = {
+            "provider": provider,
+            "model": model_for(role) if role != "generate" else "requested model",
+            "base_url": LOCAL_LLM_BASE_URL if provider == "local" else os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
+        }
+    return summary
@@ -0,0 +1,293 @@
+import math
+import os
+import re
+import zlib
+from typing import List, Dict, Any, Optional
+
+
+# Deduplication is opt-in (QUERY_DEDUP=1, or a threshold passed for one run): merging changes which queries a report covers
+QUERY_DEDUP = os.getenv("QUERY_DEDUP", "0") == "1"
+# Cosine similarity at or above which two queries are treated as paraphrases; values above 1 disable deduplication
+QUERY_DEDUP_THRESHOLD = float(os.getenv("QUERY_DEDUP_THRESHOLD", "0.9"))
+# Threshold that turns deduplication off, e.g. for a list that was already deduplicated
+DISABLED = 1.01
+
+_HASH_BUCKETS = 1 << 20
+_WORD_PATTERN = re.compile(r"\w+", re.UNICODE)
+_DISTINGUISHING_PATTERN = re.compile(r"(?<!^)(?<![.!?] )\b(?:\d+|[A-Z][a-z]+)\b")
+
+_STOPWORDS = {
+    "a", "an", "the", "for", "of", "to", "in", "on", "at", "by", "with", "and", "or", "is", "are", "be",
+    "me", "my", "i", "we", "our", "you", "your", "it", "that", "this", "which", "what", "can", "could",
+    "please", "some", "any", "give", "find", "show", "list", "recommend", "suggest", "tell", "about"
+}
+
+# Words that name who a query is for, wherever they appear
+_AUDIENCE_WORDS = {
+    "women", "woman", "men", "man", "female", "male", "kids", "kid", "children", "child", "boys", "girls", "baby", "babies",
+    "teens", "teenagers", "students", "seniors", "beginners", "professionals", "experts", "families", "parents"
+}
+# Price qualifiers by tier: queries asking for different tiers are different intents
+_PRICE_TIERS = {
+    "cheap": "low", "cheapest": "low", "cheaper": "low", "affordable": "low", "budget": "low", "inexpensive": "low",
+    "low-cost": "low", "discount": "low", "free": "free", "premium": "high", "luxury": "high", "expensive": "high",
+    "high-end": "high", "enterprise": "high"
+}
+# Words ending a "for ..." audience phrase
+_PHRASE_END = {"in", "near", "with", "to", "that", "which", "under", "over", "on", "at", "from", "and", "or", "vs", "versus"}
+_QUALIFIER_TOKEN = re.compile(r"\w+(?:-\w+)*|[^\w\s]")
+
+# Interchangeable words in solution-seeking queries, folded onto one form before comparison
+_SYNONYMS = {
+    "top": "best", "leading": "best", "greatest": "best", "good": "best", "recommended": "best",
+    "tools": "tool", "software": "tool", "apps": "tool", "app": "tool", "application": "tool",
+    "applications": "tool", "platforms": "tool", "platform": "tool", "solutions": "tool", "solution": "tool",
+    "services": "service", "providers": "service", "provider": "service",
+    "cheap": "affordable", "inexpensive": "affordable", "budget": "affordable", "low-cost": "affordable",
+    "small": "small", "smb": "small", "startups": "startup", "businesses": "business", "companies": "company",
+}
+# Generic category nouns ("CRM tools", "CRM software", "CRM options"): a query asks for the same thing with or without them
+_GENERIC_WORDS = {"tool", "option", "choice"}
+
+
+def query_text(query: Any) -> str:
+    """
+    Returns the text of a query given as a string or a generated {"topic", "prompt"} / {"query"} object.
+    """
+    if isinstance(query, dict):
+        return str(query.get("query") or query.get("prompt") or query)
+    return str(query)
+
+
+def _normalize_tokens(text: str) -> List[str]:
+    tokens = []
+    for word in _WORD_PATTERN.findall(text.lower()):
+        if word in _STOPWORDS:
+            continue
+        word = _SYNONYMS.get(word, word)
+        # Light plural folding so "tool"/"tools" and "crm"/"crms" match
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = _SYNONYMS.get(word[:-1], word[:-1])
+        if word in _GENERIC_WORDS:
+            continue
+        tokens.append(word)
+    return tokens
+
+
+def _qualifiers(text: str) -> List[str]:
+    """
+    Audience and price qualifiers of a query: "aud:<word>" for the words of a "for ..." phrase and
+    audience words anywhere, "price:<tier>" for price words.
+    """
+    qualifiers = []
+    in_audience = False
+    for token in _QUALIFIER_TOKEN.findall(text.lower()):
+        if token in _PRICE_TIERS:
+            qualifiers.append(f"price:{_PRICE_TIERS[token]}")
+        if token == "for":
+            in_audience = True
+            continue
+        if not token[0].isalnum() or token in _PHRASE_END:
+            in_audience = False
+            continue
+        if in_audience or token in _AUDIENCE_WORDS:
+            normalized = _normalize_tokens(token)
+            if normalized:
+                qualifiers.append(f"aud:{normalized[0]}")
+    return qualifiers
+
+
+def _distinguishing_terms(text: str) -> frozenset:
+    # Numbers and mid-sentence capitalized words (places, named products), plus audience and price
+    # qualifiers ("for women" / "for men", "cheapest" / "premium"), make otherwise similar queries distinct
+    terms = {term.lower() for term in _DISTINGUISHING_PATTERN.findall(text.strip())}
+    return frozenset(terms | set(_qualifiers(text)))
+
+
+def _features(text: str) -> Dict[int, float]:
+    # Hashed bag of word unigrams, word bigrams and in-word character 4-grams of the normalized text
+    tokens = _normalize_tokens(text)
+    features = [f"w:{token}" for token in tokens]
+    features += [f"b:{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    features += [f"c:{token[i:i + 4]}" for token in tokens if len(token) > 4 for i in range(len(token) - 3)]
+
+    counts: Dict[int, float] = {}
+    for feature in features:
+        bucket = zlib.crc32(feature.encode("utf-8")) % _HASH_BUCKETS
+        counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+
+def _tfidf_vectors(texts: List[str]) -> List[Dict[int, float]]:
+    counts = [_features(text) for text in texts]
+    document_frequency: Dict[int, int] = {}
+    for vector in counts:
+        for bucket in vector:
+            document_frequency[bucket] = document_frequency.get(bucket, 0) + 1
+
+    total = len(texts)
+    vectors = []
+    for vector in counts:
+        weighted = {bucket: (1 + math.log(tf)) * (1 + math.log((1 + total) / (1 + document_frequency[bucket]))) for bucket, tf in vector.items()}
+        norm = math.sqrt(sum(weight * weight for weight in weighted.values())) or 1.0
+        vectors.append({bucket: weight / norm for bucket, weight in weighted.items()})
+    return vectors
+
+
+def _cosine(a: Dict[int, float], b: Dict[int, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(bucket, 0.0) for bucket, weight in a.items())
+
+
+def similarity(a: str, b: str) -> float:
+    """
+    Cosine similarity of two queries in the hashed TF-IDF space built from just the pair.
+    """
+    vector_a, vector_b = _tfidf_vectors([a, b])
+    return _cosine(vector_a, vector_b)
+
+
+def parse_threshold(value: Any) -> Optional[float]:
+    """
+    Validates a requested dedup threshold (the "dedupThreshold" request field).
+
+    Returns:
+        float: The threshold, or None when not given (QUERY_DEDUP decides)
+
+    Raises:
+        ValueError: If the value is not a non-negative number
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, bool):
+        raise ValueError("dedupThreshold must be a non-negative number")
+    try:
+        threshold = float(value)
+    except (TypeError, ValueError):
+        raise ValueError("dedupThreshold must be a non-negative number")
+    if math.isnan(threshold) or threshold < 0:
+        raise ValueError("dedupThreshold must be a non-negative number")
+    return threshold
+
+
+def deduplicate_queries(queries: List[Any], threshold: float = None) -> Dict[str, Any]:
+    """
+    Removes near-duplicate queries (paraphrases) from a list, locally and without network calls.
+
+    Queries are compared by cosine similarity of hashed TF-IDF vectors over
+    normalized word unigrams, bigrams and in-word character 4-grams. Each query
+    is merged into the most similar earlier kept query if that similarity is at
+    least `threshold`, so the original order of the kept queries is preserved.
+    Queries that differ in numbers, mid-sentence proper nouns ("in Milan" /
+    "in Rome"), audience ("for women" / "for men", "for ecommerce" / none) or
+    price tier ("cheapest" / "premium") are never merged.
+
+    Args:
+        queries (List): Query strings or query objects ({"query"} / {"topic", "prompt"}).
+        threshold (float, optional): Similarity threshold. Defaults to QUERY_DEDUP_THRESHOLD when
+            QUERY_DEDUP is on, otherwise no deduplication. Values above 1 disable deduplication.
+
+    Returns:
+        Dict: "queries" (kept queries, in their original form), "merged" (which queries were
+              merged into which kept query, with similarities), "removed" and "threshold"
+              (None when deduplication is off)
+    """
+    if threshold is None:
+        threshold = QUERY_DEDUP_THRESHOLD if QUERY_DEDUP else DISABLED
+
+    report = {"queries": list(queries), "merged": [], "removed": 0, "threshold": threshold if threshold <= 1 else None}
+    if threshold > 1 or len(queries) < 2:
+        return report
+
+    texts = [query_text(query) for query in queries]
+    vectors = _tfidf_vectors(texts)
+    terms = [_distinguishing_terms(text) for text in texts]
+
+    kept_indexes: List[int] = []
+    duplicates: Dict[int, List[Dict[str, Any]]] = {}
+    for index, vector in enumerate(vectors):
+        best_index, best_similarity = None, 0.0
+        for kept_index in kept_indexes:
+            if terms[index] != terms[kept_index]:
+                continue
+            score = _cosine(vector, vectors[kept_index])
+            if score > best_similarity:
+                best_index, best_similarity = kept_index, score
+        if best_index is not None and best_similarity >= threshold:
+            duplicates.setdefault(best_index, []).append({"query": texts[index], "similarity": round(best_similarity, 3)})
+        else:
+            kept_indexes.append(index)
+
+    report["queries"] = [queries[index] for index in kept_indexes]
+    report["merged"] = [{"kept": texts[index], "duplicates": duplicates[index]} for index in kept_indexes if index in duplicates]
+    report["removed"] = len(queries) - len(kept_indexes)
+    return report
+
+
+class QueryIndex:
+    """
+    Incremental deduplication against the queries kept so far, for lists that arrive in batches.
+
+    Each kept query's vector is computed once (log term frequency, without the
+    corpus IDF that deduplicate_queries recomputes over the whole list) and
+    never changes, so a later batch can neither merge two earlier queries nor
+    shift which ones were kept. Exact repeats (ignoring case, punctuation and
+    spacing) are always dropped; paraphrases only when deduplication is on.
+    """
+
+    def __init__(self, threshold: float = None):
+        if threshold is None:
+            threshold = QUERY_DEDUP_THRESHOLD if QUERY_DEDUP else DISABLED
+        self.threshold = threshold
+        self.seen = set()
+        self.kept: List[Dict[str, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self.kept)
+
+    def add(self, queries: List[Any], limit: int = None) -> Dict[str, Any]:
+        """
+        Keeps the queries of a batch that repeat or paraphrase neither a kept query nor an earlier one of the batch.
+
+        Args:
+            queries (List): Query strings or query objects ({"query"} / {"topic", "prompt"}).
+            limit (int, optional): Stop once this many queries are kept in total.
+
+        Returns:
+            Dict: "queries" (the batch's kept queries, in their original form), "merged" and "removed"
+        """
+        report = {"queries": [], "merged": [], "removed": 0}
+        for query in queries:
+            if limit is not None and len(self.kept) >= limit:
+                break
+            text = query_text(query)
+            key = " ".join(_WORD_PATTERN.findall(text.lower()))
+            if key in self.seen:
+                report["merged"].append({"kept": key, "duplicates": [{"query": text, "similarity": 1.0}]})
+                report["removed"] += 1
+                continue
+
+            counts = _features(text)
+            weighted = {bucket: 1 + math.log(tf) for bucket, tf in counts.items()}
+            norm = math.sqrt(sum(weight * weight for weight in weighted.values())) or 1.0
+            vector = {bucket: weight / norm for bucket, weight in weighted.items()}
+            terms = _distinguishing_terms(text)
+
+            best, best_similarity = None, 0.0
+            if self.threshold <= 1:
+                for kept in self.kept:
+                    if kept["terms"] != terms:
+                        continue
+                    score = _cosine(vector, kept["vector"])
+                    if score > best_similarity:
+                        best, best_similarity = kept, score
+            if best is not None and best_similarity >= self.threshold:
+                report["merged"].append({"kept": best["text"], "duplicates": [{"query": text, "similarity": round(best_similarity, 3)}]})
+                report["removed"] += 1
+                continue
+
+            self.seen.add(key)
+            self.kept.append({"text": text, "vector": vector, "terms": terms})
+            report["queries"].append(query)
+        return report
@@ -0,0 +1,82 @@
+import hashlib
+import os
+import re
+import tempfile
+from typing import Optional
+
+import zstandard
+
+import libs.metrics as metrics
+
+
+# Full LLM responses are kept as content-addressed zstd blobs; set RESPONSE_BLOBS=0 to keep only the excerpts
+RESPONSE_BLOBS = os.getenv("RESPONSE_BLOBS", "1") != "0"
+RESPONSE_BLOB_DIR = os.getenv("RESPONSE_BLOB_DIR", "response_blobs")
+RESPONSE_BLOB_LEVEL = int(os.getenv("RESPONSE_BLOB_LEVEL", "10"))
+
+_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+def response_hash(text: str) -> str:
+    """
+    SHA-256 of the response text: the same response always gets the same hash.
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def is_hash(value: str) -> bool:
+    return bool(value) and bool(_HASH_PATTERN.match(value))
+
+
+def _blob_path(digest: str) -> str:
+    # Two-character fan-out keeps directories small
+    return os.path.join(RESPONSE_BLOB_DIR, digest[:2], f"{digest[2:]}.zst")
+
+
+def put(text: str) -> Optional[str]:
+    """
+    Stores a response and returns its hash.
+
+    Blobs are immutable and named by their hash, so a response generated twice
+    (the same query sampled again, or a corpus reused across brands) is
+    written once. Writes go to a temporary file renamed into place, so
+    concurrent writers of the same blob never leave a partial file.
+
+    Args:
+        text (str): The full response text.
+
+    Returns:
+        str: The response hash, or None when the store is disabled or the write failed
+    """
+    if not RESPONSE_BLOBS or text is None:
+        return None
+    digest = response_hash(text)
+    path = _blob_path(digest)
+    exists = os.path.exists(path)
+    metrics.record_cache("response_blobs", exists)
+    if exists:
+        return digest
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        compressed = zstandard.ZstdCompressor(level=RESPONSE_BLOB_LEVEL).compress(text.encode("utf-8"))
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as blob:
+            blob.write(compressed)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Error storing response blob {digest}: {e}")
+        return None
+    return digest
+
+
+def get(digest: str) -> Optional[str]:
+    """
+    Returns the full response stored under a hash, or None if it is unknown or not a valid hash.
+    """
+    if not is_hash(digest):
+        return None
+    try:
+        with open(_blob_path(digest), "rb") as blob:
+            return zstandard.ZstdDecompressor().decompress(blob.read()).decode("utf-8")
+    except FileNotFoundError:
+        return None
@@ -0,0 +1,189 @@
+import os
+import re
+import unicodedata
+from typing import List, Dict, Any, Optional, Tuple
+
+
+# Compaction is opt-in (JUDGE_COMPACTION=1): responses without a name match then skip the judge, which
+# would otherwise still catch variants and misspellings of a name
+JUDGE_COMPACTION = os.getenv("JUDGE_COMPACTION", "0") == "1"
+# Characters of context kept on each side of a mention
+JUDGE_CONTEXT_CHARS = int(os.getenv("JUDGE_CONTEXT_CHARS", "300"))
+# When the excerpts are at least this fraction of the original length, the full response is sent instead
+MIN_SAVING_RATIO = 0.8
+
+_SENTENCE_BOUNDARY = re.compile(r"[.!?\n]")
+_NAME_SEPARATOR = re.compile(r"[\s\-_.]+")
+
+
+def entity_names(brand_name: str, competitors: List[Any]) -> List[str]:
+    """
+    Returns the brand and competitor names to look for, accepting competitor dicts with a "name" key.
+
+    Names without any word (blank, or only separators such as "-" or ".") are dropped, as they would match anywhere.
+    """
+    names = [brand_name]
+    for competitor in competitors or []:
+        name = competitor.get("name", "") if isinstance(competitor, dict) else str(competitor)
+        if name:
+            names.append(name)
+    return [name for name in names if name and _name_words(name)]
+
+
+def fold(text: str) -> Tuple[str, Optional[List[int]]]:
+    """
+    Case- and diacritic-folds text for matching ("Nestlé" and "NESTLE" both fold to "nestle").
+
+    Returns:
+        Tuple: (folded text, original offset of each folded character, or None when offsets are unchanged)
+    """
+    if text.isascii():
+        return text.lower(), None
+    folded, origins = [], []
+    for offset, char in enumerate(text):
+        for part in unicodedata.normalize("NFKD", char):
+            if unicodedata.combining(part):
+                continue
+            for folded_char in part.casefold():
+                folded.append(folded_char)
+                origins.append(offset)
+    return "".join(folded), origins
+
+
+def _name_words(name: str) -> List[str]:
+    return [word for word in _NAME_SEPARATOR.split(fold(name.strip())[0]) if word]
+
+
+def _name_pattern(name: str) -> re.Pattern:
+    # Words of a name may be written apart, hyphenated or joined ("Acme Cloud", "Acme-Cloud", "AcmeCloud")
+    words = [re.escape(word) for word in _name_words(name)]
+    return re.compile(r"(?<!\w)" + r"[\s\-_.]*".join(words) + r"(?!\w)")
+
+
+def find_mentions(text: str, names: List[str]) -> List[Dict[str, Any]]:
+    """
+    Finds word-bounded mentions of each name in text, ignoring case, diacritics and word separators.
+
+    Where matches of different names overlap (e.g. "Acme" inside "Acme Cloud"),
+    the longest match wins and the others are dropped, so each span of text is
+    attributed to one entity.
+
+    Args:
+        text (str): The text to scan.
+        names (List[str]): Entity names to look for.
+
+    Returns:
+        List[Dict]: Non-overlapping mentions with "name", "start" and "end" offsets into text, sorted by position.
+    """
+    folded, origins = fold(text)
+    candidates = []
+    for name in names:
+        # A name made only of separators has no words and would match an empty span everywhere
+        if not _name_words(name):
+            continue
+        for match in _name_pattern(name).finditer(folded):
+            if origins is None:
+                start, end = match.start(), match.end()
+            else:
+                start, end = origins[match.start()], origins[match.end() - 1] + 1
+            candidates.append({"name": name, "start": start, "end": end})
+
+    mentions = []
+    for candidate in sorted(candidates, key=lambda mention: (mention["start"] - mention["end"], mention["start"])):
+        if all(candidate["end"] <= kept["start"] or kept["end"] <= candidate["start"] for kept in mentions):
+            mentions.append(candidate)
+    return sorted(mentions, key=lambda mention: mention["start"])
+
+
+def expand_to_sentence(text: str, start: int, end: int) -> tuple:
+    """
+    Extends a window outward to the nearest sentence boundaries (within 200 characters) so excerpts read as whole sentences.
+    """
+    boundary_before = None
+    for match in _SENTENCE_BOUNDARY.finditer(text, 0, start):
+        boundary_before = match.end()
+    new_start = boundary_before if boundary_before is not None and start - boundary_before < 200 else start
+    boundary_after = _SENTENCE_BOUNDARY.search(text, end)
+    new_end = boundary_after.end() if boundary_after and boundary_after.end() - end < 200 else end
+    return new_start, new_end
+
+
+def compact_response(text: str, brand_name: str, competitors: List[Any], context_chars: int = None) -> Dict[str, Any]:
+    """
+    Extracts the windows around brand and competitor mentions from a response.
+
+    Windows are merged when they overlap and kept in their original order with
+    their character offsets, so the order of mentions (and therefore the mention
+    position) is the same as in the full text.
+
+    Args:
+        text (str): The full LLM response.
+        brand_name (str): The brand to look for.
+        competitors (List): Competitor names (or dicts with a "name" key).
+        context_chars (int, optional): Characters of context around each mention. Defaults to JUDGE_CONTEXT_CHARS.
+
+    Returns:
+        Dict: "text" (compacted excerpts), "windows" (start/end offsets), "mentions",
+              "original_length", "compacted_length" and "compacted" (False if the full text is kept)
+    """
+    if context_chars is None:
+        context_chars = JUDGE_CONTEXT_CHARS
+
+    mentions = find_mentions(text, entity_names(brand_name, competitors))
+    result = {
+        "text": text,
+        "windows": [],
+        "mentions": mentions,
+        "original_length": len(text),
+        "compacted_length": len(text),
+        "compacted": False
+    }
+    if not mentions:
+        return result
+
+    windows = []
+    for mention in mentions:
+        start, end = expand_to_sentence(
+            text,
+            max(0, mention["start"] - context_chars),
+            min(len(text), mention["end"] + context_chars)
+        )
+        if windows and start <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], end))
+        else:
+            windows.append((start, end))
+
+    excerpts = []
+    for start, end in windows:
+        segment = text[start:end]
+        leading = len(segment) - len(segment.lstrip())
+        excerpts.append(f"[offset {start + leading}] {segment.strip()}")
+    compacted_text = "\n...\n".join(excerpts)
+    result["windows"] = windows
+
+    if len(compacted_text) >= len(text) * MIN_SAVING_RATIO:
+        return result
+
+    result["text"] = compacted_text
+    result["compacted_length"] = len(compacted_text)
+    result["compacted"] = True
+    return result
+
+
+def not_mentioned_result(judge_skipped: bool = False) -> Dict[str, Any]:
+    """
+    The judge verdict for a response that mentions neither the brand nor any competitor.
+
+    Args:
+        judge_skipped (bool, optional): Mark the verdict as decided by compaction without a judge call.
+    """
+    result = {
+        "brand_mentioned": False,
+        "mention_position": None,
+        "sentiment": "neutral",
+        "context": "not mentioned",
+        "competitors_mentioned": []
+    }
+    if judge_skipped:
+        result["judge_skipped"] = True
+    return result
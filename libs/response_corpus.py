@@ -0,0 +1,128 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Dict, Any, Optional
+
+
+# Generated responses are stored here and reused across brand audits; set RESPONSE_CORPUS=0 to always regenerate
+RESPONSE_CORPUS = os.getenv("RESPONSE_CORPUS", "1") != "0"
+RESPONSE_CORPUS_PATH = os.getenv("RESPONSE_CORPUS_PATH", "response_corpus.db")
+
+_schema_lock = threading.Lock()
+_initialized_paths = set()
+
+
+class FailedResponse(str):
+    """
+    Placeholder text ("Error: ...") standing in for a response that could not be generated.
+
+    It flows through judging and reports like any response, but is recognized
+    by its type: it is never stored, so the sample is generated again next
+    time, whatever a real answer happens to start with.
+    """
+
+
+def is_failed(response: str) -> bool:
+    return isinstance(response, FailedResponse)
+
+
+def _connect() -> sqlite3.Connection:
+    connection = sqlite3.connect(RESPONSE_CORPUS_PATH, timeout=30)
+    with _schema_lock:
+        if RESPONSE_CORPUS_PATH not in _initialized_paths:
+            # WAL lets scoring passes read while a generation pass is writing
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    model TEXT NOT NULL,
+                    query TEXT NOT NULL,
+                    sample INTEGER NOT NULL,
+                    date TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (model, query, sample, date)
+                )
+            """)
+            connection.commit()
+            _initialized_paths.add(RESPONSE_CORPUS_PATH)
+    return connection
+
+
+def today() -> str:
+    """
+    The corpus date used when none is given: responses are reused within a day and regenerated the next.
+    """
+    return time.strftime("%Y-%m-%d")
+
+
+def get_responses(model: str, query: str, samples: int = 1, date: str = None) -> List[str]:
+    """
+    Returns the stored responses for (model, query, date), samples 0..samples-1 in order.
+
+    Args:
+        model (str): The model that generated the responses.
+        query (str): The query text.
+        samples (int, optional): Number of samples wanted. Defaults to 1.
+        date (str, optional): Corpus date (YYYY-MM-DD); defaults to today.
+
+    Returns:
+        List[str]: Up to samples stored responses, in sample order
+    """
+    with _connect() as connection:
+        rows = connection.execute(
+            "SELECT response FROM responses WHERE model = ? AND query = ? AND date = ? ORDER BY sample LIMIT ?",
+            (model, query, date or today(), samples)
+        ).fetchall()
+    return [row[0] for row in rows]
+
+
+def store_responses(model: str, query: str, responses: List[str], date: str = None):
+    """
+    Appends generated responses for (model, query, date) after the samples already stored.
+
+    Failed and empty responses are left out and the rest are numbered
+    consecutively, so stored samples never have gaps and are never
+    overwritten by a later run.
+    """
+    kept = [response for response in responses if response and not is_failed(response)]
+    if not kept:
+        return
+    date = date or today()
+    now = time.time()
+    with _connect() as connection:
+        # Reserve the next sample numbers in the same write transaction as the insert
+        connection.execute("BEGIN IMMEDIATE")
+        next_sample = connection.execute(
+            "SELECT COALESCE(MAX(sample) + 1, 0) FROM responses WHERE model = ? AND query = ? AND date = ?",
+            (model, query, date)
+        ).fetchone()[0]
+        connection.executemany(
+            "INSERT INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+            [(model, query, next_sample + offset, date, response, now) for offset, response in enumerate(kept)]
+        )
+
+
+def list_dates() -> List[Dict[str, Any]]:
+    """
+    Lists corpus dates with the number of stored responses, queries and models for each.
+    """
+    with _connect() as connection:
+        rows = connection.execute(
+            "SELECT date, COUNT(*), COUNT(DISTINCT query), COUNT(DISTINCT model) FROM responses GROUP BY date ORDER BY date DESC"
+        ).fetchall()
+    return [{"date": date, "responses": responses, "queries": queries, "models": models} for date, responses, queries, models in rows]
+
+
+def list_queries(date: str = None, models: Optional[List[str]] = None) -> List[str]:
+    """
+    Returns the distinct queries stored for a date (optionally restricted to some models), in insertion order.
+    """
+    sql = "SELECT query FROM responses WHERE date = ?"
+    parameters: List[Any] = [date or today()]
+    if models:
+        sql += f" AND model IN ({', '.join('?' for _ in models)})"
+        parameters.extend(models)
+    sql += " GROUP BY query ORDER BY MIN(rowid)"
+    with _connect() as connection:
+        return [row[0] for row in connection.execute(sql, parameters).fetchall()]
@@ -0,0 +1,200 @@
+import math
+import os
+import random
+from statistics import NormalDist
+from typing import Dict, Any, List, Tuple
+
+
+# Default half-width (in rate units, 0.05 = ±5 points) at which adaptive sampling stops
+SAMPLING_TARGET_MARGIN = float(os.getenv("SAMPLING_TARGET_MARGIN", "0.05"))
+SAMPLING_CONFIDENCE = float(os.getenv("SAMPLING_CONFIDENCE", "0.95"))
+# Observations per model before the stopping rule is checked, so a lucky streak cannot stop a run early
+SAMPLING_MIN_QUERIES = int(os.getenv("SAMPLING_MIN_QUERIES", "10"))
+
+INTERVAL_METHODS = ("wilson", "jeffreys")
+SENTIMENTS = ("positive", "neutral", "negative")
+
+
+def wilson_interval(successes: int, trials: int, confidence: float = None) -> Tuple[float, float]:
+    """
+    Wilson score interval for a binomial proportion.
+
+    Args:
+        successes (int): Number of successes.
+        trials (int): Number of trials.
+        confidence (float, optional): Confidence level; defaults to SAMPLING_CONFIDENCE.
+
+    Returns:
+        Tuple[float, float]: Lower and upper bound, (0, 1) when there are no trials.
+    """
+    if confidence is None:
+        confidence = SAMPLING_CONFIDENCE
+    if trials <= 0:
+        return 0.0, 1.0
+
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    p = successes / trials
+    denominator = 1 + z * z / trials
+    centre = (p + z * z / (2 * trials)) / denominator
+    half_width = z * math.sqrt(p * (1 - p) / trials + z * z / (4 * trials * trials)) / denominator
+    return max(0.0, centre - half_width), min(1.0, centre + half_width)
+
+
+def _beta_continued_fraction(a: float, b: float, x: float) -> float:
+    # Lentz's method for the continued fraction of the regularized incomplete beta function
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    result = d
+    for m in range(1, 300):
+        for numerator in (
+            m * (b - m) * x / ((a + 2 * m - 1) * (a + 2 * m)),
+            -(a + m) * (a + b + m) * x / ((a + 2 * m) * (a + 2 * m + 1))
+        ):
+            d = 1.0 + numerator * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + numerator / c
+            c = c if abs(c) > tiny else tiny
+            result *= c * d
+        if abs(c * d - 1.0) < 1e-12:
+            break
+    return result
+
+
+def _beta_cdf(x: float, a: float, b: float) -> float:
+    if x <= 0:
+        return 0.0
+    if x >= 1:
+        return 1.0
+    log_front = math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1 - x)
+    if x < (a + 1) / (a + b + 2):
+        return math.exp(log_front) * _beta_continued_fraction(a, b, x) / a
+    return 1.0 - math.exp(log_front) * _beta_continued_fraction(b, a, 1 - x) / b
+
+
+def _beta_quantile(q: float, a: float, b: float) -> float:
+    low, high = 0.0, 1.0
+    for _ in range(60):
+        middle = (low + high) / 2
+        if _beta_cdf(middle, a, b) < q:
+            low = middle
+        else:
+            high = middle
+    return (low + high) / 2
+
+
+def jeffreys_interval(successes: int, trials: int, confidence: float = None) -> Tuple[float, float]:
+    """
+    Bayesian equal-tailed credible interval for a proportion under the Jeffreys Beta(1/2, 1/2) prior.
+
+    Args:
+        successes (int): Number of successes.
+        trials (int): Number of trials.
+        confidence (float, optional): Credible level; defaults to SAMPLING_CONFIDENCE.
+
+    Returns:
+        Tuple[float, float]: Lower and upper bound, (0, 1) when there are no trials.
+    """
+    if confidence is None:
+        confidence = SAMPLING_CONFIDENCE
+    if trials <= 0:
+        return 0.0, 1.0
+
+    a, b = successes + 0.5, trials - successes + 0.5
+    tail = (1 - confidence) / 2
+    low = 0.0 if successes == 0 else _beta_quantile(tail, a, b)
+    high = 1.0 if successes == trials else _beta_quantile(1 - tail, a, b)
+    return low, high
+
+
+def proportion_interval(successes: int, trials: int, confidence: float = None, method: str = "wilson") -> Dict[str, Any]:
+    """
+    Point estimate and interval for a proportion.
+
+    Args:
+        successes (int): Number of successes.
+        trials (int): Number of trials.
+        confidence (float, optional): Confidence level; defaults to SAMPLING_CONFIDENCE.
+        method (str): "wilson" (frequentist) or "jeffreys" (Bayesian).
+
+    Returns:
+        Dict: "estimate", "low", "high", "margin" (half-width), "successes" and "trials"
+    """
+    if method not in INTERVAL_METHODS:
+        raise ValueError(f"Unknown interval method '{method}', expected one of {INTERVAL_METHODS}")
+    interval = jeffreys_interval if method == "jeffreys" else wilson_interval
+    low, high = interval(successes, trials, confidence)
+    return {
+        "estimate": successes / trials if trials else None,
+        "low": low,
+        "high": high,
+        "margin": (high - low) / 2,
+        "successes": successes,
+        "trials": trials
+    }
+
+
+class ModelSampler:
+    """
+    Running mention and sentiment counts for one model during adaptive sampling.
+
+    Mention rate is a proportion of all responses; sentiment share is a proportion
+    of the responses that mention the brand.
+    """
+
+    def __init__(self, model: str, confidence: float = None, method: str = "wilson"):
+        self.model = model
+        self.confidence = confidence if confidence is not None else SAMPLING_CONFIDENCE
+        self.method = method
+        self.trials = 0
+        self.mentions = 0
+        self.sentiments = {sentiment: 0 for sentiment in SENTIMENTS}
+        self.stop_reason = None
+
+    def observe(self, brand_mentioned: bool, sentiment: str = None):
+        self.trials += 1
+        if brand_mentioned:
+            self.mentions += 1
+            if sentiment in self.sentiments:
+                self.sentiments[sentiment] += 1
+
+    def mention_rate(self) -> Dict[str, Any]:
+        return proportion_interval(self.mentions, self.trials, self.confidence, self.method)
+
+    def sentiment_share(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            sentiment: proportion_interval(count, self.mentions, self.confidence, self.method)
+            for sentiment, count in self.sentiments.items()
+        }
+
+    def precise_enough(self, target_margin: float, min_trials: int, include_sentiment: bool = False) -> bool:
+        """
+        Whether the mention rate (and optionally every sentiment share) is within target_margin.
+        """
+        if self.trials < min_trials:
+            return False
+        if self.mention_rate()["margin"] > target_margin:
+            return False
+        if include_sentiment:
+            return all(share["margin"] <= target_margin for share in self.sentiment_share().values())
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "queries_spent": self.trials,
+            "mention_rate": self.mention_rate(),
+            "sentiment_share": self.sentiment_share(),
+            "stop_reason": self.stop_reason
+        }
+
+
+def round_robin_order(queries: List[Any], models: List[str], seed: int = None) -> List[Tuple[Any, str]]:
+    """
+    Randomized (query, model) schedule: queries are shuffled once and each is tried on every model in turn.
+
+    Shuffling keeps every prefix of the schedule a random sample of the query set,
+    which is what makes stopping early unbiased.
+    """
+    shuffled = list(queries)
+    random.Random(seed).shuffle(shuffled)
+    return [(query, model) for query in shuffled for model in models]
@@ -2,24 +2,100 @@ import os
 import requests
 from bs4 import BeautifulSoup
 import json
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator, Callable
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import time
 import random
 from urllib.parse import quote_plus, urljoin
 import re
 from serpapi.client import SerpAPI
+import libs.metrics as metrics
+import libs.tracing as tracing
+import libs.query_dedup as query_dedup
+import libs.aggregation as aggregation
+import libs.serp_snapshots as serp_snapshots
 
-def real_google_search(query: str, location: str = "United States", num_results: int = 10) -> List[Dict[str, Any]]:
+# (location, query) searches run concurrently
+SERP_WORKERS = int(os.getenv("SERP_WORKERS", "4"))
+# Results ranked per (location, query); above SERP_PAGE_SIZE, result pages are fetched concurrently
+SERP_DEPTH = int(os.getenv("SERP_DEPTH", "10"))
+SERP_PAGE_SIZE = 10
+# Result pages of one search in flight at once
+SERP_PAGE_WORKERS = int(os.getenv("SERP_PAGE_WORKERS", "3"))
+
+class PartialResults(list):
+    """
+    Results of a search cut short by a failed result page.
+    
+    Holds the pages merged before the failure. Unlike a short page, which
+    means there are no more results, a failed page says nothing about the
+    results below it, so these results must not be read as the full ranking.
+    """
+    
+    def __init__(self, results: List[Dict[str, Any]], error: str):
+        super().__init__(results)
+        self.error = error
+
+def _fetch_pages(fetch_page: Callable[[int], List[Dict[str, Any]]], pages: int, stop_when: Callable[[List[Dict[str, Any]]], bool] = None) -> List[Dict[str, Any]]:
+    """
+    Fetch result pages 0..pages-1 concurrently and merge them in page order.
+    
+    Up to SERP_PAGE_WORKERS pages are in flight; pages are merged strictly in
+    order, so a match found on a later page never hides an earlier one. Once
+    the merged results satisfy stop_when, or a page comes back short (no more
+    results), pages not yet sent are cancelled.
+    
+    A failure on the first page is raised. A failure on a deeper page ends the
+    search with the pages merged so far, returned as PartialResults.
+    
+    Args:
+        fetch_page (Callable): Returns the results of one page, given its index
+        pages (int): Maximum number of pages
+        stop_when (Callable, optional): Returns True once the merged results contain everything needed
+        
+    Returns:
+        List[Dict]: Merged results of the pages fetched (PartialResults if a deeper page failed)
+    """
+    merged = []
+    executor = ThreadPoolExecutor(max_workers=max(1, min(SERP_PAGE_WORKERS, pages)))
+    futures = {}
+    try:
+        for page in range(pages):
+            for ahead in range(page, min(pages, page + max(1, SERP_PAGE_WORKERS))):
+                if ahead not in futures:
+                    futures[ahead] = executor.submit(tracing.propagate(fetch_page), ahead)
+            try:
+                page_results = futures.pop(page).result()
+            except Exception as e:
+                if page == 0:
+                    raise
+                print(f"SERP page {page + 1} failed: {e}")
+                return PartialResults(merged, str(e))
+            merged.extend(page_results)
+            if len(page_results) < SERP_PAGE_SIZE or (stop_when and stop_when(merged)):
+                break
+    finally:
+        # Pages already in flight finish in the background; their results are dropped
+        executor.shutdown(wait=False, cancel_futures=True)
+    return merged
+
+def real_google_search(query: str, location: str = "United States", num_results: int = 10, stop_when: Callable[[List[Dict[str, Any]]], bool] = None) -> List[Dict[str, Any]]:
     """
     Perform real Google search using SerpAPI.
     
+    Results beyond the first page are fetched SERP_PAGE_SIZE at a time on
+    concurrent requests and numbered by absolute position (result 3 of the
+    second page is position 13).
+    
     Args:
         query (str): The search query
         location (str): Geographic location for the search
         num_results (int): Number of results to return
+        stop_when (Callable, optional): Stop fetching further pages once it returns True for the results so far
         
     Returns:
         List[Dict]: List of search results with title, url, snippet, and position
+                    (PartialResults if a page below the first failed)
     """
     serpapi_key = os.getenv("SERPAPI_KEY")
     
@@ -49,34 +125,39 @@ def real_google_search(query: str, location: str = "United States", num_results:
         
         location_code = location_mapping.get(location, "us")
         
-        client = Client(api_key=serpapi_key)
-        
-        results = client.search({
-            "q": query,
-            "location": location,
-            "gl": location_code,
-            "num": min(num_results, 10),  # SerpAPI free tier limit
-            "engine": "google"
-        })
-        
-        if "error" in results:
-            print(f"SerpAPI Error: {results['error']}")
-            return simulate_google_search(query, location, num_results)
+        client = SerpAPI(api_key=serpapi_key)
         
-        organic_results = results.get("organic_results", [])
-        
-        search_results = []
-        for i, result in enumerate(organic_results[:num_results]):
-            search_results.append({
-                "position": i + 1,
+        def search_page(page: int) -> List[Dict[str, Any]]:
+            start = page * SERP_PAGE_SIZE
+            params = {
+                "q": query,
+                "location": location,
+                "gl": location_code,
+                "num": SERP_PAGE_SIZE,  # SerpAPI free tier limit
+                "engine": "google"
+            }
+            if start:
+                params["start"] = start
+            with metrics.observe_call("real_google_search", "serpapi", page=page):
+                results = client.search(params)
+            
+            if "error" in results:
+                raise RuntimeError(f"SerpAPI Error: {results['error']}")
+            
+            return [{
+                "position": start + i + 1,
                 "title": result.get("title", ""),
                 "url": result.get("link", ""),
                 "snippet": result.get("snippet", ""),
                 "domain": result.get("displayed_link", "").split('/')[0] if result.get("displayed_link") else "",
                 "location": location,
                 "query": query
-            })
+            } for i, result in enumerate(results.get("organic_results", [])[:SERP_PAGE_SIZE])]
         
+        pages = max(1, -(-num_results // SERP_PAGE_SIZE))
+        search_results = _fetch_pages(search_page, pages, stop_when)
+        # Trimmed in place, so PartialResults keep their type
+        del search_results[num_results:]
         return search_results
         
     except Exception as e:
@@ -142,10 +223,109 @@ def simulate_google_search(query: str, location: str = "United States", num_resu
         result["position"] = i + 1
         result["location"] = location
         result["query"] = query
+        result["simulated"] = True
     
     return sample_results[:num_results]
 
-def analyze_brand_presence(brand_name: str, competitors: List[str], queries: List[str], locations: List[str]) -> Dict[str, Any]:
+def _mentions(name: str, result: Dict[str, Any]) -> bool:
+    return name.lower() in result["title"].lower() or name.lower() in result["snippet"].lower()
+
+def rank_query(brand_name: str, competitors: List[str], query: str, location: str, depth: int = None) -> Dict[str, Any]:
+    """
+    Search one query in one location and locate the brand and its competitors in the results.
+    
+    Args:
+        brand_name (str): The brand to look for
+        competitors (List[str]): List of competitor names
+        query (str): The search query
+        location (str): Geographic location for the search
+        depth (int, optional): Results to rank through (defaults to SERP_DEPTH); deeper pages
+                               are only fetched until the brand and every competitor are found
+        
+    Returns:
+        Dict: The query_performance row for (location, query); "search_partial" is True when a
+              result page failed, so the brand and competitors were only looked for above it
+    """
+    depth = depth or SERP_DEPTH
+    
+    def everyone_found(results: List[Dict[str, Any]]) -> bool:
+        return all(any(_mentions(name, result) for result in results) for name in [brand_name, *competitors])
+    
+    # Search for this query in this location (real or simulated)
+    with tracing.span("serp_query", location=location, query=query, depth=depth):
+        search_results = real_google_search(query, location, depth, stop_when=everyone_found)
+    partial = isinstance(search_results, PartialResults)
+    
+    # Keep the day's SERP for rank history; simulated results are not real rankings,
+    # and a partial search would record every result below the failed page as dropped
+    if search_results and not partial and not any(result.get("simulated") for result in search_results):
+        try:
+            serp_snapshots.save_snapshot(query, location, search_results)
+        except Exception as e:
+            print(f"Error saving SERP snapshot: {e}")
+    
+    # Find brand position
+    brand_position = None
+    brand_found = False
+    
+    for result in search_results:
+        if _mentions(brand_name, result):
+            brand_position = result["position"]
+            brand_found = True
+            break
+    
+    # Analyze competitor presence
+    competitors_found = []
+    for result in search_results:
+        for competitor in competitors:
+            if _mentions(competitor, result):
+                competitors_found.append({
+                    "name": competitor,
+                    "position": result["position"],
+                    "title": result["title"],
+                    "url": result["url"]
+                })
+    
+    return {
+        "query": query,
+        "location": location,
+        "brand_position": brand_position,
+        "brand_found": brand_found,
+        "competitors_found": competitors_found,
+        "total_results": len(search_results),
+        "search_depth": depth,
+        "search_partial": partial,
+        "search_error": search_results.error if partial else None,
+        "search_results": search_results[:3]  # Store top 3 for reference
+    }
+
+def iter_brand_presence(brand_name: str, competitors: List[str], queries: List[str], locations: List[str], depth: int = None) -> Iterator[Dict[str, Any]]:
+    """
+    Rank every (location, query) pair, yielding each query_performance row as soon as its search completes.
+    
+    Searches run on SERP_WORKERS threads, so rows arrive in completion order.
+    
+    Args:
+        brand_name (str): The brand to analyze
+        competitors (List[str]): List of competitor names
+        queries (List[str]): List of search queries to test
+        locations (List[str]): List of geographic locations
+        depth (int, optional): Results to rank through per search (defaults to SERP_DEPTH)
+        
+    Returns:
+        Iterator[Dict]: One query_performance row per (location, query)
+    """
+    query_strings = [query_dedup.query_text(query) for query in queries]
+    with ThreadPoolExecutor(max_workers=max(1, SERP_WORKERS)) as executor:
+        futures = [
+            executor.submit(tracing.propagate(rank_query), brand_name, competitors, query, location, depth)
+            for location in locations
+            for query in query_strings
+        ]
+        for future in as_completed(futures):
+            yield future.result()
+
+def analyze_brand_presence(brand_name: str, competitors: List[str], queries: List[str], locations: List[str], dedup_threshold: float = None, depth: int = None) -> Dict[str, Any]:
     """
     Analyze brand presence across different queries and locations.
     
@@ -154,121 +334,39 @@ def analyze_brand_presence(brand_name: str, competitors: List[str], queries: Lis
         competitors (List[str]): List of competitor names
         queries (List[str]): List of search queries to test
         locations (List[str]): List of geographic locations
+        dedup_threshold (float): Similarity above which queries are merged as near-duplicates (defaults to QUERY_DEDUP_THRESHOLD)
+        depth (int, optional): Results to rank through per search (defaults to SERP_DEPTH)
         
     Returns:
         Dict: Analysis results including rankings, visibility, and competitor comparison
     """
+    # Drop paraphrased queries before they are searched in every location
+    dedup_report = query_dedup.deduplicate_queries(queries, dedup_threshold)
+    queries = dedup_report["queries"]
+    
     analysis_results = {
         "brand_name": brand_name,
         "total_queries_tested": len(queries),
         "locations_tested": locations,
-        "query_performance": [],
-        "location_performance": {},
-        "competitor_analysis": {},
-        "overall_metrics": {
-            "average_position": 0,
-            "visibility_score": 0,
-            "queries_in_top_10": 0,
-            "queries_not_found": 0
-        }
+        "query_deduplication": {
+            "removed": dedup_report["removed"],
+            "threshold": dedup_report["threshold"],
+            "merged": dedup_report["merged"]
+        },
+        "query_performance": []
     }
     
-    all_positions = []
-    queries_in_top_10 = 0
-    queries_not_found = 0
-    
-    for location in locations:
-        analysis_results["location_performance"][location] = {
-            "queries_tested": len(queries),
-            "average_position": 0,
-            "visibility_score": 0
-        }
-        
-        location_positions = []
-        
-        for query_data in queries:
-            query = query_data.get("query", str(query_data)) if isinstance(query_data, dict) else str(query_data)
-            
-            # Search for this query in this location (real or simulated)
-            search_results = real_google_search(query, location)
-            
-            # Find brand position
-            brand_position = None
-            brand_found = False
-            
-            for result in search_results:
-                if brand_name.lower() in result["title"].lower() or brand_name.lower() in result["snippet"].lower():
-                    brand_position = result["position"]
-                    brand_found = True
-                    break
-            
-            # Analyze competitor presence
-            competitors_found = []
-            for result in search_results:
-                for competitor in competitors:
-                    if competitor.lower() in result["title"].lower() or competitor.lower() in result["snippet"].lower():
-                        competitors_found.append({
-                            "name": competitor,
-                            "position": result["position"],
-                            "title": result["title"],
-                            "url": result["url"]
-                        })
-            
-            # Calculate metrics
-            if brand_found:
-                all_positions.append(brand_position)
-                location_positions.append(brand_position)
-                if brand_position <= 10:
-                    queries_in_top_10 += 1
-            else:
-                queries_not_found += 1
-            
-            # Store query performance
-            query_performance = {
-                "query": query,
-                "location": location,
-                "brand_position": brand_position,
-                "brand_found": brand_found,
-                "competitors_found": competitors_found,
-                "total_results": len(search_results),
-                "search_results": search_results[:3]  # Store top 3 for reference
-            }
-            
-            analysis_results["query_performance"].append(query_performance)
-        
-        # Calculate location-specific metrics
-        if location_positions:
-            analysis_results["location_performance"][location]["average_position"] = sum(location_positions) / len(location_positions)
-            analysis_results["location_performance"][location]["visibility_score"] = (len(location_positions) / len(queries)) * 100
-    
-    # Calculate overall metrics
-    if all_positions:
-        analysis_results["overall_metrics"]["average_position"] = sum(all_positions) / len(all_positions)
-    
-    analysis_results["overall_metrics"]["visibility_score"] = ((len(queries) * len(locations) - queries_not_found) / (len(queries) * len(locations))) * 100
-    analysis_results["overall_metrics"]["queries_in_top_10"] = queries_in_top_10
-    analysis_results["overall_metrics"]["queries_not_found"] = queries_not_found
-    
-    # Competitor analysis summary
-    competitor_summary = {}
-    for query_perf in analysis_results["query_performance"]:
-        for comp in query_perf["competitors_found"]:
-            comp_name = comp["name"]
-            if comp_name not in competitor_summary:
-                competitor_summary[comp_name] = {
-                    "appearances": 0,
-                    "average_position": 0,
-                    "positions": []
-                }
-            competitor_summary[comp_name]["appearances"] += 1
-            competitor_summary[comp_name]["positions"].append(comp["position"])
-    
-    # Calculate competitor averages
-    for comp_name, data in competitor_summary.items():
-        if data["positions"]:
-            data["average_position"] = sum(data["positions"]) / len(data["positions"])
+    aggregator = aggregation.SerpAggregator(locations)
+    for query_performance in iter_brand_presence(brand_name, competitors, queries, locations, depth):
+        aggregator.add_row(query_performance)
+        analysis_results["query_performance"].append(query_performance)
     
-    analysis_results["competitor_analysis"] = competitor_summary
+    # Report rows in (location, query) order regardless of completion order
+    order = {(location, query_dedup.query_text(query)): index for index, (location, query) in enumerate(
+        (location, query) for location in locations for query in queries
+    )}
+    analysis_results["query_performance"].sort(key=lambda row: order.get((row["location"], row["query"]), len(order)))
+    analysis_results.update(aggregator.snapshot())
     
     return analysis_results
 
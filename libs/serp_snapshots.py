@@ -0,0 +1,291 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import date as Date
+from typing import List, Dict, Any, Optional, Tuple
+
+
+# Daily SERP snapshots of every ranked (query, location); set SERP_SNAPSHOTS=0 to disable
+SERP_SNAPSHOTS = os.getenv("SERP_SNAPSHOTS", "1") != "0"
+SERP_SNAPSHOT_PATH = os.getenv("SERP_SNAPSHOT_PATH", "serp_snapshots.db")
+# A full baseline is stored once this many days have passed since the last one; the days in between store deltas
+SERP_SNAPSHOT_BASELINE_DAYS = int(os.getenv("SERP_SNAPSHOT_BASELINE_DAYS", "30"))
+
+_schema_lock = threading.Lock()
+_initialized_paths = set()
+# Saving reads the previous state and writes the next one, so writers of the store take turns
+_write_lock = threading.Lock()
+
+
+def _connect() -> sqlite3.Connection:
+    connection = sqlite3.connect(SERP_SNAPSHOT_PATH, timeout=30)
+    with _schema_lock:
+        if SERP_SNAPSHOT_PATH not in _initialized_paths:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS serp_snapshots (
+                    query TEXT NOT NULL,
+                    location TEXT NOT NULL,
+                    date TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    changes INTEGER NOT NULL,
+                    payload BLOB NOT NULL,
+                    full_size INTEGER NOT NULL,
+                    PRIMARY KEY (query, location, date)
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS serp_snapshots_date ON serp_snapshots (date, changes)")
+            connection.commit()
+            _initialized_paths.add(SERP_SNAPSHOT_PATH)
+    return connection
+
+
+def today() -> str:
+    return time.strftime("%Y-%m-%d")
+
+
+def _encode(value: Any) -> bytes:
+    """
+    Compact JSON, zlib-compressed only when that makes it smaller (small deltas are not).
+    """
+    raw = json.dumps(value, separators=(",", ":")).encode("utf-8")
+    compressed = zlib.compress(raw, 9)
+    return compressed if len(compressed) < len(raw) else raw
+
+
+def _decode(payload: bytes) -> Any:
+    # JSON starts with "{", a zlib stream never does
+    return json.loads((payload if payload[:1] == b"{" else zlib.decompress(payload)).decode("utf-8"))
+
+
+def _serp_state(results: List[Dict[str, Any]]) -> Dict[str, List[Any]]:
+    """
+    Reduces search results to url -> [position, title, domain], keeping the first occurrence of a URL.
+    """
+    state = {}
+    for result in results:
+        if result.get("url") and result["url"] not in state:
+            state[result["url"]] = [result["position"], result.get("title", ""), result.get("domain", "")]
+    return state
+
+
+def _diff(previous: Dict[str, List[Any]], current: Dict[str, List[Any]]) -> Dict[str, Any]:
+    """
+    Changes from one day's SERP state to the next: moved URLs (old and new position), added and removed URLs.
+
+    Searches stop paging once everything tracked is found, so a day may scan
+    fewer results than the day before. Only URLs previously ranked within the
+    depth scanned today count as removed. Deeper ones were not observed: they
+    are listed as "unscanned", which drops them from the day's state without
+    reporting them as movements, so a reconstructed day holds exactly the
+    results scanned that day.
+    """
+    scanned = max((entry[0] for entry in current.values()), default=0)
+    delta = {
+        "moved": {url: [previous[url][0], entry[0]] for url, entry in current.items() if url in previous and previous[url][0] != entry[0]},
+        "added": {url: entry for url, entry in current.items() if url not in previous},
+        "removed": {url: entry[0] for url, entry in previous.items() if url not in current and entry[0] <= scanned},
+        "unscanned": [url for url, entry in previous.items() if url not in current and entry[0] > scanned]
+    }
+    # Empty sections are left out, so an unchanged SERP stores as "{}"
+    return {section: changes for section, changes in delta.items() if changes}
+
+
+def _apply(state: Dict[str, List[Any]], delta: Dict[str, Any]) -> Dict[str, List[Any]]:
+    dropped = set(delta.get("removed", {})).union(delta.get("unscanned", []))
+    state = {url: list(entry) for url, entry in state.items() if url not in dropped}
+    for url, (_, position) in delta.get("moved", {}).items():
+        state[url][0] = position
+    state.update({url: list(entry) for url, entry in delta.get("added", {}).items()})
+    return state
+
+
+def _state_on(connection: sqlite3.Connection, query: str, location: str, date: str) -> Tuple[Optional[str], Dict[str, List[Any]]]:
+    """
+    Reconstructs the SERP state of (query, location) as of date: the latest baseline on or before it plus the deltas since.
+
+    Returns:
+        Tuple: (date of the latest snapshot on or before date or None, url -> [position, title, domain])
+    """
+    baseline = connection.execute(
+        "SELECT date, payload FROM serp_snapshots WHERE query = ? AND location = ? AND kind = 'baseline' AND date <= ? ORDER BY date DESC LIMIT 1",
+        (query, location, date)
+    ).fetchone()
+    if baseline is None:
+        return None, {}
+    snapshot_date, state = baseline[0], _decode(baseline[1])["serp"]
+    deltas = connection.execute(
+        "SELECT date, payload FROM serp_snapshots WHERE query = ? AND location = ? AND kind = 'delta' AND date > ? AND date <= ? ORDER BY date",
+        (query, location, snapshot_date, date)
+    ).fetchall()
+    for snapshot_date, payload in deltas:
+        state = _apply(state, _decode(payload))
+    return snapshot_date, state
+
+
+def _day_before(date: str) -> str:
+    return Date.fromordinal(Date.fromisoformat(date).toordinal() - 1).isoformat()
+
+
+def _days_between(start: str, end: str) -> int:
+    return Date.fromisoformat(end).toordinal() - Date.fromisoformat(start).toordinal()
+
+
+def save_snapshot(query: str, location: str, results: List[Dict[str, Any]], date: str = None):
+    """
+    Stores the day's SERP of (query, location) as a baseline or as a delta against the previous snapshot.
+
+    A baseline (the full ranked URL list) is written for the first snapshot and
+    whenever SERP_SNAPSHOT_BASELINE_DAYS have passed since the last one, which
+    bounds the deltas replayed to reconstruct any day. Every other day stores
+    only moved, added and removed URLs: for a stable SERP, a few bytes instead
+    of the whole list. Baselines keep their delta too, so movement queries see
+    every day. Saving again on the same day replaces that day's snapshot;
+    dates before the latest stored snapshot are ignored, as they would break
+    the delta chain.
+
+    Args:
+        query (str): The search query.
+        location (str): Location the query was searched in.
+        results (List[Dict]): Search results with position, url, title and domain.
+        date (str, optional): Snapshot date (YYYY-MM-DD); defaults to today.
+    """
+    if not SERP_SNAPSHOTS:
+        return
+    date = date or today()
+    current = _serp_state(results)
+
+    with _write_lock, _connect() as connection:
+        latest = connection.execute(
+            "SELECT MAX(date) FROM serp_snapshots WHERE query = ? AND location = ?", (query, location)
+        ).fetchone()[0]
+        if latest is not None and latest > date:
+            print(f"Skipping SERP snapshot of {query!r} in {location} for {date}: {latest} is already stored")
+            return
+
+        previous_date, previous = _state_on(connection, query, location, _day_before(date))
+        delta = _diff(previous, current) if previous_date is not None else None
+        last_baseline = connection.execute(
+            "SELECT MAX(date) FROM serp_snapshots WHERE query = ? AND location = ? AND kind = 'baseline' AND date < ?",
+            (query, location, date)
+        ).fetchone()[0]
+
+        # URLs below today's depth were not observed, so they are not changes
+        changes = sum(len(changes) for section, changes in delta.items() if section != "unscanned") if delta else 0
+        if delta is None or last_baseline is None or _days_between(last_baseline, date) >= SERP_SNAPSHOT_BASELINE_DAYS:
+            kind, payload = "baseline", _encode({"serp": current, "delta": delta})
+        else:
+            kind, payload = "delta", _encode(delta)
+        # What storing the full list every day would cost, for stats()
+        full_size = len(_encode({"serp": current}))
+        connection.execute(
+            "INSERT OR REPLACE INTO serp_snapshots VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (query, location, date, kind, changes, payload, full_size)
+        )
+
+
+def get_snapshot(query: str, location: str, date: str = None) -> Optional[Dict[str, Any]]:
+    """
+    Reconstructs the SERP of (query, location) as it was on a date.
+
+    Args:
+        query (str): The search query.
+        location (str): Location the query was searched in.
+        date (str, optional): Date (YYYY-MM-DD); defaults to today.
+
+    Returns:
+        Dict: "date", "snapshot_date" (the latest snapshot on or before date) and "results"
+              ordered by position, or None if nothing was stored by then
+    """
+    date = date or today()
+    with _connect() as connection:
+        snapshot_date, state = _state_on(connection, query, location, date)
+    if snapshot_date is None:
+        return None
+    results = [
+        {"position": position, "url": url, "title": title, "domain": domain}
+        for url, (position, title, domain) in state.items()
+    ]
+    results.sort(key=lambda result: result["position"])
+    return {"query": query, "location": location, "date": date, "snapshot_date": snapshot_date, "results": results}
+
+
+def get_movements(since: str, until: str = None, query: str = None, location: str = None, min_change: int = 1) -> List[Dict[str, Any]]:
+    """
+    Lists what moved between since and until (inclusive), straight from the stored deltas.
+
+    Only days with changes are read, and no SERP is reconstructed.
+
+    Args:
+        since (str): First date (YYYY-MM-DD).
+        until (str, optional): Last date; defaults to today.
+        query (str, optional): Only this query.
+        location (str, optional): Only this location.
+        min_change (int, optional): Smallest position change reported for moved URLs. Defaults to 1.
+
+    Returns:
+        List[Dict]: Per (query, location, date) with changes: "moved" (url, from, to, change),
+                    "added" (url, position, title) and "removed" (url, from)
+    """
+    sql = "SELECT query, location, date, kind, payload FROM serp_snapshots WHERE date >= ? AND date <= ? AND changes > 0"
+    parameters: List[Any] = [since, until or today()]
+    if query:
+        sql += " AND query = ?"
+        parameters.append(query)
+    if location:
+        sql += " AND location = ?"
+        parameters.append(location)
+    sql += " ORDER BY date, location, query"
+    with _connect() as connection:
+        rows = connection.execute(sql, parameters).fetchall()
+
+    movements = []
+    for row_query, row_location, row_date, kind, payload in rows:
+        delta = _decode(payload)
+        if kind == "baseline":
+            delta = delta["delta"]
+        moved = [
+            {"url": url, "from": old, "to": new, "change": old - new}
+            for url, (old, new) in delta.get("moved", {}).items()
+            if abs(old - new) >= min_change
+        ]
+        moved.sort(key=lambda move: -abs(move["change"]))
+        added = sorted(
+            ({"url": url, "position": position, "title": title} for url, (position, title, _) in delta.get("added", {}).items()),
+            key=lambda entry: entry["position"]
+        )
+        removed = sorted(({"url": url, "from": old} for url, old in delta.get("removed", {}).items()), key=lambda entry: entry["from"])
+        if moved or added or removed:
+            movements.append({
+                "query": row_query,
+                "location": row_location,
+                "date": row_date,
+                "moved": moved,
+                "added": added,
+                "removed": removed
+            })
+    return movements
+
+
+def stats() -> Dict[str, Any]:
+    """
+    Summarizes the store: snapshots by kind, (query, location) pairs tracked, and bytes stored versus daily full snapshots.
+    """
+    with _connect() as connection:
+        kinds = dict(connection.execute("SELECT kind, COUNT(*) FROM serp_snapshots GROUP BY kind").fetchall())
+        pairs, first, last, stored, full = connection.execute(
+            "SELECT COUNT(DISTINCT query || char(0) || location), MIN(date), MAX(date), SUM(LENGTH(payload)), SUM(full_size) FROM serp_snapshots"
+        ).fetchone()
+    return {
+        "baselines": kinds.get("baseline", 0),
+        "deltas": kinds.get("delta", 0),
+        "tracked_pairs": pairs,
+        "first_date": first,
+        "last_date": last,
+        "stored_bytes": stored or 0,
+        "full_snapshot_bytes": full or 0,
+        "compression_ratio": (full / stored) if stored else None
+    }
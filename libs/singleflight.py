@@ -0,0 +1,149 @@
+import json
+import re
+import threading
+from typing import Any, Callable, Dict, Iterable, Iterator
+
+import libs.metrics as metrics
+import libs.tracing as tracing
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(value: Any) -> Any:
+    if isinstance(value, str):
+        return _WHITESPACE.sub(" ", value.strip().lower())
+    if isinstance(value, dict):
+        return {str(k): _normalize(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_normalize(v) for v in value]
+    return value
+
+
+def request_key(operation: str, **params: Any) -> str:
+    """
+    Builds a single-flight key from an operation name and its parameters.
+
+    Strings are compared case- and whitespace-insensitively, so "Acme " and
+    "acme" share one computation; callers should pass already-normalized
+    values for anything with a richer notion of equality (e.g. domains).
+    """
+    return operation + ":" + json.dumps(_normalize(params), sort_keys=True, default=str)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class _Stream:
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.events = []
+        self.finished = False
+
+
+_lock = threading.Lock()
+_calls: Dict[str, _Call] = {}
+_streams: Dict[str, _Stream] = {}
+
+
+def do(key: str, fn: Callable[[], Any], operation: str = "call") -> Any:
+    """
+    Runs fn once for all concurrent callers with the same key and returns its result to each.
+
+    The first caller computes; callers arriving while it runs wait and get the
+    same result (or the same exception). Nothing is cached once the call ends.
+
+    Args:
+        key (str): Single-flight key, see request_key.
+        fn (Callable): The computation.
+        operation (str, optional): Label for the coalescing metric.
+
+    Returns:
+        Any: The result of fn.
+    """
+    with _lock:
+        call = _calls.get(key)
+        leader = call is None
+        if leader:
+            call = _calls[key] = _Call()
+    metrics.inc_counter("evidentia_singleflight_total", operation=operation, role="leader" if leader else "follower")
+
+    if not leader:
+        tracing.set_attributes(singleflight="follower")
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    try:
+        call.result = fn()
+        return call.result
+    except Exception as e:
+        call.error = e
+        raise
+    finally:
+        with _lock:
+            _calls.pop(key, None)
+        call.done.set()
+
+
+def stream(key: str, make_events: Callable[[], Iterable[Any]], operation: str = "stream") -> Iterator[Any]:
+    """
+    Shares one event stream (e.g. SSE frames) between all concurrent subscribers with the same key.
+
+    The first subscriber starts make_events() on a background thread, so the
+    computation finishes even if that client disconnects. Every subscriber,
+    including late ones, receives all events from the beginning, then live
+    events until the stream ends.
+
+    Args:
+        key (str): Single-flight key, see request_key.
+        make_events (Callable): Returns the iterable of events to produce.
+        operation (str, optional): Label for the coalescing metric.
+
+    Returns:
+        Iterator: The events, for this subscriber.
+    """
+    with _lock:
+        shared = _streams.get(key)
+        leader = shared is None
+        if leader:
+            shared = _streams[key] = _Stream()
+    metrics.inc_counter("evidentia_singleflight_total", operation=operation, role="leader" if leader else "follower")
+
+    if leader:
+        def produce():
+            try:
+                for event in make_events():
+                    with shared.condition:
+                        shared.events.append(event)
+                        shared.condition.notify_all()
+            finally:
+                with _lock:
+                    _streams.pop(key, None)
+                with shared.condition:
+                    shared.finished = True
+                    shared.condition.notify_all()
+
+        threading.Thread(target=tracing.propagate(produce), name=f"singleflight-{operation}", daemon=True).start()
+
+    return _subscribe(shared)
+
+
+def _subscribe(shared: _Stream) -> Iterator[Any]:
+    index = 0
+    while True:
+        with shared.condition:
+            while index >= len(shared.events) and not shared.finished:
+                shared.condition.wait()
+            pending = shared.events[index:]
+            finished = shared.finished
+        for event in pending:
+            yield event
+        index += len(pending)
+        if finished and index >= len(shared.events):
+            return
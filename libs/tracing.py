@@ -0,0 +1,267 @@
+import atexit
+import contextvars
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional
+
+import requests
+
+
+# Exporter selection: "none" (default), "file" (JSON lines) or "otlp" (OTLP/HTTP JSON)
+TRACING_EXPORTER = os.getenv("TRACING_EXPORTER", "none").lower()
+TRACING_FILE = os.getenv("TRACING_FILE", "traces.jsonl")
+OTLP_ENDPOINT = os.getenv("OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+SERVICE_NAME = os.getenv("TRACING_SERVICE_NAME", "evidentia")
+
+_current_span: contextvars.ContextVar = contextvars.ContextVar("evidentia_current_span", default=None)
+_export_queue: "queue.Queue" = queue.Queue(maxsize=10000)
+_worker_lock = threading.Lock()
+_worker: Optional[threading.Thread] = None
+
+
+class Span:
+    """
+    A single timed operation in a trace, with its parent link and attributes.
+    """
+
+    def __init__(self, name: str, parent: "Span" = None, attributes: Dict[str, Any] = None):
+        self.name = name
+        self.trace_id = parent.trace_id if parent else secrets.token_hex(16)
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent.span_id if parent else None
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = "ok"
+        self.status_message = ""
+
+    def set_attributes(self, **attributes):
+        self.attributes.update(attributes)
+
+    def set_error(self, error: BaseException):
+        self.status = "error"
+        self.status_message = f"{type(error).__name__}: {str(error)[:200]}"
+
+    def end(self):
+        if self.end_ns is None:
+            self.end_ns = time.time_ns()
+            _export(self)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": (self.end_ns - self.start_ns) / 1e6 if self.end_ns else None,
+            "attributes": self.attributes,
+            "status": self.status,
+            "status_message": self.status_message
+        }
+
+
+def enabled() -> bool:
+    return TRACING_EXPORTER in ("file", "otlp")
+
+
+def current_span() -> Optional[Span]:
+    """
+    Returns the span active in the current context, if any.
+    """
+    return _current_span.get()
+
+
+def start_span(name: str, parent: Span = None, **attributes) -> Span:
+    """
+    Starts a span without activating it; the caller must call end().
+
+    Args:
+        name (str): Span name.
+        parent (Span, optional): Parent span; defaults to the current span.
+        **attributes: Initial span attributes.
+
+    Returns:
+        Span: The started span.
+    """
+    return Span(name, parent or current_span(), attributes)
+
+
+def activate(span: Span) -> contextvars.Token:
+    """
+    Makes span the current span and returns the token needed to restore the previous one.
+    """
+    return _current_span.set(span)
+
+
+def deactivate(token: contextvars.Token):
+    """
+    Restores the span that was current before activate().
+    """
+    _current_span.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """
+    Opens a child span of the current span for the duration of the block.
+
+    Args:
+        name (str): Span name.
+        **attributes: Initial span attributes.
+
+    Yields:
+        Span: The active span, to which more attributes can be added.
+    """
+    active = start_span(name, **attributes)
+    token = activate(active)
+    try:
+        yield active
+    except BaseException as e:
+        active.set_error(e)
+        raise
+    finally:
+        deactivate(token)
+        active.end()
+
+
+def set_attributes(**attributes):
+    """
+    Adds attributes to the current span, if there is one.
+    """
+    active = current_span()
+    if active is not None:
+        active.set_attributes(**attributes)
+
+
+def wrap_stream(iterable: Iterable, active: Span):
+    """
+    Keeps a span current while a streamed (SSE) response body is generated and ends it when the stream closes.
+
+    Flask iterates streamed bodies after the view has returned, so the request
+    span has to be re-activated around the iteration.
+    """
+    token = activate(active)
+    try:
+        for chunk in iterable:
+            yield chunk
+    except BaseException as e:
+        active.set_error(e)
+        raise
+    finally:
+        deactivate(token)
+        active.end()
+
+
+def propagate(fn):
+    """
+    Wraps fn so it runs with the caller's current span when executed on another thread.
+
+    Use it when submitting work to a thread pool so fan-out calls become
+    children of the span that scheduled them.
+    """
+    context = contextvars.copy_context()
+
+    def run(*args, **kwargs):
+        return context.run(fn, *args, **kwargs)
+
+    return run
+
+
+def _export(finished: Span):
+    if not enabled():
+        return
+    _ensure_worker()
+    try:
+        _export_queue.put_nowait(finished)
+    except queue.Full:
+        pass
+
+
+def _ensure_worker():
+    global _worker
+    if _worker is not None:
+        return
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_export_loop, name="tracing-exporter", daemon=True)
+            _worker.start()
+            atexit.register(flush)
+
+
+def _export_loop():
+    while True:
+        batch = [_export_queue.get()]
+        deadline = time.time() + 1
+        while len(batch) < 200 and time.time() < deadline:
+            try:
+                batch.append(_export_queue.get(timeout=max(0, deadline - time.time())))
+            except queue.Empty:
+                break
+        _write_batch(batch)
+        for _ in batch:
+            _export_queue.task_done()
+
+
+def flush():
+    """
+    Blocks until all queued spans have been exported.
+    """
+    if _worker is not None:
+        _export_queue.join()
+
+
+def _write_batch(batch: list):
+    try:
+        if TRACING_EXPORTER == "file":
+            with open(TRACING_FILE, "a", encoding="utf-8") as file:
+                for finished in batch:
+                    file.write(json.dumps(finished.to_dict(), default=str) + "\n")
+        elif TRACING_EXPORTER == "otlp":
+            requests.post(OTLP_ENDPOINT, json=_to_otlp(batch), timeout=5)
+    except Exception as e:
+        print(f"Trace export failed: {e}")
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _to_otlp(batch: list) -> Dict[str, Any]:
+    """
+    Converts finished spans to an OTLP/HTTP JSON ExportTraceServiceRequest.
+    """
+    spans = []
+    for finished in batch:
+        otlp_span = {
+            "traceId": finished.trace_id,
+            "spanId": finished.span_id,
+            "name": finished.name,
+            "kind": 1,
+            "startTimeUnixNano": str(finished.start_ns),
+            "endTimeUnixNano": str(finished.end_ns),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in finished.attributes.items() if v is not None],
+            "status": {"code": 2, "message": finished.status_message} if finished.status == "error" else {"code": 1}
+        }
+        if finished.parent_id:
+            otlp_span["parentSpanId"] = finished.parent_id
+        spans.append(otlp_span)
+
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": "evidentia"}, "spans": spans}]
+        }]
+    }
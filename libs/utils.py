@@ -1,9 +1,18 @@
 import sys
 import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 from langchain.prompts import PromptTemplate
 from openai import OpenAI
 import libs.openai as openaiAnalytics
+import libs.metrics as metrics
+import libs.tracing as tracing
+import libs.cost_planner as cost_planner
+import libs.profile_store as profile_store
+import libs.latency as latency
+import libs.providers as providers
 import json
 
 
@@ -11,10 +20,49 @@ with open('utils/countryLanguage.json', 'r', encoding='utf-8') as file:
     countryLanguages = json.load(file)
 
 
+# Strings packed into one batch translation request are limited to this many input tokens
+TRANSLATION_BATCH_TOKENS = int(os.getenv("TRANSLATION_BATCH_TOKENS", "2000"))
+# Batch translation requests run concurrently
+TRANSLATION_WORKERS = int(os.getenv("TRANSLATION_WORKERS", "4"))
+TRANSLATION_MEMO_SIZE = 10000
+
+_translationMemo = OrderedDict()
+_translationMemoLock = threading.Lock()
+
+
+def getLlmClient(role: str = "translate") -> OpenAI:
+    """
+    Returns the process-wide client of the provider serving a call site role ("translate" or "profile").
+    """
+    return providers.get_client(role)
+
+
+def _getMemoizedTranslation(text: str, targetLanguage: str):
+    key = (text, targetLanguage.strip().lower())
+    with _translationMemoLock:
+        translation = _translationMemo.get(key)
+        if translation is not None:
+            _translationMemo.move_to_end(key)
+    metrics.record_cache("translation", translation is not None)
+    return translation
+
+
+def _memoizeTranslation(text: str, targetLanguage: str, translation: str):
+    # Failed translations ("NULL") are not memoized so they are retried
+    if not translation or translation.strip() == "NULL":
+        return
+    with _translationMemoLock:
+        _translationMemo[(text, targetLanguage.strip().lower())] = translation
+        while len(_translationMemo) > TRANSLATION_MEMO_SIZE:
+            _translationMemo.popitem(last=False)
+
+
 def translateString(stringToTranslate: str, targetLanguage: str) -> str:
     """
     Translates a given string into the specified target language using an LLM (OpenAI) and a prompt template.
 
+    Translations are memoized per (text, language).
+
     Args:
         stringToTranslate (str): The text string to be translated.
         targetLanguage (str): The language to translate the string into.
@@ -22,11 +70,12 @@ def translateString(stringToTranslate: str, targetLanguage: str) -> str:
     Returns:
         str: The translated string, or an empty string if translation fails.
     """
-    # Initialize the OpenAI client
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY environment variable is not set")
-    llmClient = OpenAI(api_key=api_key)
+    memoized = _getMemoizedTranslation(stringToTranslate, targetLanguage)
+    if memoized is not None:
+        return memoized
+
+    llmClient = getLlmClient("translate")
+    translateModel = providers.model_for("translate")
 
     # Load the translation prompt template from file
     with open("prompts/translateString.txt", "r", encoding="utf-8") as file:
@@ -42,80 +91,256 @@ def translateString(stringToTranslate: str, targetLanguage: str) -> str:
     )
 
     # Call the OpenAI API to get the translation
-    response = llmClient.chat.completions.create(
-        model="gpt-4o-mini-2024-07-18",
-        messages=[{"role": "user", "content": prompt}],
-        max_tokens=500,
-        temperature=0.7
-    )
+    with metrics.observe_call("translateString", translateModel) as call:
+        response = llmClient.chat.completions.create(
+            model=translateModel,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=500,
+            temperature=0.7,
+            timeout=latency.timeout_for("translateString", translateModel)
+        )
+        call.record_usage(response)
     
     # Extract the translated text from the response
-    return response.choices[0].message.content
+    translation = response.choices[0].message.content
+    _memoizeTranslation(stringToTranslate, targetLanguage, translation)
+    return translation
 
 
-def getBrandDescription(clientOpenai, brandName: str, brandWebsite: str, brandCountry: str = "world") -> str:
+def _translateBatch(items: list[dict], targetLanguage: str) -> dict:
     """
-    Retrieves the company description using OpenAI's responses API and the brandDescription prompt template.
-
-    Args:
-        clientOpenai: An initialized OpenAI client instance.
-        brandName (str): The name of the brand/company.
-        brandWebsite (str): The website of the brand/company.
-        brandCountry (str, optional): The country of the brand/company. Defaults to "world".
+    Translates one batch of {"id", "text"} items in a single structured-output request.
 
     Returns:
-        str: The company description, translated if necessary.
+        dict: Item id -> translated text, for the items the model translated.
     """
-    # Load the brand description prompt template from file
-    with open("prompts/brandDescription.txt", "r", encoding="utf-8") as file:
+    with open("prompts/translateStrings.txt", "r", encoding="utf-8") as file:
         promptTemplate = file.read()
 
-    # Format the prompt with the provided brand information
     prompt = PromptTemplate(
-        input_variables=["companyName", "companyWebsite", "companyCountry"],
+        input_variables=["itemsJson", "targetLanguage"],
         template=promptTemplate
     ).format(
-        companyName=brandName,
-        companyWebsite=brandWebsite,
-        companyCountry=brandCountry
+        itemsJson=json.dumps(items, ensure_ascii=False),
+        targetLanguage=targetLanguage
     )
 
-    # Determine the target language for the description
-    targetLanguage = countryLanguages.get(brandCountry.lower(), 'english').lower()
-
-    # If the target language is not English, translate the prompt
-    if targetLanguage != 'english':
-        translatedPrompt = translateString(prompt, targetLanguage)
+    # Translations run somewhat longer than their source in most languages; leave room for the JSON wrapper
+    inputTokens = sum(cost_planner.count_tokens(item["text"]) for item in items)
+    maxTokens = min(16000, inputTokens * 2 + 20 * len(items) + 100)
 
-        if 'NULL' not in translatedPrompt:
-            prompt = translatedPrompt
-    
-    # Call the OpenAI API to get the company description with structured output
-    try:
-        response = clientOpenai.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",
+    translateModel = providers.model_for("translate")
+    with metrics.observe_call("translateStrings", translateModel, items=len(items)) as call:
+        response = getLlmClient("translate").chat.completions.create(
+            model=translateModel,
             messages=[{"role": "user", "content": prompt}],
-            max_tokens=500,
-            temperature=0.7,
-            timeout=30,
+            max_tokens=maxTokens,
+            temperature=0.3,
+            timeout=latency.timeout_for("translateStrings", translateModel),
             response_format={
                 "type": "json_schema",
                 "json_schema": {
-                    "name": "brand_description",
+                    "name": "string_translations",
                     "schema": {
                         "type": "object",
                         "properties": {
-                            "description": {
-                                "type": "string",
-                                "description": "A 2-4 sentence business description of the company"
+                            "translations": {
+                                "type": "array",
+                                "items": {
+                                    "type": "object",
+                                    "properties": {
+                                        "id": {"type": "string"},
+                                        "text": {"type": "string"}
+                                    },
+                                    "required": ["id", "text"],
+                                    "additionalProperties": False
+                                }
                             }
                         },
-                        "required": ["description"],
+                        "required": ["translations"],
                         "additionalProperties": False
                     }
                 }
             }
         )
+        call.record_usage(response)
+
+    parsed = json.loads(response.choices[0].message.content)
+    return {
+        str(translation.get("id")): translation.get("text", "")
+        for translation in parsed.get("translations", [])
+        if isinstance(translation, dict)
+    }
+
+
+def translateStrings(stringsToTranslate: list[str], targetLanguage: str, maxBatchTokens: int = None) -> list[str]:
+    """
+    Translates many strings into the target language with as few LLM calls as possible.
+
+    Strings are memoized per (text, language) and deduplicated, then packed into
+    structured-output requests of at most maxBatchTokens input tokens each; every
+    item carries a stable ID so translations map back to their inputs. Batches
+    run concurrently. Items a batch fails to return (or returns as NULL) are
+    retried one by one with translateString.
+
+    Args:
+        stringsToTranslate (list[str]): The strings to translate.
+        targetLanguage (str): The language to translate the strings into.
+        maxBatchTokens (int, optional): Input token budget per request. Defaults to TRANSLATION_BATCH_TOKENS.
+
+    Returns:
+        list[str]: Translations in input order; "NULL" for strings that could not be translated.
+    """
+    if maxBatchTokens is None:
+        maxBatchTokens = TRANSLATION_BATCH_TOKENS
+
+    translations = {}
+    pending = []
+    for text in dict.fromkeys(stringsToTranslate):
+        if not text or not text.strip():
+            translations[text] = text
+            continue
+        memoized = _getMemoizedTranslation(text, targetLanguage)
+        if memoized is not None:
+            translations[text] = memoized
+        else:
+            pending.append(text)
+
+    # Pack pending strings into batches by input token size
+    batches = []
+    batch, batchTokens = [], 0
+    for index, text in enumerate(pending):
+        tokens = cost_planner.count_tokens(text)
+        if batch and batchTokens + tokens > maxBatchTokens:
+            batches.append(batch)
+            batch, batchTokens = [], 0
+        batch.append({"id": str(index), "text": text})
+        batchTokens += tokens
+    if batch:
+        batches.append(batch)
+
+    failed = []
+    if batches:
+        with ThreadPoolExecutor(max_workers=max(1, min(TRANSLATION_WORKERS, len(batches)))) as executor:
+            futures = {executor.submit(tracing.propagate(_translateBatch), batch, targetLanguage): batch for batch in batches}
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    batchTranslations = future.result()
+                except Exception as e:
+                    print(f"Batch translation of {len(batch)} strings failed: {e}")
+                    batchTranslations = {}
+                for item in batch:
+                    translation = batchTranslations.get(item["id"])
+                    if translation and translation.strip() and translation.strip() != "NULL":
+                        translations[item["text"]] = translation
+                        _memoizeTranslation(item["text"], targetLanguage, translation)
+                    else:
+                        failed.append(item["text"])
+
+    # Fall back to one request per string for the items the batch could not translate
+    for text in failed:
+        try:
+            translations[text] = translateString(text, targetLanguage)
+        except Exception as e:
+            print(f"Translation of a single string failed: {e}")
+            translations[text] = "NULL"
+
+    return [translations[text] for text in stringsToTranslate]
+
+
+PROMPT_CONTEXT_MARKER = "# CONTEXT & DATA"
+
+
+def buildProfileMessages(promptPath: str, targetLanguage: str = 'english', **values) -> list[dict]:
+    """
+    Builds the chat messages for a brand profiling prompt as a stable prefix followed by a variable suffix.
+
+    Profiling templates keep every placeholder under a final "# CONTEXT & DATA"
+    section. Everything before it is identical for every brand, so it is sent
+    as the system message, where the provider can serve it from its prompt
+    cache; translations of it are memoized per language, so they stay stable
+    too. The formatted context follows as the user message.
+
+    Args:
+        promptPath (str): Path of the prompt template.
+        targetLanguage (str, optional): Language to translate the instructions to. Defaults to 'english'.
+        **values: Values for the placeholders of the context section.
+
+    Returns:
+        list[dict]: The system and user messages.
+    """
+    with open(promptPath, "r", encoding="utf-8") as file:
+        promptTemplate = file.read()
+    instructions, context = promptTemplate.split(PROMPT_CONTEXT_MARKER, 1)
+    instructions = instructions.strip()
+
+    # Translate the instructions if the target language is not English and translation is successful
+    if targetLanguage != 'english':
+        translatedInstructions = translateString(instructions, targetLanguage)
+
+        if 'NULL' not in translatedInstructions:
+            instructions = translatedInstructions
+
+    context = PromptTemplate(
+        input_variables=list(values),
+        template=PROMPT_CONTEXT_MARKER + context
+    ).format(**values)
+    return [{"role": "system", "content": instructions}, {"role": "user", "content": context.strip()}]
+
+
+def getBrandDescription(clientOpenai, brandName: str, brandWebsite: str, brandCountry: str = "world") -> str:
+    """
+    Retrieves the company description using OpenAI's responses API and the brandDescription prompt template.
+
+    Args:
+        clientOpenai: An initialized OpenAI client instance.
+        brandName (str): The name of the brand/company.
+        brandWebsite (str): The website of the brand/company.
+        brandCountry (str, optional): The country of the brand/company. Defaults to "world".
+
+    Returns:
+        str: The company description, translated if necessary.
+    """
+    # Determine the target language for the description
+    targetLanguage = countryLanguages.get(brandCountry.lower(), 'english').lower()
+
+    messages = buildProfileMessages(
+        "prompts/brandDescription.txt", targetLanguage,
+        companyName=brandName,
+        companyWebsite=brandWebsite,
+        companyCountry=brandCountry
+    )
+
+    # Call the OpenAI API to get the company description with structured output
+    try:
+        profileModel = providers.model_for("profile")
+        with metrics.observe_call("getBrandDescription", profileModel) as call:
+            response = clientOpenai.chat.completions.create(
+                model=profileModel,
+                messages=messages,
+                max_tokens=500,
+                temperature=0.7,
+                timeout=latency.timeout_for("getBrandDescription", profileModel, 30),
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {
+                        "name": "brand_description",
+                        "schema": {
+                            "type": "object",
+                            "properties": {
+                                "description": {
+                                    "type": "string",
+                                    "description": "A 2-4 sentence business description of the company"
+                                }
+                            },
+                            "required": ["description"],
+                            "additionalProperties": False
+                        }
+                    }
+                }
+            )
+            call.record_usage(response)
         # Extract the description from the structured response
         result = response.choices[0].message.content
         try:
@@ -126,7 +351,7 @@ def getBrandDescription(clientOpenai, brandName: str, brandWebsite: str, brandCo
             else:
                 # Provide a fallback description
                 fallback_description = f"{brandName} is a business operating in {brandCountry} with their website at {brandWebsite}. The company provides digital services and solutions to their customers in the local market."
-                return fallback_description
+                return profile_store.FallbackText(fallback_description)
         except json.JSONDecodeError:
             # If structured response fails, try to use the raw content
             if result and result.strip() and result.strip().upper() != "NULL":
@@ -134,7 +359,7 @@ def getBrandDescription(clientOpenai, brandName: str, brandWebsite: str, brandCo
             else:
                 # Provide a fallback description
                 fallback_description = f"{brandName} is a business operating in {brandCountry} with their website at {brandWebsite}. The company provides digital services and solutions to their customers in the local market."
-                return fallback_description
+                return profile_store.FallbackText(fallback_description)
     except Exception as e:
         print(f"Error in getBrandDescription: {e}")
         raise Exception(f"Failed to get brand description: {str(e)}")
@@ -154,40 +379,29 @@ def getBrandIndustry(clientOpenai, brandName: str, brandWebsite: str, brandDescr
     Returns:
         str: The company industry as determined by the LLM, translated if necessary.
     """
-    # Load the brand industry prompt template from file
-    with open("prompts/brandIndustry.txt", "r", encoding="utf-8") as file:
-        promptTemplate = file.read()
+    # Get the target language for the brand's country, defaulting to English
+    targetLanguage = countryLanguages.get(brandCountry.lower(), 'english').lower()
 
-    # Format the prompt with the provided brand information
-    prompt = PromptTemplate(
-        input_variables=["companyName", "companyWebsite", "companyCountry", "companyDescription"],
-        template=promptTemplate
-    ).format(
+    messages = buildProfileMessages(
+        "prompts/brandIndustry.txt", targetLanguage,
         companyName=brandName,
         companyWebsite=brandWebsite,
         companyCountry=brandCountry,
         companyDescription=brandDescription
     )
 
-    # Get the target language for the brand's country, defaulting to English
-    targetLanguage = countryLanguages.get(brandCountry.lower(), 'english').lower()
-
-    # Translate the prompt if the target language is not English and translation is successful
-    if targetLanguage != 'english':
-        translatedPrompt = translateString(prompt, targetLanguage)
-
-        if 'NULL' not in translatedPrompt:
-            prompt = translatedPrompt
-
     # Call the OpenAI API to get the company industry
     try:
-        response = clientOpenai.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=500,
-            temperature=0.7,
-            timeout=30
-        )
+        profileModel = providers.model_for("profile")
+        with metrics.observe_call("getBrandIndustry", profileModel) as call:
+            response = clientOpenai.chat.completions.create(
+                model=profileModel,
+                messages=messages,
+                max_tokens=500,
+                temperature=0.7,
+                timeout=latency.timeout_for("getBrandIndustry", profileModel, 30)
+            )
+            call.record_usage(response)
         # Extract the industry from the response
         result = response.choices[0].message.content
         if not result or result.strip() == "":
@@ -213,15 +427,11 @@ def getBrandCompetitors(clientOpenai, brandName: str, brandWebsite: str, brandDe
     Returns:
         dict: A dictionary containing the competitors, parsed from the JSON response.
     """
-    # Load the brand competitors prompt template from file
-    with open("prompts/brandCompetitors.txt", "r", encoding="utf-8") as file:
-        promptTemplate = file.read()
+    # Get the target language for the brand's country, defaulting to English
+    targetLanguage = countryLanguages.get(brandCountry.lower(), 'english').lower()
 
-    # Format the prompt with the provided brand information
-    prompt = PromptTemplate(
-        input_variables=["companyName", "companyWebsite", "companyCountry", "companyDescription", "companyIndustry"],
-        template=promptTemplate
-    ).format(
+    messages = buildProfileMessages(
+        "prompts/brandCompetitors.txt", targetLanguage,
         companyName=brandName,
         companyWebsite=brandWebsite,
         companyCountry=brandCountry,
@@ -229,68 +439,61 @@ def getBrandCompetitors(clientOpenai, brandName: str, brandWebsite: str, brandDe
         companyIndustry=brandIndustry
     )
 
-    # Get the target language for the brand's country, defaulting to English
-    targetLanguage = countryLanguages.get(brandCountry.lower(), 'english').lower()
-
-    # Translate the prompt if the target language is not English and translation is successful
-    if targetLanguage != 'english':
-        translatedPrompt = translateString(prompt, targetLanguage)
-
-        if 'NULL' not in translatedPrompt:
-            prompt = translatedPrompt
-
     # Call the OpenAI API to get the competitors with structured output
     try:
-        response = clientOpenai.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=1000,
-            temperature=0.7,
-            timeout=30,
-            response_format={
-                "type": "json_schema",
-                "json_schema": {
-                    "name": "competitor_analysis",
-                    "schema": {
-                        "type": "object",
-                        "properties": {
-                            "competitors": {
-                                "type": "array",
-                                "items": {
-                                    "type": "object",
-                                    "properties": {
-                                        "name": {
-                                            "type": "string",
-                                            "description": "The competitor's company name"
-                                        },
-                                        "website": {
-                                            "type": "string",
-                                            "description": "The competitor's website URL"
+        profileModel = providers.model_for("profile")
+        with metrics.observe_call("getBrandCompetitors", profileModel) as call:
+            response = clientOpenai.chat.completions.create(
+                model=profileModel,
+                messages=messages,
+                max_tokens=1000,
+                temperature=0.7,
+                timeout=latency.timeout_for("getBrandCompetitors", profileModel, 30),
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {
+                        "name": "competitor_analysis",
+                        "schema": {
+                            "type": "object",
+                            "properties": {
+                                "competitors": {
+                                    "type": "array",
+                                    "items": {
+                                        "type": "object",
+                                        "properties": {
+                                            "name": {
+                                                "type": "string",
+                                                "description": "The competitor's company name"
+                                            },
+                                            "website": {
+                                                "type": "string",
+                                                "description": "The competitor's website URL"
+                                            },
+                                            "reason": {
+                                                "type": "string",
+                                                "description": "Brief explanation of why they compete"
+                                            }
                                         },
-                                        "reason": {
-                                            "type": "string",
-                                            "description": "Brief explanation of why they compete"
-                                        }
+                                        "required": ["name", "website", "reason"],
+                                        "additionalProperties": False
                                     },
-                                    "required": ["name", "website", "reason"],
-                                    "additionalProperties": False
-                                },
-                                "minItems": 3,
-                                "maxItems": 5
-                            }
-                        },
-                        "required": ["competitors"],
-                        "additionalProperties": False
+                                    "minItems": 3,
+                                    "maxItems": 5
+                                }
+                            },
+                            "required": ["competitors"],
+                            "additionalProperties": False
+                        }
                     }
                 }
-            }
-        )
+            )
+            call.record_usage(response)
         # Extract the competitors from the structured response
         rawJson = response.choices[0].message.content
         
         if not rawJson or not rawJson.strip():
             print("Warning: Empty response from OpenAI API for competitors")
-            return {"competitors": []}
+            return profile_store.FallbackProfile(competitors=[])
 
         # Parse the structured JSON response
         try:
@@ -300,12 +503,12 @@ def getBrandCompetitors(clientOpenai, brandName: str, brandWebsite: str, brandDe
             print(f"JSON decode error with structured output: {json_error}")
             print(f"Raw response: {rawJson}")
             # Return a fallback structure if parsing fails
-            return {"competitors": []}
+            return profile_store.FallbackProfile(competitors=[])
             
     except Exception as e:
         print(f"Error in getBrandCompetitors: {e}")
         # Return a fallback structure instead of raising an exception
-        return {"competitors": []}
+        return profile_store.FallbackProfile(competitors=[])
 
 
 def getBrandName(clientOpenai, brandDescription: str) -> str:
@@ -319,44 +522,37 @@ def getBrandName(clientOpenai, brandDescription: str) -> str:
     Returns:
         str: The company name as determined by the LLM.
     """
-    # Load the brand name prompt template from file
-    with open("prompts/brandName.txt", "r", encoding="utf-8") as file:
-        promptTemplate = file.read()
-
-    # Format the prompt with the provided brand description
-    prompt = PromptTemplate(
-        input_variables=["companyDescription"],
-        template=promptTemplate
-    ).format(
-        companyDescription=brandDescription
-    )
+    messages = buildProfileMessages("prompts/brandName.txt", companyDescription=brandDescription)
 
     # Call the OpenAI API to get the company name with structured output
     try:
-        response = clientOpenai.chat.completions.create(
-            model="gpt-4o-mini-2024-07-18",
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=500,
-            temperature=0.7,
-            timeout=30,
-            response_format={
-                "type": "json_schema",
-                "json_schema": {
-                    "name": "brand_name",
-                    "schema": {
-                        "type": "object",
-                        "properties": {
-                            "name": {
-                                "type": "string",
-                                "description": "The extracted or identified company name"
-                            }
-                        },
-                        "required": ["name"],
-                        "additionalProperties": False
+        profileModel = providers.model_for("profile")
+        with metrics.observe_call("getBrandName", profileModel) as call:
+            response = clientOpenai.chat.completions.create(
+                model=profileModel,
+                messages=messages,
+                max_tokens=500,
+                temperature=0.7,
+                timeout=latency.timeout_for("getBrandName", profileModel, 30),
+                response_format={
+                    "type": "json_schema",
+                    "json_schema": {
+                        "name": "brand_name",
+                        "schema": {
+                            "type": "object",
+                            "properties": {
+                                "name": {
+                                    "type": "string",
+                                    "description": "The extracted or identified company name"
+                                }
+                            },
+                            "required": ["name"],
+                            "additionalProperties": False
+                        }
                     }
                 }
-            }
-        )
+            )
+            call.record_usage(response)
         # Extract the name from the structured response
         result = response.choices[0].message.content
         try:
@@ -369,9 +565,9 @@ def getBrandName(clientOpenai, brandDescription: str) -> str:
                 words = brandDescription.split()
                 for word in words:
                     if word[0].isupper() and len(word) > 2 and not word.lower() in ['the', 'and', 'for', 'with', 'this', 'that']:
-                        return word
+                        return profile_store.FallbackText(word)
                 # If no suitable name found, return a generic business name
-                return "Business Entity"
+                return profile_store.FallbackText("Business Entity")
         except json.JSONDecodeError:
             # If structured response fails, try to use the raw content
             if result and result.strip() and result.strip().upper() != "NULL":
@@ -381,40 +577,230 @@ def getBrandName(clientOpenai, brandDescription: str) -> str:
                 words = brandDescription.split()
                 for word in words:
                     if word[0].isupper() and len(word) > 2 and not word.lower() in ['the', 'and', 'for', 'with', 'this', 'that']:
-                        return word
+                        return profile_store.FallbackText(word)
                 # If no suitable name found, return a generic business name
-                return "Business Entity"
+                return profile_store.FallbackText("Business Entity")
     except Exception as e:
         print(f"Error in getBrandName: {e}")
         raise Exception(f"Failed to get brand name: {str(e)}")
 
 
-def getCompanyInfo(brandName: str, brandWebsite: str, brandCountry: str = "world") -> dict:
+def normalizeDomain(brandWebsite: str) -> str:
+    """
+    Normalizes a brand website to its bare domain, so "https://www.Acme.com/" and "acme.com" compare equal.
+
+    Args:
+        brandWebsite (str): The website as entered by the user.
+
+    Returns:
+        str: The lower-cased host without scheme, "www.", port, path or trailing dot.
+    """
+    domain = (brandWebsite or "").strip().lower()
+    if "://" in domain:
+        domain = domain.split("://", 1)[1]
+    domain = domain.split("/", 1)[0].split("?", 1)[0].split("#", 1)[0]
+    domain = domain.rsplit("@", 1)[-1].split(":", 1)[0].rstrip(".")
+    if domain.startswith("www."):
+        domain = domain[len("www."):]
+    return domain
+
+
+def iterCompanyInfo(brandName: str, brandWebsite: str, brandCountry: str = "world", refresh=None):
+    """
+    Builds a brand profile stage by stage, reusing fields stored for the same domain and country.
+
+    Profiles are keyed by the normalized brandWebsite domain plus country (see
+    libs/profile_store.py). Stored fields within the TTL are returned without
+    any LLM call; missing, expired or refreshed fields are regenerated and stored.
+    Fallback values returned when generation fails, and fields derived from
+    them, are not stored, so they are generated again on the next request.
+
+    Args:
+        brandName (str): The name of the brand/company.
+        brandWebsite (str): The website of the brand/company.
+        brandCountry (str, optional): The country of the brand/company. Defaults to "world".
+        refresh (bool or list, optional): True regenerates the whole profile; a list of fields
+            (e.g. ["competitors"]) regenerates those fields and the fields derived from them.
+
+    Yields:
+        dict: {"stage", "state": "started"} before a field is generated and
+              {"stage", "state": "done", "value", "cached"} once it is available.
+    """
+    domain = normalizeDomain(brandWebsite)
+    # Refreshed fields are regenerated but their stored rows are only replaced by a successful result,
+    # so a failed refresh leaves the stored profile intact
+    refreshed = set(profile_store.PROFILE_FIELDS if refresh is True else profile_store.dependent_fields(list(refresh or [])))
+    stored = {field: value for field, value in profile_store.get_profile(domain, brandCountry).items() if field not in refreshed}
+
+    clientOpenai = None
+    profile = {}
+    for stage in profile_store.PROFILE_FIELDS:
+        cached = stage in stored
+        metrics.record_cache("brand_profile", cached)
+        if cached:
+            profile[stage] = stored[stage]["value"]
+            yield {"stage": stage, "state": "done", "value": profile[stage], "cached": True}
+            continue
+
+        yield {"stage": stage, "state": "started"}
+        if clientOpenai is None:
+            clientOpenai = getLlmClient("profile")
+
+        if stage == "description":
+            profile[stage] = getBrandDescription(clientOpenai, brandName, brandWebsite, brandCountry)
+        elif stage == "industry":
+            profile[stage] = getBrandIndustry(clientOpenai, brandName, brandWebsite, profile["description"], brandCountry)
+        elif stage == "competitors":
+            profile[stage] = getBrandCompetitors(clientOpenai, brandName, brandWebsite, profile["description"], profile["industry"], brandCountry)
+        elif stage == "name":
+            profile[stage] = getBrandName(clientOpenai, profile["description"])
+
+        if not any(profile_store.is_fallback(profile[source]) for source in profile_store.PROFILE_FIELDS[stage]):
+            profile_store.save_field(domain, brandCountry, stage, profile[stage])
+        yield {"stage": stage, "state": "done", "value": profile[stage], "cached": False}
+
+
+def getCompanyInfo(brandName: str, brandWebsite: str, brandCountry: str = "world", refresh=None) -> dict:
     """
     Retrieves the company description and industry using OpenAI's responses API and prompt templates.
 
+    Stored profiles for the same domain and country are reused (see iterCompanyInfo).
+
     Args:
         brandName (str): The name of the brand/company.
         brandWebsite (str): The website of the brand/company.
         brandCountry (str, optional): The country of the brand/company. Defaults to "world".
+        refresh (bool or list, optional): Fields to regenerate instead of reading from the store.
 
     Returns:
-        dict: A dictionary with keys 'description' and 'industry'.
-    """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise ValueError("OPENAI_API_KEY environment variable is not set")
-    clientOpenai = OpenAI(api_key=api_key)
-    brandDescription = getBrandDescription(clientOpenai, brandName, brandWebsite, brandCountry)
-    brandIndustry = getBrandIndustry(clientOpenai, brandName, brandWebsite, brandDescription, brandCountry)
-    brandCompetitors = getBrandCompetitors(clientOpenai, brandName, brandWebsite, brandDescription, brandIndustry, brandCountry)
-    brandName = getBrandName(clientOpenai, brandDescription)
-    
+        dict: A dictionary with keys 'description', 'industry', 'competitors' and 'name'.
+    """
+    profile = {}
+    for event in iterCompanyInfo(brandName, brandWebsite, brandCountry, refresh):
+        if event["state"] == "done":
+            profile[event["stage"]] = event["value"]
+
+    return {
+        "description": profile["description"],
+        "industry": profile["industry"],
+        "competitors": profile["competitors"],
+        "name": profile["name"]
+    }
+
+
+def getStoredProfileField(domain: str, brandCountry: str, field: str, refresh=None):
+    """
+    Returns a stored brand profile field, or None when it is missing, expired or being refreshed.
+
+    A refreshed field is not deleted: its stored value is only replaced once it is regenerated successfully.
+    """
+    if refresh is True or (refresh and field in refresh):
+        stored = {}
+    else:
+        stored = profile_store.get_profile(domain, brandCountry)
+    metrics.record_cache("brand_profile", field in stored)
+    return stored[field]["value"] if field in stored else None
+
+
+def getOrComputeProfileField(domain: str, brandCountry: str, field: str, compute, refresh=None, store: bool = True):
+    """
+    Returns a brand profile field from the profile store, computing and storing it when missing or refreshed.
+
+    store=False computes without storing, for fields derived from a fallback value.
+    """
+    value = getStoredProfileField(domain, brandCountry, field, refresh)
+    if value is None:
+        value = compute()
+        if store:
+            profile_store.save_field(domain, brandCountry, field, value)
+    return value
+
+
+def getMultiMarketCompanyInfo(brandName: str, brandWebsite: str, brandCountries: list[str], refresh=None) -> dict:
+    """
+    Profiles one brand across several markets, computing the language-independent stages once.
+
+    The English description, industry and brand name are generated once (stored
+    under the "world" market). Per-market work then runs in parallel: the
+    description is localized with one batched translation per distinct language
+    (markets sharing a language share it), and local competitors are generated
+    for each country. Every field goes through the profile store, so markets
+    profiled before are served without LLM calls.
+
+    Args:
+        brandName (str): The name of the brand/company.
+        brandWebsite (str): The website of the brand/company.
+        brandCountries (list[str]): The markets to profile.
+        refresh (bool or list, optional): True regenerates everything; a list of fields regenerates those fields.
+
+    Returns:
+        dict: Shared 'description', 'industry' and 'name', plus 'markets' mapping each country to its
+              'language', localized 'description' and local 'competitors'.
+    """
+    domain = normalizeDomain(brandWebsite)
+    clientOpenai = getLlmClient("profile")
+    if refresh and refresh is not True:
+        refresh = profile_store.dependent_fields(list(refresh))
+
+    # Language-independent stages, computed once for every market
+    description = getOrComputeProfileField(
+        domain, "world", "description",
+        lambda: getBrandDescription(clientOpenai, brandName, brandWebsite, "world"), refresh
+    )
+    # Every other field derives from the description; none is stored when it is only a fallback
+    store = not profile_store.is_fallback(description)
+    industry = getOrComputeProfileField(
+        domain, "world", "industry",
+        lambda: getBrandIndustry(clientOpenai, brandName, brandWebsite, description, "world"), refresh, store
+    )
+    name = getOrComputeProfileField(
+        domain, "world", "name",
+        lambda: getBrandName(clientOpenai, description), refresh, store
+    )
+
+    markets = list(dict.fromkeys(country.strip() for country in brandCountries if country and country.strip()))
+    languages = {country: countryLanguages.get(country.lower(), 'english') for country in markets}
+
+    def localizeDescription(language: str) -> str:
+        if language.lower() == 'english':
+            return description
+        translation = translateStrings([description], language)[0]
+        if not translation or translation.strip() == "NULL":
+            # Serve the English description this time, but translate again on the next request
+            return profile_store.FallbackText(description)
+        return translation
+
+    def localCompetitors(country: str):
+        return getOrComputeProfileField(
+            domain, country, "competitors",
+            lambda: getBrandCompetitors(clientOpenai, brandName, brandWebsite, description, industry, country), refresh, store
+        )
+
+    # Markets whose localized description is not stored need one translation per distinct language
+    marketDescriptions = {country: getStoredProfileField(domain, country, "description", refresh) for country in markets}
+    missingLanguages = {languages[country] for country, value in marketDescriptions.items() if value is None}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(TRANSLATION_WORKERS * 2, len(markets) + len(missingLanguages)))) as executor:
+        translationFutures = {language: executor.submit(tracing.propagate(localizeDescription), language) for language in missingLanguages}
+        competitorFutures = {country: executor.submit(tracing.propagate(localCompetitors), country) for country in markets}
+
+        profiles = {}
+        for country in markets:
+            if marketDescriptions[country] is None:
+                marketDescriptions[country] = translationFutures[languages[country]].result()
+                if store:
+                    profile_store.save_field(domain, country, "description", marketDescriptions[country])
+            profiles[country] = {
+                "language": languages[country],
+                "description": marketDescriptions[country],
+                "competitors": competitorFutures[country].result()
+            }
+
     return {
-        "description": brandDescription,
-        "industry": brandIndustry,
-        "competitors": brandCompetitors,
-        "name": brandName
+        "description": description,
+        "industry": industry,
+        "name": name,
+        "markets": profiles
     }
 
 
@@ -8,15 +8,30 @@ load_dotenv(override=True)
 # Also try loading from explicit path
 load_dotenv(dotenv_path='.env', override=True)
 
-from flask import Flask, request, jsonify, render_template, Response
-import json
+from flask import Flask, request, jsonify, render_template, Response, g
 import time
+import queue
+import threading
 import libs.utils as utils
 import libs.openai as openaiAnalytics
 import libs.geo_analysis as geo_analysis
 import libs.search_analysis as search_analysis
+import libs.metrics as metrics
+import libs.tracing as tracing
+import libs.cost_planner as cost_planner
+import libs.serialization as serialization
+import libs.query_dedup as query_dedup
+import libs.response_corpus as response_corpus
+import libs.singleflight as singleflight
+import libs.latency as latency
+import libs.profile_store as profile_store
+import libs.aggregation as aggregation
+import libs.serp_snapshots as serp_snapshots
+import libs.response_blobs as response_blobs
+import libs.providers as providers
 
 app = Flask(__name__)
+app.json = serialization.OrjsonProvider(app)
 
 # Print environment variables for debugging
 print("=== Environment Variables ===")
@@ -27,6 +42,89 @@ print(f"Current working directory: {os.getcwd()}")
 print(f"API key length: {len(api_key) if api_key != 'NOT SET' else 0}")
 print("=============================")
 
+@app.before_request
+def start_request_telemetry():
+    g.request_started = time.perf_counter()
+    g.request_span = tracing.start_span(
+        f"{request.method} {request.path}",
+        http_method=request.method,
+        http_route=request.url_rule.rule if request.url_rule else 'unmatched'
+    )
+    g.request_span_token = tracing.activate(g.request_span)
+
+@app.after_request
+def record_request_telemetry(response):
+    started = getattr(g, 'request_started', None)
+    if started is not None:
+        metrics.observe_histogram(
+            "evidentia_http_request_duration_seconds",
+            time.perf_counter() - started,
+            endpoint=request.url_rule.rule if request.url_rule else 'unmatched',
+            method=request.method,
+            status=response.status_code
+        )
+    request_span = getattr(g, 'request_span', None)
+    if request_span is not None:
+        request_span.set_attributes(http_status=response.status_code)
+        if response.is_streamed:
+            # SSE bodies are generated after the view returns; keep the span open until the stream closes
+            response.response = tracing.wrap_stream(response.response, request_span)
+            g.request_span = None
+    return response
+
+@app.teardown_request
+def end_request_telemetry(error=None):
+    token = g.pop('request_span_token', None)
+    if token is not None:
+        tracing.deactivate(token)
+    request_span = g.pop('request_span', None)
+    if request_span is not None:
+        if error is not None:
+            request_span.set_error(error)
+        request_span.end()
+
+def extract_query_strings(queries):
+    # Extract query strings from query objects ({"query"} or generated {"topic", "prompt"}) if needed
+    return [query_dedup.query_text(q) for q in queries]
+
+def run_with_progress(fn, progress_range=(0, 100), **kwargs):
+    """
+    Runs fn(progress_callback=..., **kwargs) on a worker thread, yielding its progress updates as SSE events.
+    
+    Use as `result = yield from run_with_progress(...)` inside an SSE generator; fn's
+    0-100 progress is mapped onto progress_range, and its exceptions are re-raised.
+    """
+    events = queue.Queue()
+    outcome = {}
+    low, high = progress_range
+    
+    def progress_callback(message, step=None, progress=None, **extra):
+        event = {'status': message, 'step': step, **extra}
+        if progress is not None:
+            event['progress'] = low + (high - low) * progress / 100
+        events.put(event)
+    
+    def run():
+        try:
+            outcome['result'] = fn(progress_callback=progress_callback, **kwargs)
+        except Exception as e:
+            outcome['error'] = e
+        finally:
+            events.put(None)
+    
+    threading.Thread(target=tracing.propagate(run), daemon=True).start()
+    while True:
+        event = events.get()
+        if event is None:
+            break
+        yield serialization.sse_event(event)
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['result']
+
+def request_tenant(data):
+    return request.headers.get('X-Tenant-ID') or data.get('tenant') or 'default'
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -38,16 +136,73 @@ def get_brand_info():
         brand_name = data.get('brandName')
         brand_website = data.get('brandWebsite')
         brand_country = data.get('brandCountry', 'world')
+        refresh = data.get('refresh')
         
         if not brand_name or not brand_website:
             return jsonify({'error': 'brandName and brandWebsite are required'}), 400
+        try:
+            profile_store.validate_refresh(refresh)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        brand_information = utils.getCompanyInfo(brand_name, brand_website, brand_country)
+        # Identical concurrent onboardings share one LLM chain
+        key = singleflight.request_key('brand-info', name=brand_name, website=utils.normalizeDomain(brand_website), country=brand_country, refresh=refresh)
+        brand_information = singleflight.do(
+            key, lambda: utils.getCompanyInfo(brand_name, brand_website, brand_country, refresh), 'brand-info'
+        )
         return jsonify(brand_information)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/brand-info-markets', methods=['POST'])
+def get_brand_info_markets():
+    try:
+        data = request.json
+        brand_name = data.get('brandName')
+        brand_website = data.get('brandWebsite')
+        brand_countries = data.get('brandCountries')
+        refresh = data.get('refresh')
+        
+        if not brand_name or not brand_website:
+            return jsonify({'error': 'brandName and brandWebsite are required'}), 400
+        if not isinstance(brand_countries, list) or not brand_countries:
+            return jsonify({'error': 'brandCountries must be a non-empty list'}), 400
+        try:
+            profile_store.validate_refresh(refresh)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        key = singleflight.request_key(
+            'brand-info-markets', name=brand_name, website=utils.normalizeDomain(brand_website),
+            countries=sorted(country.strip().lower() for country in brand_countries), refresh=refresh
+        )
+        brand_information = singleflight.do(
+            key, lambda: utils.getMultiMarketCompanyInfo(brand_name, brand_website, brand_countries, refresh), 'brand-info-markets'
+        )
+        return jsonify(brand_information)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/invalidate-brand-profile', methods=['POST'])
+def invalidate_brand_profile():
+    try:
+        data = request.json
+        brand_website = data.get('brandWebsite')
+        
+        if not brand_website:
+            return jsonify({'error': 'brandWebsite is required'}), 400
+        
+        domain = utils.normalizeDomain(brand_website)
+        fields = profile_store.invalidate(domain, data.get('brandCountry'), data.get('fields'))
+        return jsonify({'domain': domain, 'invalidated': fields})
+    
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/generate-queries', methods=['POST'])
 def generate_queries():
     try:
@@ -61,14 +216,51 @@ def generate_queries():
         if not all([brand_name, brand_description, brand_industry]):
             return jsonify({'error': 'brandName, brandDescription, and brandIndustry are required'}), 400
         
-        queries = openaiAnalytics.getCoherentQueries(
-            brand_name, brand_country, brand_description, brand_industry, total_queries
+        key = singleflight.request_key(
+            'generate-queries', name=brand_name, country=brand_country,
+            description=brand_description, industry=brand_industry, total=total_queries
         )
+        queries = singleflight.do(key, lambda: openaiAnalytics.getCoherentQueries(
+            brand_name, brand_country, brand_description, brand_industry, total_queries
+        ), 'generate-queries')
         return jsonify({'queries': queries})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/translate-queries', methods=['POST'])
+def translate_queries():
+    try:
+        data = request.json
+        queries = data.get('queries', [])
+        target_language = data.get('targetLanguage') or utils.countryLanguages.get(str(data.get('brandCountry', '')).lower())
+        
+        if not queries or not target_language:
+            return jsonify({'error': 'queries and targetLanguage (or a known brandCountry) are required'}), 400
+        
+        # Collect every translatable string (plain queries, or the topic and prompt of generated ones) for one batched pass
+        texts = []
+        for query in queries:
+            if isinstance(query, dict):
+                texts.extend(str(query[field]) for field in ('topic', 'prompt', 'query') if query.get(field))
+            else:
+                texts.append(str(query))
+        translations = dict(zip(texts, utils.translateStrings(texts, target_language)))
+        
+        translated_queries = []
+        for query in queries:
+            if isinstance(query, dict):
+                translated_queries.append({
+                    key: translations.get(str(value), value) if key in ('topic', 'prompt', 'query') and value else value
+                    for key, value in query.items()
+                })
+            else:
+                translated_queries.append(translations[str(query)])
+        return jsonify({'queries': translated_queries, 'targetLanguage': target_language})
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/test-queries', methods=['POST'])
 def test_queries():
     try:
@@ -77,26 +269,138 @@ def test_queries():
         queries = data.get('queries', [])
         competitors = data.get('competitors', [])
         locations = data.get('locations', ['United States'])
+        serp_depth = data.get('serpDepth')
         
         if not brand_name or not queries:
             return jsonify({'error': 'brandName and queries are required'}), 400
+        try:
+            dedup_threshold = query_dedup.parse_threshold(data.get('dedupThreshold'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        # Extract query strings from query objects if needed
-        query_strings = []
-        for q in queries:
-            if isinstance(q, dict):
-                query_strings.append(q.get('query', str(q)))
-            else:
-                query_strings.append(str(q))
+        query_strings = extract_query_strings(queries)
         
         analysis = search_analysis.analyze_brand_presence(
-            brand_name, competitors, query_strings, locations
+            brand_name, competitors, query_strings, locations, dedup_threshold, serp_depth
         )
         return jsonify(analysis)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/stream-serp-analysis', methods=['POST'])
+def stream_serp_analysis():
+    # Get request data outside the generator function
+    data = request.json
+    brand_name = data.get('brandName')
+    queries = data.get('queries', [])
+    competitors = data.get('competitors', [])
+    locations = data.get('locations', ['United States'])
+    try:
+        dedup_threshold = query_dedup.parse_threshold(data.get('dedupThreshold'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    serp_depth = data.get('serpDepth')
+    
+    def generate():
+        try:
+            if not brand_name or not queries:
+                yield serialization.sse_event({'error': 'brandName and queries are required'})
+                return
+            
+            query_strings = extract_query_strings(queries)
+            dedup_report = query_dedup.deduplicate_queries(query_strings, dedup_threshold)
+            query_strings = dedup_report['queries']
+            if dedup_report['removed']:
+                yield serialization.sse_event({'status': f"Merged {dedup_report['removed']} near-duplicate queries", 'step': 'dedup', 'merged': dedup_report['merged']})
+            
+            total = len(query_strings) * len(locations)
+            yield serialization.sse_event({'status': f'Ranking {len(query_strings)} queries across {len(locations)} locations...', 'step': 'init', 'progress': 0, 'total': total})
+            
+            # Each ranking is sent as soon as it is fetched; only the running aggregates are kept
+            aggregator = aggregation.SerpAggregator(locations)
+            done = 0
+            for row in search_analysis.iter_brand_presence(brand_name, competitors, query_strings, locations, serp_depth):
+                done += 1
+                aggregator.add_row(row)
+                position_text = f"#{row['brand_position']}" if row['brand_found'] else 'not found'
+                yield serialization.sse_event({
+                    'status': f"{row['location']}: \"{row['query']}\" {position_text}",
+                    'step': 'serp_result',
+                    'progress': done / total * 100,
+                    'result': row
+                })
+                live = aggregator.live_snapshot(force=done == total)
+                if live:
+                    yield serialization.sse_event({'status': f'Ranked {done}/{total}', 'step': 'live_metrics', 'metrics': live})
+            
+            summary = {
+                'brand_name': brand_name,
+                'total_queries_tested': len(query_strings),
+                'locations_tested': locations,
+                'query_deduplication': {
+                    'removed': dedup_report['removed'],
+                    'threshold': dedup_report['threshold'],
+                    'merged': dedup_report['merged']
+                },
+                **aggregator.snapshot()
+            }
+            yield serialization.sse_event({'status': 'SERP analysis complete!', 'step': 'complete', 'progress': 100, 'result': summary})
+            
+        except Exception as e:
+            print(f"Error in stream_serp_analysis: {e}")
+            import traceback
+            traceback.print_exc()
+            yield serialization.sse_event({'error': str(e)})
+    
+    return Response(generate(), mimetype='text/event-stream')
+
+@app.route('/serp-snapshot', methods=['POST'])
+def serp_snapshot():
+    try:
+        data = request.json
+        query = data.get('query')
+        location = data.get('location', 'United States')
+        
+        if not query:
+            return jsonify({'error': 'query is required'}), 400
+        
+        snapshot = serp_snapshots.get_snapshot(query, location, data.get('date'))
+        if snapshot is None:
+            return jsonify({'error': f'No SERP snapshot of "{query}" in {location} on or before that date'}), 404
+        return jsonify(snapshot)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/serp-movements', methods=['POST'])
+def serp_movements():
+    try:
+        data = request.json
+        since = data.get('since')
+        
+        if not since:
+            return jsonify({'error': 'since is required'}), 400
+        
+        movements = serp_snapshots.get_movements(
+            since,
+            data.get('until'),
+            data.get('query'),
+            data.get('location'),
+            max(1, int(data.get('minChange', 1)))
+        )
+        return jsonify({'movements': movements})
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/serp-snapshot-stats', methods=['GET'])
+def serp_snapshot_stats():
+    try:
+        return jsonify(serp_snapshots.stats())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/get-llm-models', methods=['GET'])
 def get_llm_models():
     try:
@@ -128,40 +432,35 @@ def stream_brand_info():
     brand_name = data.get('brandName')
     brand_website = data.get('brandWebsite')
     brand_country = data.get('brandCountry', 'world')
+    refresh = data.get('refresh')
+    
+    stage_status = {
+        'description': 'Getting brand description...',
+        'industry': 'Analyzing industry...',
+        'competitors': 'Finding competitors...',
+        'name': 'Extracting brand name...'
+    }
     
     def generate():
         try:
             
             if not brand_name or not brand_website:
-                yield f"data: {json.dumps({'error': 'brandName and brandWebsite are required'})}\n\n"
+                yield serialization.sse_event({'error': 'brandName and brandWebsite are required'})
                 return
             
-            yield f"data: {json.dumps({'status': 'Starting brand analysis...', 'step': 'init'})}\n\n"
-            time.sleep(0.1)
-            
-            yield f"data: {json.dumps({'status': 'Getting brand description...', 'step': 'description'})}\n\n"
-            api_key = os.getenv("OPENAI_API_KEY")
-            from openai import OpenAI
-            client_openai = OpenAI(api_key=api_key)
-            brand_description = utils.getBrandDescription(client_openai, brand_name, brand_website, brand_country)
-            
-            yield f"data: {json.dumps({'status': 'Analyzing industry...', 'step': 'industry'})}\n\n"
-            brand_industry = utils.getBrandIndustry(client_openai, brand_name, brand_website, brand_description, brand_country)
-            
-            yield f"data: {json.dumps({'status': 'Finding competitors...', 'step': 'competitors'})}\n\n"
-            brand_competitors = utils.getBrandCompetitors(client_openai, brand_name, brand_website, brand_description, brand_industry, brand_country)
+            yield serialization.sse_event({'status': 'Starting brand analysis...', 'step': 'init'})
             
-            yield f"data: {json.dumps({'status': 'Extracting brand name...', 'step': 'name'})}\n\n"
-            final_brand_name = utils.getBrandName(client_openai, brand_description)
-            
-            result = {
-                "description": brand_description,
-                "industry": brand_industry,
-                "competitors": brand_competitors,
-                "name": final_brand_name
-            }
+            # Stored profile fields are emitted straight away; only missing ones are generated
+            result = {}
+            for event in utils.iterCompanyInfo(brand_name, brand_website, brand_country, refresh):
+                if event['state'] == 'started':
+                    yield serialization.sse_event({'status': stage_status[event['stage']], 'step': event['stage']})
+                else:
+                    result[event['stage']] = event['value']
+                    if event['cached']:
+                        yield serialization.sse_event({'status': f"Using stored brand {event['stage']}", 'step': event['stage'], 'cached': True})
             
-            yield f"data: {json.dumps({'status': 'Analysis complete!', 'step': 'complete', 'result': result})}\n\n"
+            yield serialization.sse_event({'status': 'Analysis complete!', 'step': 'complete', 'result': result})
             
         except Exception as e:
             error_msg = f"Brand analysis error: {str(e)}"
@@ -169,9 +468,18 @@ def stream_brand_info():
             print(f"Error type: {type(e).__name__}")
             import traceback
             traceback.print_exc()
-            yield f"data: {json.dumps({'error': error_msg})}\n\n"
+            yield serialization.sse_event({'error': error_msg})
     
-    return Response(generate(), mimetype='text/event-stream')
+    if not brand_name or not brand_website:
+        return Response(generate(), mimetype='text/event-stream')
+    try:
+        profile_store.validate_refresh(refresh)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Concurrent identical requests subscribe to one computation and receive all of its progress events
+    key = singleflight.request_key('stream-brand-info', name=brand_name, website=utils.normalizeDomain(brand_website), country=brand_country, refresh=refresh)
+    return Response(singleflight.stream(key, generate, 'stream-brand-info'), mimetype='text/event-stream')
 
 @app.route('/stream-generate-queries', methods=['POST'])
 def stream_generate_queries():
@@ -187,23 +495,47 @@ def stream_generate_queries():
         try:
             
             if not all([brand_name, brand_description, brand_industry]):
-                yield f"data: {json.dumps({'error': 'brandName, brandDescription, and brandIndustry are required'})}\n\n"
+                yield serialization.sse_event({'error': 'brandName, brandDescription, and brandIndustry are required'})
                 return
             
-            yield f"data: {json.dumps({'status': 'Preparing query generation...', 'step': 'init'})}\n\n"
+            yield serialization.sse_event({'status': 'Preparing query generation...', 'step': 'init'})
             time.sleep(0.1)
             
-            yield f"data: {json.dumps({'status': f'Generating {total_queries} coherent queries...', 'step': 'generating'})}\n\n"
-            queries = openaiAnalytics.getCoherentQueries(
+            yield serialization.sse_event({'status': f'Generating {total_queries} coherent queries...', 'step': 'generating'})
+            
+            # Emit each shard's queries as soon as that shard is parsed
+            queries = []
+            for shard in openaiAnalytics.iterCoherentQueryShards(
                 brand_name, brand_country, brand_description, brand_industry, total_queries
-            )
+            ):
+                shard_queries = shard['queries']
+                queries.extend(shard_queries)
+                if shard['error']:
+                    status = f"Query shard {shard['shardNumber']}/{shard['shardCount']} failed"
+                else:
+                    status = f"Generated {len(queries)} of {total_queries} queries"
+                yield serialization.sse_event({
+                    'status': status,
+                    'step': 'shard',
+                    'shard': shard['shardNumber'],
+                    'shardCount': shard['shardCount'],
+                    'queries': shard_queries,
+                    'shardError': shard['error']
+                })
             
-            yield f"data: {json.dumps({'status': 'Query generation complete!', 'step': 'complete', 'result': {'queries': queries}})}\n\n"
+            yield serialization.sse_event({'status': 'Query generation complete!', 'step': 'complete', 'result': {'queries': queries}})
             
         except Exception as e:
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield serialization.sse_event({'error': str(e)})
     
-    return Response(generate(), mimetype='text/event-stream')
+    if not all([brand_name, brand_description, brand_industry]):
+        return Response(generate(), mimetype='text/event-stream')
+    
+    key = singleflight.request_key(
+        'stream-generate-queries', name=brand_name, country=brand_country,
+        description=brand_description, industry=brand_industry, total=total_queries
+    )
+    return Response(singleflight.stream(key, generate, 'stream-generate-queries'), mimetype='text/event-stream')
 
 @app.route('/stream-test-queries', methods=['POST'])
 def stream_test_queries():
@@ -213,48 +545,221 @@ def stream_test_queries():
     queries = data.get('queries', [])
     competitors = data.get('competitors', [])
     llm_models = data.get('models', ['gpt-4o-mini-2024-07-18'])
+    tenant = request_tenant(data)
+    try:
+        budget_tokens = cost_planner.parse_budget(data.get('budgetTokens'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    try:
+        dedup_threshold = query_dedup.parse_threshold(data.get('dedupThreshold'))
+        samples_per_query = geo_analysis.parse_samples(data.get('samplesPerQuery'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    budget_policy = data.get('budgetPolicy', 'refuse')
+    sampling_options = data.get('sampling')
     
     def generate():
+        decision = None
+        analysis_started = False
+        run_tokens = {"tokens": 0}
+        
+        def metered(fn):
+            # The tokens the run actually used replace its worst-case reservation when it ends, even if it fails
+            def run(**kwargs):
+                try:
+                    return metrics.counting_tokens(fn, run_tokens)(**kwargs)
+                finally:
+                    cost_planner.settle_run(decision, run_tokens["tokens"])
+            return run
+        
         try:
             if not brand_name or not queries:
-                yield f"data: {json.dumps({'error': 'brandName and queries are required'})}\n\n"
+                yield serialization.sse_event({'error': 'brandName and queries are required'})
                 return
             
-            # Extract query strings from query objects if needed
-            query_strings = []
-            for q in queries:
-                if isinstance(q, dict):
-                    query_strings.append(q.get('query', str(q)))
+            query_strings = extract_query_strings(queries)
+            
+            # Merge paraphrased queries so they are neither paid for nor tested twice
+            dedup_report = query_dedup.deduplicate_queries(query_strings, dedup_threshold)
+            query_strings = dedup_report['queries']
+            if dedup_report['removed']:
+                yield serialization.sse_event({'status': f"Merged {dedup_report['removed']} near-duplicate queries", 'step': 'dedup', 'merged': dedup_report['merged']})
+            
+            # Refuse or downsize the run before any tokens are spent
+            estimate = cost_planner.estimate_geo_run(brand_name, competitors, query_strings, llm_models, 1 if sampling_options else samples_per_query)
+            decision = cost_planner.admit_run(estimate, tenant, budget_tokens, budget_policy)
+            if not decision['allowed']:
+                yield serialization.sse_event({'error': decision['reason'], 'step': 'budget_exceeded', 'estimate': estimate['total'], 'budget': decision})
+                return
+            max_queries = sampling_options.get('maxQueries') if sampling_options else None
+            if decision['downsized']:
+                if sampling_options:
+                    # Cap the sampling budget instead of truncating, so the sample stays random
+                    allowed = decision['queries_allowed'] * len(llm_models)
+                    max_queries = min(max_queries, allowed) if max_queries else allowed
                 else:
-                    query_strings.append(str(q))
+                    query_strings = query_strings[:decision['queries_allowed']]
+                yield serialization.sse_event({'status': decision['reason'], 'step': 'budget_downsized', 'budget': decision})
             
-            yield f"data: {json.dumps({'status': f'Starting GEO analysis for {len(query_strings)} queries across {len(llm_models)} LLM models...', 'step': 'init', 'progress': 0})}\n\n"
+            yield serialization.sse_event({'status': f'Starting GEO analysis for {len(query_strings)} queries across {len(llm_models)} LLM models...', 'step': 'init', 'progress': 0})
             
-            # Use the regular (non-streaming) geo_analysis function for now
-            analysis_results = geo_analysis.analyze_llm_brand_positioning(
-                brand_name=brand_name,
-                competitors=competitors,
-                queries=query_strings,
-                llm_models=llm_models
-            )
+            # Analyses run on a worker thread so live metrics snapshots stream while they progress
+            analysis_started = True
+            if sampling_options:
+                # Sampling mode: stop each model once its mention rate interval is narrow enough
+                analysis_results = yield from run_with_progress(
+                    metered(geo_analysis.analyze_llm_brand_positioning_adaptive), (0, 85),
+                    brand_name=brand_name,
+                    competitors=competitors,
+                    queries=query_strings,
+                    llm_models=llm_models,
+                    target_margin=sampling_options.get('targetMargin'),
+                    confidence=sampling_options.get('confidence'),
+                    max_queries=max_queries,
+                    min_queries=sampling_options.get('minQueries'),
+                    method=sampling_options.get('method', 'wilson'),
+                    include_sentiment=sampling_options.get('includeSentiment', False),
+                    seed=sampling_options.get('seed'),
+                    # Deduplicated above; a second pass over the shorter list would merge more, unreported
+                    dedup_threshold=query_dedup.DISABLED
+                )
+            else:
+                analysis_results = yield from run_with_progress(
+                    metered(geo_analysis.analyze_llm_brand_positioning), (0, 85),
+                    brand_name=brand_name,
+                    competitors=competitors,
+                    queries=query_strings,
+                    llm_models=llm_models,
+                    dedup_threshold=query_dedup.DISABLED,
+                    samples_per_query=samples_per_query
+                )
+            analysis_results["query_deduplication"] = {
+                "removed": dedup_report["removed"],
+                "threshold": dedup_report["threshold"],
+                "merged": dedup_report["merged"]
+            }
             
-            yield f"data: {json.dumps({'status': 'GEO analysis computation complete!', 'step': 'analysis_complete', 'progress': 85})}\n\n"
+            yield serialization.sse_event({'status': 'GEO analysis computation complete!', 'step': 'analysis_complete', 'progress': 85})
             
             # Generate optimization suggestions
-            yield f"data: {json.dumps({'status': 'Generating optimization suggestions...', 'step': 'suggestions', 'progress': 95})}\n\n"
+            yield serialization.sse_event({'status': 'Generating optimization suggestions...', 'step': 'suggestions', 'progress': 95})
             suggestions = geo_analysis.get_geo_optimization_suggestions(analysis_results)
             analysis_results["optimization_suggestions"] = suggestions
             
-            yield f"data: {json.dumps({'status': 'GEO Analysis complete!', 'step': 'complete', 'progress': 100, 'result': analysis_results})}\n\n"
+            yield serialization.sse_event({'status': 'GEO Analysis complete!', 'step': 'complete', 'progress': 100, 'result': analysis_results})
             
         except Exception as e:
             print(f"Error in stream_test_queries: {e}")
             import traceback
             traceback.print_exc()
-            yield f"data: {json.dumps({'error': str(e)})}\n\n"
+            yield serialization.sse_event({'error': str(e)})
+        finally:
+            # Admitted but never started (the client left, or an error before the analysis): release the reservation
+            if not analysis_started:
+                cost_planner.settle_run(decision, 0)
     
     return Response(generate(), mimetype='text/event-stream')
 
+@app.route('/estimate-test-queries', methods=['POST'])
+def estimate_test_queries():
+    try:
+        data = request.json
+        brand_name = data.get('brandName')
+        queries = data.get('queries', [])
+        competitors = data.get('competitors', [])
+        llm_models = data.get('models', ['gpt-4o-mini-2024-07-18'])
+        
+        if not brand_name or not queries:
+            return jsonify({'error': 'brandName and queries are required'}), 400
+        try:
+            budget_tokens = cost_planner.parse_budget(data.get('budgetTokens'))
+            dedup_threshold = query_dedup.parse_threshold(data.get('dedupThreshold'))
+            samples_per_query = geo_analysis.parse_samples(data.get('samplesPerQuery'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        query_strings = query_dedup.deduplicate_queries(extract_query_strings(queries), dedup_threshold)['queries']
+        estimate = cost_planner.estimate_geo_run(brand_name, competitors, query_strings, llm_models, samples_per_query)
+        estimate['budget'] = cost_planner.check_budget(
+            estimate, request_tenant(data), budget_tokens, data.get('budgetPolicy', 'refuse')
+        )
+        return jsonify(estimate)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/generate-corpus', methods=['POST'])
+def generate_corpus():
+    try:
+        data = request.json
+        queries = data.get('queries', [])
+        llm_models = data.get('models', ['gpt-4o-mini-2024-07-18'])
+        
+        if not queries:
+            return jsonify({'error': 'queries are required'}), 400
+        try:
+            samples_per_query = geo_analysis.parse_samples(data.get('samplesPerQuery'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not response_corpus.RESPONSE_CORPUS:
+            return jsonify({'error': 'The response corpus is disabled (RESPONSE_CORPUS=0)'}), 409
+        
+        corpus = geo_analysis.generate_corpus(extract_query_strings(queries), llm_models, samples_per_query)
+        return jsonify(corpus)
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/score-corpus', methods=['POST'])
+def score_corpus():
+    try:
+        data = request.json
+        brands = data.get('brands', [])
+        queries = data.get('queries')
+        llm_models = data.get('models', ['gpt-4o-mini-2024-07-18'])
+        
+        if not brands or not all(brand.get('brandName') for brand in brands):
+            return jsonify({'error': 'brands with a brandName each are required'}), 400
+        try:
+            samples_per_query = geo_analysis.parse_samples(data.get('samplesPerQuery'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        if not response_corpus.RESPONSE_CORPUS:
+            return jsonify({'error': 'The response corpus is disabled (RESPONSE_CORPUS=0)'}), 409
+        
+        brand_sets = [{'brand_name': brand['brandName'], 'competitors': brand.get('competitors', [])} for brand in brands]
+        results = geo_analysis.score_corpus(
+            brand_sets,
+            extract_query_strings(queries) if queries else None,
+            llm_models,
+            samples_per_query,
+            data.get('date')
+        )
+        return jsonify({'results': results})
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/corpus-dates', methods=['GET'])
+def corpus_dates():
+    try:
+        return jsonify({'dates': response_corpus.list_dates()})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/responses/<response_hash>', methods=['GET'])
+def get_response(response_hash):
+    if not response_blobs.is_hash(response_hash):
+        return jsonify({'error': 'Expected a 64-character lowercase hex SHA-256 hash'}), 400
+    text = response_blobs.get(response_hash)
+    if text is None:
+        return jsonify({'error': f'No stored response {response_hash}'}), 404
+    response = Response(text, mimetype='text/plain; charset=utf-8')
+    # Content-addressed: the text behind a hash never changes
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    response.headers['ETag'] = f'"{response_hash}"'
+    return response
+
 @app.route('/web-search', methods=['POST'])
 def web_search():
     try:
@@ -281,35 +786,35 @@ def stream_web_search():
     def generate():
         try:
             if not query:
-                yield f"data: {json.dumps({'error': 'query is required'})}\n\n"
+                yield serialization.sse_event({'error': 'query is required'})
                 return
             
-            yield f"data: {json.dumps({'status': 'Initializing web search...', 'step': 'init'})}\n\n"
+            yield serialization.sse_event({'status': 'Initializing web search...', 'step': 'init'})
             time.sleep(0.1)
             
-            yield f"data: {json.dumps({'status': f'Searching for: {query}', 'step': 'searching'})}\n\n"
+            yield serialization.sse_event({'status': f'Searching for: {query}', 'step': 'searching'})
             
             # Perform the web search and analysis
             search_results = openaiAnalytics.webSearchAndAnalyze(query, context)
             
             if 'error' in search_results:
-                yield f"data: {json.dumps({'error': search_results['error'], 'step': 'error'})}\n\n"
+                yield serialization.sse_event({'error': search_results['error'], 'step': 'error'})
                 return
             
-            yield f"data: {json.dumps({'status': 'Processing search results...', 'step': 'processing'})}\n\n"
+            yield serialization.sse_event({'status': 'Processing search results...', 'step': 'processing'})
             time.sleep(0.2)
             
-            yield f"data: {json.dumps({'status': 'Analyzing findings...', 'step': 'analyzing'})}\n\n"
+            yield serialization.sse_event({'status': 'Analyzing findings...', 'step': 'analyzing'})
             time.sleep(0.2)
             
-            yield f"data: {json.dumps({'status': 'Web search complete!', 'step': 'complete', 'result': search_results})}\n\n"
+            yield serialization.sse_event({'status': 'Web search complete!', 'step': 'complete', 'result': search_results})
             
         except Exception as e:
             error_msg = f"Web search error: {str(e)}"
             print(f"ERROR in stream_web_search: {error_msg}")
             import traceback
             traceback.print_exc()
-            yield f"data: {json.dumps({'error': error_msg})}\n\n"
+            yield serialization.sse_event({'error': error_msg})
     
     return Response(generate(), mimetype='text/event-stream')
 
@@ -332,5 +837,21 @@ def format_query_analysis():
 def health_check():
     return jsonify({'status': 'healthy'})
 
+@app.route('/metrics', methods=['GET'])
+def metrics_endpoint():
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/prompt-cache', methods=['GET'])
+def prompt_cache_endpoint():
+    return jsonify(metrics.token_usage_by_call_site())
+
+@app.route('/latency', methods=['GET'])
+def latency_endpoint():
+    return jsonify(latency.snapshot())
+
+@app.route('/llm-providers', methods=['GET'])
+def llm_providers_endpoint():
+    return jsonify(providers.describe())
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=5000)
\ No newline at end of file